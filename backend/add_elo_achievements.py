@@ -36,6 +36,7 @@ async def add_elo_achievements():
             code="ELO_1000",
             title="ELO Master",
             description="Reach an ELO rating of 1000",
+            criteria={"all": [{"metric": "peak_rating", "op": ">=", "value": 1000}]},
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow()
         )
@@ -45,6 +46,7 @@ async def add_elo_achievements():
             code="ELO_1100",
             title="ELO Champion",
             description="Reach an ELO rating of 1100",
+            criteria={"all": [{"metric": "peak_rating", "op": ">=", "value": 1100}]},
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow()
         )
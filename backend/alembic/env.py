@@ -24,6 +24,10 @@ import app.models.flashcard
 import app.models.match
 import app.models.achievement
 import app.models.arena_session
+import app.models.stats_views
+import app.models.job
+import app.models.cache_version
+import app.models.student_daily_stats
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
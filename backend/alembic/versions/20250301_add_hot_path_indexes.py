@@ -0,0 +1,55 @@
+"""add indexes for hot foreign-key and filter paths
+
+Revision ID: 20250301_add_hot_path_indexes
+Revises: 30903b568bd4
+Create Date: 2025-03-01
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic
+revision = '20250301_add_hot_path_indexes'
+down_revision = '30903b568bd4'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Composite primary keys lead with match_id / round_id, so lookups by
+    # student_id need their own indexes
+    op.create_index('ix_match_participants_student_id', 'match_participants', ['student_id'])
+    op.create_index('ix_round_participants_student_id', 'round_participants', ['student_id'])
+
+    # Arena schedule and stats queries filter on arena_id + status
+    op.create_index('ix_matches_arena_id_status', 'matches', ['arena_id', 'status'])
+
+    op.create_index('ix_rounds_match_id', 'rounds', ['match_id'])
+    op.create_index('ix_rounds_flashcard_id', 'rounds', ['flashcard_id'])
+    op.create_index('ix_flashcards_pack_id', 'flashcards', ['pack_id'])
+
+    # Remove duplicate awards (keep one per pair) before enforcing uniqueness
+    op.execute("""
+    DELETE FROM student_achievements sa
+    USING student_achievements dup
+    WHERE sa.student_id = dup.student_id
+      AND sa.achievement_id = dup.achievement_id
+      AND sa.ctid > dup.ctid
+    """)
+    op.create_unique_constraint(
+        'uq_student_achievements_student_id_achievement_id',
+        'student_achievements',
+        ['student_id', 'achievement_id']
+    )
+
+def downgrade():
+    op.drop_constraint(
+        'uq_student_achievements_student_id_achievement_id',
+        'student_achievements',
+        type_='unique'
+    )
+    op.drop_index('ix_flashcards_pack_id', table_name='flashcards')
+    op.drop_index('ix_rounds_flashcard_id', table_name='rounds')
+    op.drop_index('ix_rounds_match_id', table_name='rounds')
+    op.drop_index('ix_matches_arena_id_status', table_name='matches')
+    op.drop_index('ix_round_participants_student_id', table_name='round_participants')
+    op.drop_index('ix_match_participants_student_id', table_name='match_participants')
@@ -0,0 +1,53 @@
+"""add a materialized view for flashcard statistics
+
+Revision ID: 20250305_add_stats_materialized_views
+Revises: 20250301_add_hot_path_indexes
+Create Date: 2025-03-05
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic
+revision = '20250305_add_stats_materialized_views'
+down_revision = '20250301_add_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Per-flashcard usage and success rate
+    op.execute("""
+    CREATE MATERIALIZED VIEW flashcard_usage_stats AS
+    SELECT
+        r.flashcard_id,
+        count(*) AS usage_count,
+        coalesce(sum(coalesce(cardinality(r.winner_ids), 0)), 0) AS total_winners,
+        coalesce(sum(rp.participant_count), 0) AS total_participants,
+        count(DISTINCT m.arena_id) AS used_in_arenas
+    FROM rounds r
+    JOIN matches m ON m.id = r.match_id
+    LEFT JOIN (
+        SELECT round_id, count(*) AS participant_count
+        FROM round_participants
+        GROUP BY round_id
+    ) rp ON rp.round_id = r.id
+    GROUP BY r.flashcard_id
+    """)
+    # A unique index is required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+    op.execute("CREATE UNIQUE INDEX ux_flashcard_usage_stats_flashcard_id ON flashcard_usage_stats (flashcard_id)")
+    op.execute("CREATE INDEX ix_flashcard_usage_stats_usage_count ON flashcard_usage_stats (usage_count DESC)")
+
+    # Last refresh time per view, used to report staleness
+    op.create_table(
+        'materialized_view_refreshes',
+        sa.Column('view_name', sa.String(), primary_key=True),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.execute("""
+    INSERT INTO materialized_view_refreshes (view_name)
+    VALUES ('flashcard_usage_stats')
+    """)
+
+def downgrade():
+    op.drop_table('materialized_view_refreshes')
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS flashcard_usage_stats")
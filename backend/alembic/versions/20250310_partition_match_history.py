@@ -0,0 +1,214 @@
+"""partition match history tables by created_at
+
+Revision ID: 20250310_partition_match_history
+Revises: 20250305_add_stats_materialized_views
+Create Date: 2025-03-10
+
+"""
+from datetime import datetime, timezone
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic
+revision = '20250310_partition_match_history'
+down_revision = '20250305_add_stats_materialized_views'
+branch_labels = None
+depends_on = None
+
+# Partitions for later months are created at runtime by app.services.partition_service
+MONTHS_AHEAD = 3
+
+# Parents before children
+PRIMARY_KEYS = {
+    'matches': 'id, created_at',
+    'match_participants': 'match_id, student_id, created_at',
+    'rounds': 'id, created_at',
+    'round_participants': 'round_id, student_id, created_at',
+}
+
+FOREIGN_KEYS = {
+    'matches': [
+        "FOREIGN KEY (arena_id) REFERENCES arena_sessions (id) ON DELETE CASCADE",
+    ],
+    'match_participants': [
+        "FOREIGN KEY (match_id, created_at) REFERENCES matches (id, created_at)",
+        "FOREIGN KEY (student_id) REFERENCES students (id)",
+    ],
+    # rounds.match_id has no foreign key any more: rounds are partitioned on their
+    # own created_at, so a composite key to matches (id, created_at) would need a
+    # copy of the match's created_at and would tie each match partition to rounds
+    # in later months, blocking partition detaching. The app checks the match exists
+    # when creating a round and deletes rounds with their match; the models declare
+    # no foreign key either.
+    'rounds': [
+        "FOREIGN KEY (flashcard_id) REFERENCES flashcards (id)",
+    ],
+    'round_participants': [
+        "FOREIGN KEY (round_id, created_at) REFERENCES rounds (id, created_at)",
+        "FOREIGN KEY (student_id) REFERENCES students (id)",
+    ],
+}
+
+INDEXES = {
+    'matches': [('ix_matches_arena_id_status', 'arena_id, status')],
+    'match_participants': [('ix_match_participants_student_id', 'student_id')],
+    'rounds': [('ix_rounds_match_id', 'match_id'), ('ix_rounds_flashcard_id', 'flashcard_id')],
+    'round_participants': [('ix_round_participants_student_id', 'student_id')],
+}
+
+FLASHCARD_USAGE_STATS_SQL = """
+CREATE MATERIALIZED VIEW flashcard_usage_stats AS
+SELECT
+    r.flashcard_id,
+    count(*) AS usage_count,
+    coalesce(sum(coalesce(cardinality(r.winner_ids), 0)), 0) AS total_winners,
+    coalesce(sum(rp.participant_count), 0) AS total_participants,
+    count(DISTINCT m.arena_id) AS used_in_arenas
+FROM rounds r
+JOIN matches m ON m.id = r.match_id
+LEFT JOIN (
+    SELECT round_id, count(*) AS participant_count
+    FROM round_participants
+    GROUP BY round_id
+) rp ON rp.round_id = r.id
+GROUP BY r.flashcard_id
+"""
+
+def _drop_stats_views():
+    # The view depends on the tables being rebuilt
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS flashcard_usage_stats")
+
+def _create_stats_views():
+    op.execute(FLASHCARD_USAGE_STATS_SQL)
+    op.execute("CREATE UNIQUE INDEX ux_flashcard_usage_stats_flashcard_id ON flashcard_usage_stats (flashcard_id)")
+    op.execute("CREATE INDEX ix_flashcard_usage_stats_usage_count ON flashcard_usage_stats (usage_count DESC)")
+
+def _drop_history_foreign_keys():
+    # Foreign keys between the history tables point at primary keys that are about to change
+    op.execute("ALTER TABLE round_participants DROP CONSTRAINT IF EXISTS round_participants_round_id_fkey")
+    op.execute("ALTER TABLE rounds DROP CONSTRAINT IF EXISTS rounds_match_id_fkey")
+    op.execute("ALTER TABLE match_participants DROP CONSTRAINT IF EXISTS match_participants_match_id_fkey")
+
+def _add_months(month_start, months):
+    year = month_start.year + (month_start.month - 1 + months) // 12
+    month = (month_start.month - 1 + months) % 12 + 1
+    return month_start.replace(year=year, month=month)
+
+def _partition_months():
+    """Month starts from the oldest existing row through MONTHS_AHEAD months from now."""
+    bind = op.get_bind()
+    oldest = bind.execute(sa.text("""
+        SELECT least(
+            (SELECT min(created_at) FROM matches),
+            (SELECT min(created_at) FROM rounds)
+        )
+    """)).scalar()
+    now = datetime.now(timezone.utc)
+    first = (oldest or now).astimezone(timezone.utc)
+    month = datetime(first.year, first.month, 1, tzinfo=timezone.utc)
+    last = _add_months(datetime(now.year, now.month, 1, tzinfo=timezone.utc), MONTHS_AHEAD)
+    months = []
+    while month <= last:
+        months.append(month)
+        month = _add_months(month, 1)
+    return months
+
+def _rebuild_table(table, primary_key, partitioned, months=()):
+    legacy = f"{table}_legacy"
+    for index_name, _ in INDEXES[table]:
+        op.execute(f"DROP INDEX IF EXISTS {index_name}")
+    op.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    op.execute(f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey")
+
+    partition_clause = " PARTITION BY RANGE (created_at)" if partitioned else ""
+    op.execute(f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS){partition_clause}")
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY ({primary_key})")
+
+    if partitioned:
+        for month in months:
+            op.execute(
+                f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+            )
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    op.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+
+def _finish_tables(tables, foreign_keys):
+    # Drop the old copies children-first, then add keys and indexes to the new tables
+    for table in reversed(tables):
+        op.execute(f"DROP TABLE {table}_legacy")
+    for table in tables:
+        for foreign_key in foreign_keys[table]:
+            op.execute(f"ALTER TABLE {table} ADD {foreign_key}")
+        for index_name, columns in INDEXES[table]:
+            op.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+
+def upgrade():
+    _drop_stats_views()
+    _drop_history_foreign_keys()
+
+    # Participants carry their parent's created_at so they can be partitioned on the
+    # same key and referenced through the composite (id, created_at) keys
+    op.add_column('match_participants', sa.Column('created_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute("""
+    UPDATE match_participants mp
+    SET created_at = m.created_at
+    FROM matches m
+    WHERE m.id = mp.match_id
+    """)
+    op.add_column('round_participants', sa.Column('created_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute("""
+    UPDATE round_participants rp
+    SET created_at = r.created_at
+    FROM rounds r
+    WHERE r.id = rp.round_id
+    """)
+    for table in PRIMARY_KEYS:
+        op.execute(f"UPDATE {table} SET created_at = now() WHERE created_at IS NULL")
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL")
+    op.execute("ALTER TABLE match_participants ALTER COLUMN created_at SET DEFAULT now()")
+    op.execute("ALTER TABLE round_participants ALTER COLUMN created_at SET DEFAULT now()")
+
+    months = _partition_months()
+    for table, primary_key in PRIMARY_KEYS.items():
+        _rebuild_table(table, primary_key, partitioned=True, months=months)
+    _finish_tables(list(PRIMARY_KEYS), FOREIGN_KEYS)
+
+    _create_stats_views()
+
+def downgrade():
+    _drop_stats_views()
+    op.execute("ALTER TABLE round_participants DROP CONSTRAINT IF EXISTS round_participants_round_id_created_at_fkey")
+    op.execute("ALTER TABLE match_participants DROP CONSTRAINT IF EXISTS match_participants_match_id_created_at_fkey")
+
+    # Back to plain tables keyed on id; detached partitions are not restored
+    primary_keys = {
+        'matches': 'id',
+        'match_participants': 'match_id, student_id',
+        'rounds': 'id',
+        'round_participants': 'round_id, student_id',
+    }
+    foreign_keys = {
+        **FOREIGN_KEYS,
+        'match_participants': [
+            "FOREIGN KEY (match_id) REFERENCES matches (id)",
+            "FOREIGN KEY (student_id) REFERENCES students (id)",
+        ],
+        'rounds': [
+            "FOREIGN KEY (match_id) REFERENCES matches (id)",
+            "FOREIGN KEY (flashcard_id) REFERENCES flashcards (id)",
+        ],
+        'round_participants': [
+            "FOREIGN KEY (round_id) REFERENCES rounds (id)",
+            "FOREIGN KEY (student_id) REFERENCES students (id)",
+        ],
+    }
+    for table, primary_key in primary_keys.items():
+        _rebuild_table(table, primary_key, partitioned=False)
+    _finish_tables(list(primary_keys), foreign_keys)
+
+    op.drop_column('round_participants', 'created_at')
+    op.drop_column('match_participants', 'created_at')
+
+    _create_stats_views()
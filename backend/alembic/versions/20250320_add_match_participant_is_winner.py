@@ -0,0 +1,40 @@
+"""add is_winner to match_participants
+
+Revision ID: 20250320_add_match_participant_is_winner
+Revises: 20250310_partition_match_history
+Create Date: 2025-03-20
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic
+revision = '20250320_add_match_participant_is_winner'
+down_revision = '20250310_partition_match_history'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('match_participants', sa.Column('is_winner', sa.Boolean(), nullable=True))
+
+    # Completed matches with at least one winner; UNKNOWN results stay NULL
+    op.execute("""
+    UPDATE match_participants mp
+    SET is_winner = (mp.student_id = ANY(m.winner_ids))
+    FROM matches m
+    WHERE m.id = mp.match_id
+      AND m.created_at = mp.created_at
+      AND m.status = 'completed'
+      AND cardinality(m.winner_ids) > 0
+    """)
+
+    # Covers per-student history, win counts and streaks without touching the heap
+    op.execute("""
+    CREATE INDEX ix_match_participants_student_id_created_at
+    ON match_participants (student_id, created_at)
+    INCLUDE (is_winner, elo_after)
+    """)
+
+def downgrade():
+    op.drop_index('ix_match_participants_student_id_created_at', table_name='match_participants')
+    op.drop_column('match_participants', 'is_winner')
@@ -0,0 +1,79 @@
+"""add student_achievement_states for incremental achievement evaluation
+
+Revision ID: 20250325_add_student_achievement_states
+Revises: 20250320_add_match_participant_is_winner
+Create Date: 2025-03-25
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic
+revision = '20250325_add_student_achievement_states'
+down_revision = '20250320_add_match_participant_is_winner'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'student_achievement_states',
+        sa.Column('student_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('students.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('match_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('win_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('current_win_streak', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_win_streak', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('peak_rating', sa.Float(), nullable=True),
+        sa.Column('last_match_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    )
+
+    # Backfill from history: win runs are found by the difference between the
+    # row number over all results and the row number within wins/losses
+    op.execute("""
+    WITH results AS (
+        SELECT
+            student_id,
+            created_at,
+            is_winner,
+            elo_after,
+            row_number() OVER (PARTITION BY student_id ORDER BY created_at)
+              - row_number() OVER (PARTITION BY student_id, is_winner ORDER BY created_at) AS run_id
+        FROM match_participants
+        WHERE is_winner IS NOT NULL
+    ),
+    win_runs AS (
+        SELECT student_id, run_id, count(*) AS run_length, max(created_at) AS run_end
+        FROM results
+        WHERE is_winner
+        GROUP BY student_id, run_id
+    ),
+    totals AS (
+        SELECT
+            student_id,
+            count(*) AS match_count,
+            count(*) FILTER (WHERE is_winner) AS win_count,
+            max(elo_after) AS peak_rating,
+            max(created_at) AS last_match_at
+        FROM results
+        GROUP BY student_id
+    )
+    INSERT INTO student_achievement_states
+        (student_id, match_count, win_count, current_win_streak, max_win_streak, peak_rating, last_match_at)
+    SELECT
+        t.student_id,
+        t.match_count,
+        t.win_count,
+        coalesce((
+            SELECT w.run_length FROM win_runs w
+            WHERE w.student_id = t.student_id AND w.run_end = t.last_match_at
+        ), 0),
+        coalesce((SELECT max(w.run_length) FROM win_runs w WHERE w.student_id = t.student_id), 0),
+        t.peak_rating,
+        t.last_match_at
+    FROM totals t
+    JOIN students s ON s.id = t.student_id
+    """)
+
+def downgrade():
+    op.drop_table('student_achievement_states')
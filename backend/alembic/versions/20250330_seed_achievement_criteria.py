@@ -0,0 +1,40 @@
+"""seed declarative criteria for the built-in achievements
+
+Revision ID: 20250330_seed_achievement_criteria
+Revises: 20250325_add_student_achievement_states
+Create Date: 2025-03-30
+
+"""
+import json
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic
+revision = '20250330_seed_achievement_criteria'
+down_revision = '20250325_add_student_achievement_states'
+branch_labels = None
+depends_on = None
+
+# Criteria replacing the hand-written evaluators
+BUILT_IN_CRITERIA = {
+    'ELO_1000': {"all": [{"metric": "peak_rating", "op": ">=", "value": 1000}]},
+    'ELO_1100': {"all": [{"metric": "peak_rating", "op": ">=", "value": 1100}]},
+    'WIN_STREAK_3': {"all": [{"metric": "max_win_streak", "op": ">=", "value": 3}]},
+    'WIN_STREAK_4': {"all": [{"metric": "max_win_streak", "op": ">=", "value": 4}]},
+    'WIN_STREAK_5': {"all": [{"metric": "max_win_streak", "op": ">=", "value": 5}]},
+}
+
+def upgrade():
+    # Only fill in achievements that have no criteria yet
+    for code, criteria in BUILT_IN_CRITERIA.items():
+        op.get_bind().execute(
+            sa.text("UPDATE achievements SET criteria = CAST(:criteria AS json) WHERE code = :code AND criteria IS NULL"),
+            {"criteria": json.dumps(criteria), "code": code}
+        )
+
+def downgrade():
+    for code in BUILT_IN_CRITERIA:
+        op.get_bind().execute(
+            sa.text("UPDATE achievements SET criteria = NULL WHERE code = :code"),
+            {"code": code}
+        )
@@ -0,0 +1,46 @@
+"""add cache_versions and bump the achievement catalog version on edits
+
+Revision ID: 20250410_add_cache_versions
+Revises: 20250405_add_jobs_table
+Create Date: 2025-04-10
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic
+revision = '20250410_add_cache_versions'
+down_revision = '20250405_add_jobs_table'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'cache_versions',
+        sa.Column('name', sa.String(), primary_key=True),
+        sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    )
+    op.execute("INSERT INTO cache_versions (name, version) VALUES ('achievement_catalog', 1)")
+
+    # Edits made outside the API (scripts, migrations, psql) still invalidate the cache
+    op.execute("""
+    CREATE FUNCTION bump_achievement_catalog_version() RETURNS trigger AS $$
+    BEGIN
+        UPDATE cache_versions
+        SET version = version + 1, updated_at = now()
+        WHERE name = 'achievement_catalog';
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+    CREATE TRIGGER achievements_bump_catalog_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON achievements
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_achievement_catalog_version()
+    """)
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS achievements_bump_catalog_version ON achievements")
+    op.execute("DROP FUNCTION IF EXISTS bump_achievement_catalog_version()")
+    op.drop_table('cache_versions')
@@ -0,0 +1,22 @@
+"""add a leaderboard index on students (elo_rating, id)
+
+Revision ID: 20250415_add_students_elo_rating_index
+Revises: 20250410_add_cache_versions
+Create Date: 2025-04-15
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic
+revision = '20250415_add_students_elo_rating_index'
+down_revision = '20250410_add_cache_versions'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Scanned backwards for the leaderboard (elo_rating DESC, id) and probed for rank lookups
+    op.create_index('ix_students_elo_rating_id', 'students', ['elo_rating', 'id'])
+
+def downgrade():
+    op.drop_index('ix_students_elo_rating_id', table_name='students')
@@ -0,0 +1,24 @@
+"""index students and matches on updated_at for incremental exports
+
+Revision ID: 20250420_add_updated_at_export_indexes
+Revises: 20250415_add_students_elo_rating_index
+Create Date: 2025-04-20
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic
+revision = '20250420_add_updated_at_export_indexes'
+down_revision = '20250415_add_students_elo_rating_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Range scans for "changed since the last export"; on matches this cascades to every partition
+    op.create_index('ix_students_updated_at', 'students', ['updated_at'])
+    op.create_index('ix_matches_updated_at', 'matches', ['updated_at'])
+
+def downgrade():
+    op.drop_index('ix_matches_updated_at', table_name='matches')
+    op.drop_index('ix_students_updated_at', table_name='students')
@@ -0,0 +1,33 @@
+"""add calibrated difficulty and discrimination to flashcards
+
+Revision ID: 20250425_add_flashcard_calibration
+Revises: 20250420_add_updated_at_export_indexes
+Create Date: 2025-04-25
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic
+revision = '20250425_add_flashcard_calibration'
+down_revision = '20250420_add_updated_at_export_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('flashcards', sa.Column('calibrated_difficulty', sa.Float(), nullable=True))
+    op.add_column(
+        'flashcards',
+        sa.Column('calibrated_level', postgresql.ENUM(name='difficultylevel', create_type=False), nullable=True)
+    )
+    op.add_column('flashcards', sa.Column('discrimination', sa.Float(), nullable=True))
+    op.add_column('flashcards', sa.Column('calibration_responses', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('flashcards', sa.Column('calibrated_at', sa.DateTime(timezone=True), nullable=True))
+
+def downgrade():
+    op.drop_column('flashcards', 'calibrated_at')
+    op.drop_column('flashcards', 'calibration_responses')
+    op.drop_column('flashcards', 'discrimination')
+    op.drop_column('flashcards', 'calibrated_level')
+    op.drop_column('flashcards', 'calibrated_difficulty')
@@ -0,0 +1,50 @@
+"""add the student_daily_stats rollup table
+
+Revision ID: 20250430_add_student_daily_stats
+Revises: 20250425_add_flashcard_calibration
+Create Date: 2025-04-30
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic
+revision = '20250430_add_student_daily_stats'
+down_revision = '20250425_add_flashcard_calibration'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'student_daily_stats',
+        sa.Column('student_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('students.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('matches', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('wins', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('elo_change', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('elo_end', sa.Float(), nullable=True),
+        sa.Column('last_match_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('student_id', 'day')
+    )
+    # Fill it from existing history; later matches are added as they complete
+    op.execute("""
+        INSERT INTO student_daily_stats (student_id, day, matches, wins, elo_change, elo_end, last_match_at)
+        SELECT student_id, day, count(*), count(*) FILTER (WHERE is_winner), sum(elo_change),
+               (array_agg(elo_end ORDER BY completed_at DESC, created_at DESC))[1], max(completed_at)
+        FROM (
+            SELECT mp.student_id, (mp.created_at AT TIME ZONE 'UTC')::date AS day, mp.is_winner, mp.created_at,
+                   coalesce(m.updated_at, m.created_at) AS completed_at,
+                   coalesce(mp.elo_after - mp.elo_before, 0) AS elo_change,
+                   coalesce(mp.elo_after, s.elo_rating) AS elo_end
+            FROM match_participants mp
+            JOIN matches m ON m.id = mp.match_id AND m.created_at = mp.created_at
+            JOIN students s ON s.id = mp.student_id
+            WHERE m.status = 'completed' AND mp.is_winner IS NOT NULL
+        ) results
+        GROUP BY student_id, day
+    """)
+
+def downgrade():
+    op.drop_table('student_daily_stats')
@@ -1,9 +1,49 @@
-from fastapi import FastAPI
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from .database import mark_recent_write, READ_PRIMARY_HEADER, IS_SQLITE, create_sqlite_schema
+from .services.stats_view_service import stats_view_refresher
+from .services.partition_service import partition_maintainer
+from .services.job_queue import job_worker
+from .services.leaderboard_index import leaderboard_index
+from .services.flashcard_counters import flashcard_counters
+from .core.logging import REQUEST_ID_HEADER, bind_log_context, reset_log_context
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if IS_SQLITE:
+        # Embedded database: build the schema in place, no view refresh or partitions
+        await create_sqlite_schema()
+        await leaderboard_index.load()
+        leaderboard_index.start()
+        flashcard_counters.start()
+        job_worker.start()
+        yield
+        await job_worker.stop()
+        await flashcard_counters.stop()
+        await leaderboard_index.stop()
+        return
+
+    await leaderboard_index.load()
+
+    # Background tasks run for the lifetime of the app
+    leaderboard_index.start()
+    stats_view_refresher.start()
+    partition_maintainer.start()
+    flashcard_counters.start()
+    job_worker.start()
+    yield
+    await job_worker.stop()
+    await flashcard_counters.stop()
+    await partition_maintainer.stop()
+    await stats_view_refresher.stop()
+    await leaderboard_index.stop()
 
 app = FastAPI(
     title="Flashcard Arena API",
-    redirect_slashes=True
+    redirect_slashes=True,
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -12,12 +52,32 @@ app.add_middleware(
     allow_origins=["http://localhost:3000"],  # Frontend development server
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization", "Accept"],
-    expose_headers=["Content-Type"],
+    allow_headers=["Content-Type", "Authorization", "Accept", "If-None-Match", READ_PRIMARY_HEADER, REQUEST_ID_HEADER],
+    expose_headers=["Content-Type", "ETag", REQUEST_ID_HEADER],
 )
 
+@app.middleware("http")
+async def pin_writers_to_primary(request: Request, call_next):
+    """Route the client's reads to the primary for a short time after it writes"""
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        mark_recent_write(response)
+    return response
+
+@app.middleware("http")
+async def bind_request_id(request: Request, call_next):
+    """Tag every log record of the request with its ID, taken from or echoed in X-Request-ID"""
+    request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    token = bind_log_context(request_id=request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        reset_log_context(token)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
 # Import routers
-from .routers import flashcards, students, matches, arena, flashcard_stats, achievements
+from .routers import flashcards, students, matches, arena, flashcard_stats, achievements, internal
 
 # Include routers
 app.include_router(flashcards.router, prefix="/api/flashcards", tags=["flashcards"])
@@ -26,3 +86,4 @@ app.include_router(matches.router, prefix="/api/matches", tags=["matches"])
 app.include_router(arena.router, prefix="/api/arena", tags=["arena"])
 app.include_router(flashcard_stats.router, prefix="/api/stats", tags=["statistics"])
 app.include_router(achievements.router, prefix="/api/achievements", tags=["achievements"])
+app.include_router(internal.router, prefix="/api/_internal", tags=["internal"])
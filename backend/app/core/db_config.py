@@ -0,0 +1,217 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Union
+
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+class DatabaseSettings(BaseModel):
+    """Engine and pool configuration, read from DB_* environment variables."""
+    url: str
+    pool_size: int = 10
+    max_overflow: int = 20
+    pool_timeout: float = 30.0  # seconds to wait for a free connection
+    pool_recycle: int = 1800  # seconds before a connection is replaced
+    pool_pre_ping: bool = True
+    statement_cache_size: int = 100  # asyncpg prepared statement cache, 0 behind pgbouncer
+    echo: Union[bool, str] = False  # False, True or "debug"
+    statement_timeout_ms: int = 0  # server-side statement_timeout, 0 disables
+    command_timeout: Optional[float] = None  # asyncpg client-side timeout in seconds
+    sqlite_busy_timeout_ms: int = 5000  # how long SQLite writers wait for the lock
+    sqlite_cache_size_kb: int = 65536  # SQLite page cache per connection
+    sqlite_mmap_size: int = 268435456  # bytes of the database file to memory-map
+
+    @classmethod
+    def from_env(cls, url: str) -> "DatabaseSettings":
+        echo_setting = os.getenv("DB_ECHO", "false").lower()
+        if echo_setting == "debug":
+            echo: Union[bool, str] = "debug"
+        else:
+            echo = echo_setting in ("1", "true", "yes", "on")
+
+        command_timeout = os.getenv("DB_COMMAND_TIMEOUT")
+        return cls(
+            url=url,
+            pool_size=int(os.getenv("DB_POOL_SIZE", 10)),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 20)),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", 30)),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", 1800)),
+            pool_pre_ping=_env_bool("DB_POOL_PRE_PING", True),
+            statement_cache_size=int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100)),
+            echo=echo,
+            statement_timeout_ms=int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0)),
+            command_timeout=float(command_timeout) if command_timeout else None,
+            sqlite_busy_timeout_ms=int(os.getenv("DB_SQLITE_BUSY_TIMEOUT_MS", 5000)),
+            sqlite_cache_size_kb=int(os.getenv("DB_SQLITE_CACHE_SIZE_KB", 65536)),
+            sqlite_mmap_size=int(os.getenv("DB_SQLITE_MMAP_SIZE", 268435456)),
+        )
+
+    @property
+    def is_sqlite(self) -> bool:
+        return self.url.startswith("sqlite")
+
+    def engine_kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments for create_async_engine."""
+        if self.is_sqlite and ":memory:" in self.url:
+            # One shared connection, otherwise every checkout sees an empty database
+            return {
+                "echo": self.echo,
+                "poolclass": StaticPool,
+                "connect_args": {"check_same_thread": False},
+            }
+
+        kwargs: Dict[str, Any] = {
+            "echo": self.echo,
+            "poolclass": InstrumentedAsyncQueuePool,
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_timeout": self.pool_timeout,
+            "pool_recycle": self.pool_recycle,
+            "pool_pre_ping": self.pool_pre_ping,
+        }
+
+        if self.url.startswith("postgresql+asyncpg://"):
+            connect_args: Dict[str, Any] = {
+                "statement_cache_size": self.statement_cache_size,
+            }
+            if self.command_timeout:
+                connect_args["command_timeout"] = self.command_timeout
+            if self.statement_timeout_ms:
+                connect_args["server_settings"] = {
+                    "statement_timeout": str(self.statement_timeout_ms),
+                }
+            kwargs["connect_args"] = connect_args
+
+        return kwargs
+
+    def sqlite_pragmas(self) -> Dict[str, Any]:
+        """PRAGMAs applied to every new SQLite connection."""
+        return {
+            "journal_mode": "WAL",  # readers do not block the writer
+            "synchronous": "NORMAL",  # durable at checkpoints, safe with WAL
+            "foreign_keys": "ON",
+            "busy_timeout": self.sqlite_busy_timeout_ms,
+            "cache_size": -self.sqlite_cache_size_kb,  # negative means KiB
+            "temp_store": "MEMORY",
+            "mmap_size": self.sqlite_mmap_size,
+        }
+
+
+class PoolMetrics:
+    """
+    Counters for connection checkouts, wait time and overflow usage.
+    Updated from pool events, which may fire from several threads.
+    """
+
+    def __init__(self, sample_size: int = 1000):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=sample_size)
+        self.checkouts = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            self._waits.append(seconds)
+
+    def record_overflow(self) -> None:
+        with self._lock:
+            self.overflow_events += 1
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            p95 = waits[int(len(waits) * 0.95) - 1] if waits else 0.0
+            return {
+                "checkouts": self.checkouts,
+                "overflow_events": self.overflow_events,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "p95_wait_ms": round(p95 * 1000, 3),
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long each checkout waited for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Per pool, so the primary and the replica are reported apart
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_timeout()
+            raise
+        finally:
+            self.metrics.record_wait(time.perf_counter() - start)
+
+
+def instrument_pool(pool) -> None:
+    """Count new connections opened beyond pool_size as overflow events."""
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        # e.g. the StaticPool of an in-memory SQLite database has no overflow
+        return
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        if pool.overflow() > 0 and isinstance(pool, InstrumentedAsyncQueuePool):
+            pool.metrics.record_overflow()
+
+
+def configure_sqlite(engine, settings: DatabaseSettings) -> None:
+    """Apply the SQLite PRAGMAs whenever the engine opens a connection."""
+    pragmas = settings.sqlite_pragmas()
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def pool_status(pool) -> Dict[str, Any]:
+    """Current pool occupancy."""
+    status: Dict[str, Any] = {"pool_class": type(pool).__name__}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "timeout": pool.timeout(),
+        })
+    return status
+
+
+def pool_metrics(pool) -> Dict[str, Any]:
+    """Checkout metrics accumulated by an instrumented pool; empty for other pools."""
+    if not isinstance(pool, InstrumentedAsyncQueuePool):
+        return {}
+    return pool.metrics.snapshot()
@@ -1,18 +1,168 @@
+"""
+Structured, non-blocking logging.
+
+get_logger() returns a logger whose calls take keyword fields:
+
+    logger.info("Match completed", match_id=match.id, winners=2)
+
+Every record is written as one JSON line holding the message, the fields and
+whatever context is bound for the current request or task (request_id,
+arena_id, match_id, ...). Loggers only put records on an in-process queue; a
+QueueListener thread formats and writes them, so log I/O never blocks the
+event loop.
+
+Environment:
+    LOG_LEVEL     level for app loggers (default INFO)
+    LOG_LEVELS    per-logger overrides by name prefix, e.g.
+                  "app.services.job_queue=DEBUG,app.routers=WARNING"
+    LOG_SAMPLING  share of records kept per category below WARNING, e.g.
+                  "achievements=0.1,matchmaking=0.01"
+"""
+import atexit
+import contextvars
+import json
 import logging
+import os
+import queue
+import random
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("log_context", default={})
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    pairs = {}
+    for item in value.split(","):
+        key, sep, setting = item.partition("=")
+        if sep and key.strip():
+            pairs[key.strip()] = setting.strip()
+    return pairs
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = {name: level.upper() for name, level in _parse_pairs(os.getenv("LOG_LEVELS", "")).items()}
+SAMPLE_RATES = {category: float(rate) for category, rate in _parse_pairs(os.getenv("LOG_SAMPLING", "")).items()}
+
+def bind_log_context(**fields: Any) -> contextvars.Token:
+    """Add fields to every record logged from the current request or task."""
+    return _context.set({**_context.get(), **fields})
+
+def reset_log_context(token: contextvars.Token) -> None:
+    _context.reset(token)
+
+@contextmanager
+def log_context(**fields: Any):
+    """Bind fields for the duration of the block."""
+    token = bind_log_context(**fields)
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, context and fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", None) or {})
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Keep only a share of records in sampled categories; warnings and errors always pass."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = SAMPLE_RATES.get(getattr(record, "category", None))
+        return rate is None or random.random() < rate
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Queue handler that snapshots the bound context on the logging task and
+    leaves formatting to the listener thread. The queue never leaves the
+    process, so exception info is passed through as is.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.context = _context.get()
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger whose calls take keyword fields, plus category= for sampling."""
+
+    _RESERVED = {"exc_info", "stack_info", "stacklevel", "extra"}
+
+    def __init__(self, logger: logging.Logger, category: Optional[str] = None):
+        super().__init__(logger, {})
+        self.category = category
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in self._RESERVED}
+        extra = dict(kwargs.get("extra") or {})
+        extra["category"] = fields.pop("category", self.category)
+        extra["fields"] = fields
+        kwargs["extra"] = extra
+        return msg, kwargs
+
+_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_queue_handler = ContextQueueHandler(_queue)
+_queue_handler.addFilter(SamplingFilter())
+_listener: Optional[QueueListener] = None
+
+def _start_listener() -> None:
+    global _listener
+    if _listener is not None:
+        return
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    _listener = QueueListener(_queue, stream_handler)
+    _listener.start()
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def _restart_after_fork() -> None:
+    # The listener thread does not survive fork; give the child its own
+    global _listener
+    if _listener is not None:
+        _listener = None
+        _start_listener()
+
+atexit.register(shutdown_logging)
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+def _level_for(name: str) -> str:
+    """Most specific LOG_LEVELS entry that prefixes name, else LOG_LEVEL."""
+    matches = [prefix for prefix in LOG_LEVELS if name == prefix or name.startswith(prefix + ".")]
+    return LOG_LEVELS[max(matches, key=len)] if matches else LOG_LEVEL
 
-def get_logger(name: str) -> logging.Logger:
+def get_logger(name: str, category: Optional[str] = None) -> StructuredLogger:
     """
-    Creates and returns a logger with the specified name and basic configuration.
+    Structured logger for name. Records logged through it are gated by
+    LOG_LEVEL/LOG_LEVELS and sampled by category (per call or per logger).
     """
     logger = logging.getLogger(name)
-    
-    if not logger.handlers:
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-        logger.setLevel(logging.INFO)
-    
-    return logger
+    if _queue_handler not in logger.handlers:
+        logger.addHandler(_queue_handler)
+        logger.setLevel(_level_for(name))
+        logger.propagate = False
+        _start_listener()
+    return StructuredLogger(logger, category)
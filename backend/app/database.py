@@ -1,7 +1,14 @@
+from sqlalchemy import event, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import sessionmaker, declarative_base, Session
 from dotenv import load_dotenv
+from fastapi import Request, Response
 import os
+import time
+from .core.db_config import DatabaseSettings, instrument_pool, configure_sqlite
 
 # Load environment variables
 load_dotenv()
@@ -10,9 +17,26 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL and DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+# Embedded SQLite for single-classroom installs and tests, e.g. sqlite:///./arena.db
+if DATABASE_URL and DATABASE_URL.startswith("sqlite://"):
+    DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+# Optional read replica for analytics and listing endpoints
+REPLICA_DATABASE_URL = os.getenv("DATABASE_REPLICA_URL")
+if REPLICA_DATABASE_URL and REPLICA_DATABASE_URL.startswith("postgresql://"):
+    REPLICA_DATABASE_URL = REPLICA_DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+# Engine and pool settings come from DB_* environment variables
+db_settings = DatabaseSettings.from_env(DATABASE_URL)
 
 # Create async engine
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = create_async_engine(DATABASE_URL, **db_settings.engine_kwargs())
+instrument_pool(engine.sync_engine.pool)
+
+# Postgres-only features (materialized views, partitions, replicas) are skipped on SQLite
+IS_SQLITE = db_settings.is_sqlite
+if IS_SQLITE:
+    configure_sqlite(engine, db_settings)
 
 # Create async session factory
 AsyncSessionLocal = sessionmaker(
@@ -21,9 +45,74 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False,
 )
 
+# Read sessions go to the replica when one is configured, otherwise to the primary
+if REPLICA_DATABASE_URL:
+    replica_engine = create_async_engine(
+        REPLICA_DATABASE_URL,
+        **DatabaseSettings.from_env(REPLICA_DATABASE_URL).engine_kwargs()
+    )
+    instrument_pool(replica_engine.sync_engine.pool)
+    ReadSessionLocal = sessionmaker(
+        replica_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+    )
+else:
+    replica_engine = None
+    ReadSessionLocal = AsyncSessionLocal
+
+# Read-your-writes: after a successful write the client is pinned to the primary
+# for a few seconds (cookie), or can ask for it explicitly (header)
+READ_PRIMARY_COOKIE = "read_primary_until"
+READ_PRIMARY_HEADER = "X-Read-Primary"
+READ_YOUR_WRITES_SECONDS = int(os.getenv("DB_READ_YOUR_WRITES_SECONDS", 5))
+
 # Create declarative base
 Base = declarative_base()
 
+# Strict loading mode for tests and local debugging: any relationship lazy load
+# that slips past lazy="raise" (e.g. a relationship declared with another
+# strategy) fails instead of silently issuing a query
+RAISE_ON_LAZY_LOAD = os.getenv("DB_RAISE_ON_LAZY_LOAD", "false").lower() == "true"
+
+if RAISE_ON_LAZY_LOAD:
+    @event.listens_for(Session, "do_orm_execute")
+    def _raise_on_lazy_load(orm_execute_state):
+        if orm_execute_state.lazy_loaded_from is not None:
+            raise InvalidRequestError(
+                f"Implicit lazy load from {orm_execute_state.lazy_loaded_from.class_.__name__}; "
+                "use a loader profile from app.models.loader_profiles"
+            )
+
+def dialect_insert(table):
+    """INSERT construct with ON CONFLICT support for the configured backend"""
+    return sqlite_insert(table) if IS_SQLITE else pg_insert(table)
+
+def values_source(columns, rows, name: str):
+    """
+    Rows as a VALUES relation for UPDATE ... FROM, so many rows are updated in one statement.
+    SQLite cannot name the columns of a VALUES subquery, so it gets a CTE instead.
+    """
+    source = values(*columns, name=name).data(rows)
+    return source.cte(name) if IS_SQLITE else source
+
+async def create_sqlite_schema() -> None:
+    """
+    Create tables, statistics views and triggers on SQLite. Alembic migrations target
+    Postgres, so an embedded database is built straight from the models.
+    """
+    # Import every model so its table is registered on Base.metadata
+    from .models import student, flashcard, match, achievement, arena_session, job, cache_version, student_daily_stats  # noqa: F401
+    from .models.stats_views import SQLITE_VIEWS
+    from .models.cache_version import SQLITE_TRIGGERS
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for view_sql in SQLITE_VIEWS.values():
+            await conn.exec_driver_sql(view_sql)
+        for trigger_sql in SQLITE_TRIGGERS.values():
+            await conn.exec_driver_sql(trigger_sql)
+
 # Dependency to get database session
 async def get_db():
     async with AsyncSessionLocal() as session:
@@ -31,3 +120,36 @@ async def get_db():
             yield session
         finally:
             await session.close()
+
+def wants_primary(request: Request) -> bool:
+    """True if this request must see the client's own recent writes"""
+    if request.headers.get(READ_PRIMARY_HEADER, "").lower() in ("1", "true"):
+        return True
+    read_primary_until = request.cookies.get(READ_PRIMARY_COOKIE)
+    if read_primary_until:
+        try:
+            return float(read_primary_until) > time.time()
+        except ValueError:
+            return False
+    return False
+
+def mark_recent_write(response: Response) -> None:
+    """Pin the client to the primary long enough for the replica to catch up"""
+    if replica_engine is None:
+        return
+    response.set_cookie(
+        READ_PRIMARY_COOKIE,
+        str(time.time() + READ_YOUR_WRITES_SECONDS),
+        max_age=READ_YOUR_WRITES_SECONDS,
+        httponly=True,
+        samesite="lax",
+    )
+
+# Dependency to get a read-only session (replica, or primary for read-your-writes)
+async def get_read_db(request: Request):
+    session_factory = AsyncSessionLocal if wants_primary(request) else ReadSessionLocal
+    async with session_factory() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
@@ -1,12 +1,12 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, func, JSON
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, DateTime, Integer, Float, ForeignKey, func, JSON, UniqueConstraint
+from .types import GUID
 import uuid
 from app.database import Base
 
 class Achievement(Base):
     __tablename__ = "achievements"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     code = Column(String, unique=True, nullable=False)  # e.g. "elo-1000", "streak-3-win"
     title = Column(String, nullable=False)
     description = Column(String, nullable=True)
@@ -17,8 +17,29 @@ class Achievement(Base):
 
 class StudentAchievement(Base):
     __tablename__ = "student_achievements"
+    __table_args__ = (
+        UniqueConstraint("student_id", "achievement_id", name="uq_student_achievements_student_id_achievement_id"),
+    )
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    student_id = Column(UUID(as_uuid=True), ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
-    achievement_id = Column(UUID(as_uuid=True), ForeignKey("achievements.id", ondelete="CASCADE"), nullable=False)
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
+    student_id = Column(GUID(), ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
+    achievement_id = Column(GUID(), ForeignKey("achievements.id", ondelete="CASCADE"), nullable=False)
     achieved_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=True)
+
+
+class StudentAchievementState(Base):
+    """
+    Running per-student totals that achievement evaluators read instead of
+    match history. Updated in place each time one of the student's matches
+    completes; rebuilt from history only by backfills.
+    """
+    __tablename__ = "student_achievement_states"
+
+    student_id = Column(GUID(), ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    match_count = Column(Integer, nullable=False, default=0)
+    win_count = Column(Integer, nullable=False, default=0)
+    current_win_streak = Column(Integer, nullable=False, default=0)
+    max_win_streak = Column(Integer, nullable=False, default=0)
+    peak_rating = Column(Float, nullable=True)  # highest rating reached after a completed match
+    last_match_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now(), nullable=True)
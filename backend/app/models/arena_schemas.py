@@ -57,3 +57,18 @@ class MatchWinnerResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+class ParticipantDeltaResponse(BaseModel):
+    student_id: UUID
+    elo_rating: float
+    elo_change: float  # ELO change from this match only
+    wins: int  # 1 if this match was a win, else 0
+    losses: int  # 1 if this match was a loss, else 0
+
+class MatchWinnerDeltaResponse(BaseModel):
+    match_id: UUID
+    arena_id: UUID
+    status: ArenaSessionStatus
+    num_rounds: int
+    rounds_completed: int
+    participants: List[ParticipantDeltaResponse]
@@ -1,6 +1,6 @@
 from sqlalchemy import Column, DateTime, String, Integer, Enum, func, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
+from .types import GUID
 import uuid
 import enum
 from ..database import Base
@@ -13,18 +13,18 @@ class ArenaSessionStatus(enum.Enum):
 class ArenaParticipant(Base):
     __tablename__ = 'arena_participants'
     
-    arena_id = Column(UUID(as_uuid=True), ForeignKey('arena_sessions.id'), primary_key=True)
-    student_id = Column(UUID(as_uuid=True), ForeignKey('students.id'), primary_key=True)
+    arena_id = Column(GUID(), ForeignKey('arena_sessions.id'), primary_key=True)
+    student_id = Column(GUID(), ForeignKey('students.id'), primary_key=True)
     fights_played = Column(Integer, default=0)
     
     # relationships
-    arena = relationship("ArenaSession", back_populates="participants")
-    student = relationship("Student", lazy="selectin")
+    arena = relationship("ArenaSession", back_populates="participants", lazy="raise")
+    student = relationship("Student", lazy="raise")
 
 class ArenaSession(Base):
     __tablename__ = "arena_sessions"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     status = Column(
         Enum(ArenaSessionStatus, name="arena_session_status", create_type=False,
              values_callable=lambda x: [e.value for e in x]),
@@ -36,5 +36,5 @@ class ArenaSession(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
 
     # relationships
-    participants = relationship("ArenaParticipant", back_populates="arena", cascade="all, delete-orphan", lazy="selectin")
-    matches = relationship("Match", back_populates="arena_session", cascade="all, delete-orphan", lazy="selectin")
+    participants = relationship("ArenaParticipant", back_populates="arena", cascade="all, delete-orphan", lazy="raise")
+    matches = relationship("Match", back_populates="arena_session", cascade="all, delete-orphan", lazy="raise")
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, String, BigInteger, DateTime, func
+from ..database import Base
+
+class CacheVersion(Base):
+    """
+    Version counter per in-process cache. Bumping a counter invalidates that
+    cache in every app process the next time it checks.
+    """
+    __tablename__ = "cache_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+# SQLite counterpart of the Postgres trigger added in 20250410_add_cache_versions
+_BUMP_ACHIEVEMENT_CATALOG = """
+    INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('achievement_catalog', 0);
+    UPDATE cache_versions SET version = version + 1 WHERE name = 'achievement_catalog';
+"""
+
+SQLITE_TRIGGERS = {
+    f"achievements_bump_catalog_version_{event.lower()}": f"""
+    CREATE TRIGGER IF NOT EXISTS achievements_bump_catalog_version_{event.lower()}
+    AFTER {event} ON achievements
+    BEGIN {_BUMP_ACHIEVEMENT_CATALOG} END
+    """
+    for event in ("INSERT", "UPDATE", "DELETE")
+}
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, func, Enum
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, func, Enum
+from .types import GUID
 import uuid
 import enum
 from ..database import Base
@@ -12,13 +12,22 @@ class DifficultyLevel(enum.Enum):
 class Flashcard(Base):
     __tablename__ = "flashcards"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     question = Column(String, nullable=False)
     answer = Column(String, nullable=False)
-    pack_id = Column(UUID(as_uuid=True), ForeignKey("flashcard_packs.id"), nullable=False)
+    pack_id = Column(GUID(), ForeignKey("flashcard_packs.id"), nullable=False, index=True)
     difficulty = Column(Enum(DifficultyLevel), default=DifficultyLevel.MEDIUM)
     times_used = Column(Integer, default=0)
     times_correct = Column(Integer, default=0)
+    # Fitted from round outcomes by flashcard_calibration, on the ELO scale:
+    # a student rated calibrated_difficulty answers correctly half the time
+    calibrated_difficulty = Column(Float, nullable=True)
+    # Level implied by calibrated_difficulty once enough responses are in;
+    # difficulty stays the level the card's author chose
+    calibrated_level = Column(Enum(DifficultyLevel), nullable=True)
+    discrimination = Column(Float, nullable=True)
+    calibration_responses = Column(Integer, nullable=False, default=0, server_default="0")
+    calibrated_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
 
@@ -37,7 +46,7 @@ class Flashcard(Base):
 class FlashcardPack(Base):
     __tablename__ = "flashcard_packs"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False)
     description = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
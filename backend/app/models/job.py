@@ -0,0 +1,45 @@
+from sqlalchemy import Column, DateTime, Integer, String, Text, Index, func, text
+from .types import GUID, JSONDocument
+from datetime import datetime, timezone
+import uuid
+from ..database import Base
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+class Job(Base):
+    """
+    A unit of background work. Workers claim queued rows with
+    SELECT ... FOR UPDATE SKIP LOCKED, so several workers (in the app or in
+    run_jobs.py) can share the table without double-processing.
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Workers poll for the oldest runnable job
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+        # At most one pending job per dedup key
+        Index(
+            "ux_jobs_dedup_key_pending",
+            "dedup_key",
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+            sqlite_where=text("status IN ('queued', 'running')")
+        ),
+    )
+
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
+    kind = Column(String, nullable=False)
+    payload = Column(JSONDocument, nullable=False)
+    status = Column(String, nullable=False, default=JobStatus.QUEUED)
+    dedup_key = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
@@ -0,0 +1,44 @@
+from sqlalchemy.orm import selectinload, raiseload
+from typing import Dict, List, Tuple
+from sqlalchemy.orm.interfaces import LoaderOption
+
+from .arena_session import ArenaSession, ArenaParticipant
+from .match import Match, MatchParticipant
+
+# All relationships are declared with lazy="raise", so every query that needs
+# related objects has to ask for them. These named profiles are the only
+# loader strategies the routers and services use.
+LOADER_PROFILES: Dict[str, Tuple[LoaderOption, ...]] = {
+    # Arena columns only (status checks, rounds_completed updates)
+    "arena_header": (
+        raiseload("*"),
+    ),
+    # Arena with its participants and their students (arena creation, scheduling)
+    "arena_with_participants": (
+        selectinload(ArenaSession.participants).selectinload(ArenaParticipant.student),
+    ),
+    # Arena with participants and every match, for full session exports
+    "arena_full": (
+        selectinload(ArenaSession.participants).selectinload(ArenaParticipant.student),
+        selectinload(ArenaSession.matches).selectinload(Match.participants),
+    ),
+    # Match with its participant rows (MatchResponse, achievement evaluators)
+    "match_with_participants": (
+        selectinload(Match.participants),
+    ),
+    # Match with participants and their students (history, opponent names)
+    "match_with_participant_students": (
+        selectinload(Match.participants).selectinload(MatchParticipant.student),
+    ),
+    # Match with its rounds (round winner tallies)
+    "match_with_rounds": (
+        selectinload(Match.rounds),
+    ),
+}
+
+def loader_profile(name: str) -> List[LoaderOption]:
+    """Return the loader options for a named profile, for use with .options() or db.get(options=...)"""
+    try:
+        return list(LOADER_PROFILES[name])
+    except KeyError:
+        raise ValueError(f"Unknown loader profile: {name}")
@@ -1,10 +1,15 @@
-from sqlalchemy import Column, ForeignKey, DateTime, String, Float, Enum, Integer, func
-from sqlalchemy.dialects.postgresql import UUID, ARRAY
+from sqlalchemy import Column, ForeignKey, DateTime, String, Float, Enum, Integer, Boolean, Index, func
 from sqlalchemy.orm import relationship
+from .types import GUID, UUIDArray
+from datetime import datetime, timezone
 import uuid
 import enum
 from ..database import Base
 
+def _utcnow():
+    # Set client-side so participants can copy their parent's partition key before commit
+    return datetime.now(timezone.utc)
+
 class MatchStatus(str, enum.Enum):
     PENDING = "pending"
     IN_PROGRESS = "in_progress"
@@ -12,35 +17,54 @@ class MatchStatus(str, enum.Enum):
 
 class MatchParticipant(Base):
     __tablename__ = "match_participants"
+    __table_args__ = (
+        # Per-student history, win counts and streaks as index-only scans
+        Index(
+            "ix_match_participants_student_id_created_at",
+            "student_id", "created_at",
+            postgresql_include=["is_winner", "elo_after"]
+        ),
+    )
 
-    match_id = Column(UUID(as_uuid=True), ForeignKey('matches.id'), primary_key=True)
-    student_id = Column(UUID(as_uuid=True), ForeignKey('students.id'), primary_key=True)
+    match_id = Column(GUID(), ForeignKey('matches.id'), primary_key=True)
+    student_id = Column(GUID(), ForeignKey('students.id'), primary_key=True, index=True)
     elo_before = Column(Float)
     elo_after = Column(Float)
+    # Set when the match completes; NULL while pending or when it ended without a winner
+    is_winner = Column(Boolean, nullable=True)
+    # Copy of matches.created_at; the table is partitioned on it
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
 
     # relationships
-    match = relationship("Match", back_populates="participants")
-    student = relationship("Student")
+    match = relationship("Match", back_populates="participants", lazy="raise")
+    student = relationship("Student", lazy="raise")
 
 class RoundParticipant(Base):
     __tablename__ = "round_participants"
 
-    round_id = Column(UUID(as_uuid=True), ForeignKey('rounds.id'), primary_key=True)
-    student_id = Column(UUID(as_uuid=True), ForeignKey('students.id'), primary_key=True)
+    round_id = Column(GUID(), ForeignKey('rounds.id'), primary_key=True)
+    student_id = Column(GUID(), ForeignKey('students.id'), primary_key=True, index=True)
     elo_before = Column(Float)
     elo_change = Column(Float)
     answer = Column(String)
+    # Copy of rounds.created_at; the table is partitioned on it
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
 
     # relationships
-    round = relationship("Round", back_populates="participants")
-    student = relationship("Student")
+    round = relationship("Round", back_populates="participants", lazy="raise")
+    student = relationship("Student", lazy="raise")
 
 class Match(Base):
     __tablename__ = "matches"
+    __table_args__ = (
+        Index("ix_matches_arena_id_status", "arena_id", "status"),
+        # Incremental analytics exports
+        Index("ix_matches_updated_at", "updated_at"),
+    )
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     arena_id = Column(
-        UUID(as_uuid=True),
+        GUID(),
         ForeignKey("arena_sessions.id", ondelete="CASCADE"),
         nullable=True
     )
@@ -52,29 +76,44 @@ class Match(Base):
     rounds_completed = Column(Integer, default=0)
     
     # Array of winner IDs (supports multiple winners)
-    winner_ids = Column(ARRAY(UUID(as_uuid=True)), nullable=True)
+    winner_ids = Column(UUIDArray(), nullable=True)
     
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Partition key for matches and match_participants
+    created_at = Column(DateTime(timezone=True), nullable=False, default=_utcnow, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
 
     # relationships
-    participants = relationship("MatchParticipant", back_populates="match", cascade="all, delete-orphan", lazy="selectin")
-    rounds = relationship("Round", back_populates="match", cascade="all, delete-orphan")
-    arena_session = relationship("ArenaSession", back_populates="matches")
+    participants = relationship("MatchParticipant", back_populates="match", cascade="all, delete-orphan", lazy="raise")
+    rounds = relationship(
+        "Round",
+        back_populates="match",
+        primaryjoin="Match.id == foreign(Round.match_id)",
+        cascade="all, delete-orphan",
+        lazy="raise"
+    )
+    arena_session = relationship("ArenaSession", back_populates="matches", lazy="raise")
 
 class Round(Base):
     __tablename__ = "rounds"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    match_id = Column(UUID(as_uuid=True), ForeignKey("matches.id"), nullable=False)
-    flashcard_id = Column(UUID(as_uuid=True), ForeignKey("flashcards.id"), nullable=False)
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
+    # No foreign key: rounds are partitioned on their own created_at, which may
+    # fall in a later month than their match's (see 20250310_partition_match_history)
+    match_id = Column(GUID(), nullable=False, index=True)
+    flashcard_id = Column(GUID(), ForeignKey("flashcards.id"), nullable=False, index=True)
     round_number = Column(Integer, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Partition key for rounds and round_participants
+    created_at = Column(DateTime(timezone=True), nullable=False, default=_utcnow, server_default=func.now())
 
     # Array of winner IDs (supports multiple winners)
-    winner_ids = Column(ARRAY(UUID(as_uuid=True)), nullable=True)
+    winner_ids = Column(UUIDArray(), nullable=True)
 
     # relationships
-    match = relationship("Match", back_populates="rounds")
-    flashcard = relationship("Flashcard")
-    participants = relationship("RoundParticipant", back_populates="round", cascade="all, delete-orphan")
+    match = relationship(
+        "Match",
+        back_populates="rounds",
+        primaryjoin="foreign(Round.match_id) == Match.id",
+        lazy="raise"
+    )
+    flashcard = relationship("Flashcard", lazy="raise")
+    participants = relationship("RoundParticipant", back_populates="round", cascade="all, delete-orphan", lazy="raise")
@@ -0,0 +1,45 @@
+from sqlalchemy import Column, String, DateTime, Table, MetaData, BigInteger, Float, func
+from .types import GUID
+from ..database import Base
+
+class MaterializedViewRefresh(Base):
+    __tablename__ = "materialized_view_refreshes"
+
+    view_name = Column(String, primary_key=True)
+    refreshed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+# The materialized views themselves are created by migration, so they are kept
+# out of Base.metadata to stop autogenerate from treating them as tables
+views_metadata = MetaData()
+
+flashcard_usage_stats = Table(
+    "flashcard_usage_stats",
+    views_metadata,
+    Column("flashcard_id", GUID(), primary_key=True),
+    Column("usage_count", BigInteger),
+    Column("total_winners", BigInteger),
+    Column("total_participants", BigInteger),
+    Column("used_in_arenas", BigInteger),
+)
+
+# SQLite has no materialized views; a plain view with the same columns stands in
+# for it, computed on read (winner_ids is stored there as a JSON array)
+SQLITE_VIEWS = {
+    "flashcard_usage_stats": """
+    CREATE VIEW IF NOT EXISTS flashcard_usage_stats AS
+    SELECT
+        r.flashcard_id,
+        count(*) AS usage_count,
+        coalesce(sum(coalesce(json_array_length(r.winner_ids), 0)), 0) AS total_winners,
+        coalesce(sum(rp.participant_count), 0) AS total_participants,
+        count(DISTINCT m.arena_id) AS used_in_arenas
+    FROM rounds r
+    JOIN matches m ON m.id = r.match_id
+    LEFT JOIN (
+        SELECT round_id, count(*) AS participant_count
+        FROM round_participants
+        GROUP BY round_id
+    ) rp ON rp.round_id = r.id
+    GROUP BY r.flashcard_id
+    """,
+}
@@ -1,12 +1,18 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, func
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index, func
+from .types import GUID
 import uuid
 from ..database import Base
 
 class Student(Base):
     __tablename__ = "students"
+    __table_args__ = (
+        # Leaderboard order, used for keyset pagination and rank lookups
+        Index("ix_students_elo_rating_id", "elo_rating", "id"),
+        # Incremental analytics exports
+        Index("ix_students_updated_at", "updated_at"),
+    )
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False)
     avatar_url = Column(String, nullable=True)  # NEW COLUMN for profile pictures
     elo_rating = Column(Float, default=1000.0)  # Starting ELO rating
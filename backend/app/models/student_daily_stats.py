@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Date, DateTime, Float, ForeignKey, Integer, func
+from .types import GUID
+from ..database import Base
+
+class StudentDailyStats(Base):
+    """
+    One row per student per UTC day with completed matches: match and win
+    counts, the summed rating change and the rating after the day's last
+    match. Upserted as matches complete (daily_stats_service) and rebuilt
+    from match_participants by rebuild_daily_stats.py.
+    """
+    __tablename__ = "student_daily_stats"
+
+    student_id = Column(GUID(), ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    matches = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+    elo_change = Column(Float, nullable=False, default=0.0)
+    elo_end = Column(Float, nullable=True)
+    # When the match behind elo_end was played, so late upserts cannot move it backwards
+    last_match_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,61 @@
+import json
+import uuid
+
+from sqlalchemy import JSON, LargeBinary, Text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import TypeDecorator
+
+# Column types that map to native Postgres types and to portable
+# equivalents on SQLite, so the same models run on both backends
+
+class GUID(TypeDecorator):
+    """UUID column: native UUID on Postgres, 16-byte BLOB elsewhere. Always returns uuid.UUID."""
+    impl = LargeBinary(16)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=True))
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if not isinstance(value, uuid.UUID):
+            value = uuid.UUID(str(value))
+        if dialect.name == "postgresql":
+            return value
+        return value.bytes
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, uuid.UUID):
+            return value
+        return uuid.UUID(bytes=bytes(value))
+
+class UUIDArray(TypeDecorator):
+    """List of UUIDs: UUID[] on Postgres, a JSON array of strings elsewhere."""
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(postgresql.ARRAY(postgresql.UUID(as_uuid=True)))
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        values = [item if isinstance(item, uuid.UUID) else uuid.UUID(str(item)) for item in value]
+        if dialect.name == "postgresql":
+            return values
+        return json.dumps([str(item) for item in values])
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if dialect.name == "postgresql":
+            return list(value)
+        return [uuid.UUID(item) for item in json.loads(value)]
+
+# JSON document: JSONB on Postgres, JSON text elsewhere
+JSONDocument = JSON().with_variant(postgresql.JSONB(), "postgresql")
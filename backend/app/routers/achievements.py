@@ -1,37 +1,67 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
-from app.models.achievement import Achievement, StudentAchievement
-from app.schemas.achievement import AchievementResponse, StudentAchievementResponse
-from app.services import achievement_service
-from sqlalchemy.future import select
+from app.database import get_db, get_read_db
+from app.models.achievement import Achievement
+from app.schemas.achievement import AchievementBase, AchievementResponse, StudentAchievementResponse
+from app.services import achievement_service, achievement_criteria
+from app.services.achievement_catalog import achievement_catalog
+from app.core.http_cache import make_etag, is_not_modified, not_modified
 from typing import List
 from uuid import UUID
 
 router = APIRouter(tags=["achievements"])
 
 @router.get("/", response_model=List[AchievementResponse])
-async def get_achievements(db: AsyncSession = Depends(get_db)):
+async def get_achievements(request: Request, response: Response, db: AsyncSession = Depends(get_read_db)):
     """Get all available achievements."""
-    achievements = await achievement_service.get_all_achievements(db)
-    return achievements
+    catalog = await achievement_catalog.get(db)
+    etag = make_etag("catalog", catalog.version)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return catalog.achievements
+
+@router.post("/", response_model=AchievementResponse, status_code=201)
+async def create_achievement(request: AchievementBase, db: AsyncSession = Depends(get_db)):
+    """
+    Create an achievement defined by declarative criteria and award it to
+    every student who already qualifies.
+    """
+    try:
+        achievement_criteria.validate_criteria(request.criteria)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    achievement = Achievement(**request.model_dump())
+    db.add(achievement)
+    await db.flush()
+    if request.criteria:
+        await achievement_service.award_achievement(db, achievement)
+    await db.commit()
+    achievement_catalog.invalidate()
+    await db.refresh(achievement)
+    return achievement
+
+@router.post("/backfill")
+async def backfill_achievements(db: AsyncSession = Depends(get_db)):
+    """Award every achievement to all qualifying students, one statement per achievement."""
+    awarded = await achievement_service.backfill_achievements(db)
+    return {"data": {"awarded": awarded}}
 
 @router.get("/students/{student_id}", response_model=List[StudentAchievementResponse])
-async def get_student_achievements(student_id: UUID, db: AsyncSession = Depends(get_db)):
+async def get_student_achievements(
+    student_id: UUID,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db)
+):
     """Get all achievements earned by a specific student."""
-    # Verify student exists
-    student_achievements = await achievement_service.get_student_achievements(student_id, db)
-    
-    # Load the full achievement data for each student achievement
-    result = []
-    for sa in student_achievements:
-        achievement = await db.get(Achievement, sa.achievement_id)
-        if achievement:
-            result.append({
-                "id": sa.id,
-                "student_id": sa.student_id,
-                "achievement": achievement,
-                "achieved_at": sa.achieved_at
-            })
-    
-    return result
+    loaded = await achievement_service.get_student_achievements(db, student_id)
+    if loaded is None:
+        return []
+    awards, catalog_version = loaded
+    etag = make_etag(catalog_version, *(award["id"] for award in awards))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return awards
@@ -1,29 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from typing import List
+from typing import List, Literal, Optional, Union
 from uuid import UUID
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..models.arena_session import ArenaSession, ArenaSessionStatus, ArenaParticipant
 from ..models.match import Match, MatchStatus, MatchParticipant
 from ..models.student import Student
+from ..models.loader_profiles import loader_profile
 from ..models.arena_schemas import (
     CreateArenaRequest,
     StudentStatsResponse,
     ArenaSessionResponse,
     MatchResponse,
     SetMatchWinnerRequest,
-    MatchWinnerResponse
+    MatchWinnerResponse,
+    MatchWinnerDeltaResponse
 )
 from ..services.arena_stats_service import ArenaStatsService
 from ..services.arena_match_service import ArenaMatchService
+from ..services.stats_view_service import stats_view_refresher
+from ..services.job_queue import job_worker
+from ..core.logging import get_logger, bind_log_context
+from ..services.head_to_head import head_to_head_cache
+from ..core.http_cache import make_etag, is_not_modified, not_modified
 
 # Services
 arena_stats_service = ArenaStatsService()
 arena_match_service = ArenaMatchService()
 
 router = APIRouter()
+logger = get_logger(__name__)
 
 @router.post("", response_model=dict[str, ArenaSessionResponse])
 async def create_arena_session(
@@ -58,7 +65,13 @@ async def create_arena_session(
         db.add(participant)
 
     await db.commit()
-    await db.refresh(arena)
+    result = await db.execute(
+        select(ArenaSession)
+        .options(*loader_profile("arena_with_participants"))
+        .where(ArenaSession.id == arena.id)
+        .execution_options(populate_existing=True)
+    )
+    arena = result.scalar_one()
 
     # Initialize match schedule
     await arena_match_service.initialize_arena_matches(
@@ -71,7 +84,7 @@ async def create_arena_session(
     # Construct proper response with student stats
     participants_list = []
     for participant in arena.participants:
-        student = participant.student  # Already loaded due to lazy="selectin"
+        student = participant.student  # Loaded by the arena_with_participants profile
         participants_list.append(
             StudentStatsResponse(
                 student_id=student.id,
@@ -101,7 +114,7 @@ async def get_next_match(
 ):
     """Get or create the next match in the arena session"""
     # Get arena session
-    arena = await db.get(ArenaSession, arena_id)
+    arena = await db.get(ArenaSession, arena_id, options=loader_profile("arena_header"))
     if not arena:
         raise HTTPException(status_code=404, detail="Arena session not found")
     if arena.status != ArenaSessionStatus.IN_PROGRESS:
@@ -130,24 +143,33 @@ async def get_next_match(
     # Refresh match with eager loading
     result = await db.execute(
         select(Match)
-        .options(selectinload(Match.participants))
+        .options(*loader_profile("match_with_participants"))
         .where(Match.id == match.id)
+        .execution_options(populate_existing=True)
     )
     match = result.scalar_one()
     match_response = MatchResponse.from_orm(match)
     return {"data": match_response}
 
-@router.patch("/matches/{match_id}/winner", response_model=dict[str, MatchWinnerResponse])
+@router.patch(
+    "/matches/{match_id}/winner",
+    response_model=dict[str, Union[MatchWinnerResponse, MatchWinnerDeltaResponse]]
+)
 async def set_match_winner(
     match_id: UUID,
     request: SetMatchWinnerRequest,
+    view: Literal["full", "delta"] = "full",
     db: AsyncSession = Depends(get_db)
 ):
-    """Set the winner of a match and update ELO ratings"""
+    """
+    Set the winner of a match and update ELO ratings.
+    With view=delta only the changed participants are returned and the
+    arena-wide stats are not recalculated.
+    """
     # Get match with participants eager loaded
     result = await db.execute(
         select(Match)
-        .options(selectinload(Match.participants))
+        .options(*loader_profile("match_with_participants"))
         .where(Match.id == match_id)
     )
     match = result.scalar_one_or_none()
@@ -155,6 +177,7 @@ async def set_match_winner(
         raise HTTPException(status_code=404, detail="Match not found")
     if match.status != MatchStatus.IN_PROGRESS:
         raise HTTPException(status_code=400, detail="Match is not in progress")
+    bind_log_context(arena_id=match.arena_id, match_id=match.id)
 
     # Get match participants
     result = await db.execute(
@@ -173,7 +196,7 @@ async def set_match_winner(
             raise HTTPException(status_code=400, detail="Winner must be a player in this match")
 
     # Get arena session
-    arena = await db.get(ArenaSession, match.arena_id)
+    arena = await db.get(ArenaSession, match.arena_id, options=loader_profile("arena_header"))
     if not arena:
         raise HTTPException(status_code=404, detail="Arena session not found")
 
@@ -188,8 +211,33 @@ async def set_match_winner(
         arena.status = ArenaSessionStatus.COMPLETED
 
     await db.commit()
-    # Ensure participants are loaded before returning
-    await db.refresh(match, ['participants'])
+    job_worker.notify()
+    logger.info(
+        "Match winner recorded",
+        winner_ids=request.winner_ids,
+        arena_completed=arena.status == ArenaSessionStatus.COMPLETED,
+        category="matches"
+    )
+
+    # A finished arena changes the leaderboard and card stats, refresh them soon
+    if arena.status == ArenaSessionStatus.COMPLETED:
+        stats_view_refresher.request_refresh()
+
+    if view == "delta":
+        return {
+            "data": MatchWinnerDeltaResponse(
+                match_id=match.id,
+                arena_id=arena.id,
+                status=arena.status,
+                num_rounds=arena.num_rounds,
+                rounds_completed=arena.rounds_completed,
+                participants=arena_stats_service.calculate_match_deltas(
+                    match.winner_ids, participants_with_students
+                )
+            )
+        }
+
+    # match.participants holds the same (already updated) rows as participants_with_students
     await db.refresh(arena)
 
     # Get all arena participants for stats
@@ -226,11 +274,11 @@ async def set_match_winner(
 @router.get("/{arena_id}/results", response_model=dict[str, dict[str, List[StudentStatsResponse]]])
 async def get_arena_results(
     arena_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get final results and statistics for an arena session"""
     # Get arena session
-    arena = await db.get(ArenaSession, arena_id)
+    arena = await db.get(ArenaSession, arena_id, options=loader_profile("arena_header"))
     if not arena:
         raise HTTPException(status_code=404, detail="Arena session not found")
 
@@ -247,3 +295,29 @@ async def get_arena_results(
         db, arena_id, participant_students
     )
     return {"data": {"rankings": stats}}
+
+@router.get("/{arena_id}/head-to-head")
+async def get_arena_head_to_head(
+    arena_id: UUID,
+    request: Request,
+    response: Response,
+    student_ids: Optional[List[UUID]] = Query(None),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Who beat whom in an arena: wins[i][j] is how many matches student_ids[i]
+    won against student_ids[j]. Pass student_ids to narrow it to some of the
+    participants (required for larger arenas). Cached until the next completed match.
+    """
+    arena = await db.get(ArenaSession, arena_id)
+    if not arena:
+        raise HTTPException(status_code=404, detail="Arena session not found")
+    try:
+        version, matrix = await head_to_head_cache.get(db, arena_id, student_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    etag = make_etag(version, arena_id, *matrix["student_ids"])
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return {"data": matrix}
@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from uuid import UUID
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..services.statistics_service import StatisticsService
+from ..services.leaderboard_index import leaderboard_index
+from ..services.stats_view_service import get_view_staleness, refresh_stats_views, STATS_VIEWS
+from ..services.head_to_head import head_to_head_cache
+from ..core.http_cache import make_etag, is_not_modified, not_modified
 
 router = APIRouter()
 
+# Largest page the paginated endpoints return
+MAX_PAGE_SIZE = 100
+
 @router.get("/flashcards/{flashcard_id}/stats")
 async def get_flashcard_stats(
     flashcard_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> Dict[str, Any]:
     """Get comprehensive statistics for a specific flashcard"""
     try:
@@ -22,16 +29,113 @@ async def get_flashcard_stats(
 @router.get("/flashcards/most-used")
 async def get_most_used_flashcards(
     limit: int = 10,
-    db: AsyncSession = Depends(get_db)
-) -> Dict[str, List[Dict[str, Any]]]:
+    db: AsyncSession = Depends(get_read_db)
+) -> Dict[str, Any]:
     """Get flashcards sorted by usage frequency"""
     stats = await StatisticsService.get_most_used_flashcards(db, limit)
-    return {"data": stats}
+    staleness = await get_view_staleness("flashcard_usage_stats", db)
+    return {"data": stats, "meta": staleness}
+
+@router.get("/leaderboard")
+async def get_leaderboard(
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+) -> Dict[str, Any]:
+    """
+    Students by ELO rating with rank and win/loss totals, one page at a time;
+    pass meta.next_cursor for the next page
+    """
+    try:
+        leaderboard, next_cursor = await StatisticsService.get_leaderboard(db, min(limit, MAX_PAGE_SIZE), cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"data": leaderboard, "meta": {"next_cursor": next_cursor}}
+
+@router.get("/students/{student_id}/rank")
+async def get_student_rank(student_id: UUID) -> Dict[str, Any]:
+    """
+    Rank and percentile of a student, ranked as on the leaderboard, from the
+    in-memory leaderboard index
+    """
+    rank = leaderboard_index.rank(student_id)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return {"data": rank}
+
+@router.get("/students/{student_id}/around")
+async def get_students_around(
+    student_id: UUID,
+    radius: int = 5,
+    db: AsyncSession = Depends(get_read_db)
+) -> Dict[str, Any]:
+    """A student and their neighbours on the leaderboard, radius places either side"""
+    rows = leaderboard_index.around(student_id, max(0, min(radius, MAX_PAGE_SIZE)))
+    if rows is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return {"data": await StatisticsService.with_student_names(rows, db)}
+
+@router.get("/students/{student_id}/stats")
+async def get_student_stats(
+    student_id: UUID,
+    db: AsyncSession = Depends(get_read_db)
+) -> Dict[str, Any]:
+    """Get match totals, win rate, average ELO change and rank for a student"""
+    try:
+        stats = await StatisticsService.get_student_stats(str(student_id), db)
+        return {"data": stats}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/students/{student_id}/matches")
+async def get_student_match_history(
+    student_id: UUID,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+) -> Dict[str, Any]:
+    """Get a student's completed matches, newest first; pass meta.next_cursor for the next page"""
+    try:
+        history, next_cursor = await StatisticsService.get_match_history(
+            str(student_id), db, min(limit, MAX_PAGE_SIZE), cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"data": history, "meta": {"next_cursor": next_cursor}}
+
+@router.get("/head-to-head")
+async def get_class_head_to_head(
+    request: Request,
+    response: Response,
+    student_ids: List[UUID] = Query(...),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Who beat whom among the given students: wins[i][j] is how many matches
+    student_ids[i] won against student_ids[j]. Cached until the next completed match.
+    """
+    try:
+        version, matrix = await head_to_head_cache.get(db, student_ids=student_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    etag = make_etag(version, *matrix["student_ids"])
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return {"data": matrix}
+
+@router.post("/refresh")
+async def refresh_stats(
+    db: AsyncSession = Depends(get_db)
+) -> Dict[str, Any]:
+    """Refresh the statistics views now instead of waiting for the scheduler"""
+    await refresh_stats_views(db)
+    return {"data": [await get_view_staleness(view_name, db) for view_name in STATS_VIEWS]}
 
 @router.get("/arena/{arena_id}/flashcard-stats")
 async def get_arena_flashcard_stats(
     arena_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> Dict[str, List[Dict[str, Any]]]:
     """Get statistics for all flashcards used in a specific arena session"""
     try:
@@ -66,6 +66,10 @@ class FlashcardResponse(FlashcardBase):
     id: UUID
     times_used: int
     times_correct: int
+    calibrated_difficulty: Optional[float] = None
+    calibrated_level: Optional[DifficultyLevel] = None
+    discrimination: Optional[float] = None
+    calibration_responses: int = 0
     created_at: datetime
     updated_at: datetime
 
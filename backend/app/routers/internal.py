@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Any
+from ..database import engine, replica_engine, db_settings, get_db
+from ..core.db_config import pool_status, pool_metrics
+from ..services.job_queue import get_queue_depth
+from ..services.flashcard_counters import flashcard_counters
+
+router = APIRouter()
+
+@router.get("/db-pool")
+async def get_db_pool_status() -> Dict[str, Any]:
+    """Connection pool occupancy, checkout wait times and overflow/timeout counters"""
+    status = pool_status(engine.sync_engine.pool)
+    if "overflow" in status:
+        status["max_overflow"] = db_settings.max_overflow
+    status.update(pool_metrics(engine.sync_engine.pool))
+    if replica_engine is not None:
+        replica_pool = replica_engine.sync_engine.pool
+        status["replica"] = pool_status(replica_pool) | pool_metrics(replica_pool)
+    return {"data": status}
+
+@router.get("/jobs")
+async def get_job_queue_status(db: AsyncSession = Depends(get_db)) -> Dict[str, Any]:
+    """Number of background jobs per status"""
+    return {"data": await get_queue_depth(db)}
+
+@router.get("/flashcard-counters")
+async def get_flashcard_counter_status() -> Dict[str, Any]:
+    """Unflushed flashcard usage increments, their age and flush history"""
+    return {"data": flashcard_counters.metrics()}
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import case, func, select, update
 from typing import List, Optional, Dict
 from uuid import UUID
 from pydantic import BaseModel, conlist
@@ -46,11 +46,15 @@ class RoundResponse(BaseModel):
     class Config:
         from_attributes = True
 
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..models.student import Student
+from ..models.loader_profiles import loader_profile
 from ..services.matchmaking_service import MatchmakingService
 from ..services.elo_service import EloService
-from ..services import achievement_service
+from ..services import achievement_service, daily_stats_service, flashcard_calibration
+from ..services.job_queue import job_worker
+from ..services.flashcard_counters import flashcard_counters
+from ..core.logging import bind_log_context
 
 class CreateMultiplayerMatchRequest(BaseModel):
     player_ids: conlist(UUID, min_length=2)  # At least 2 players required
@@ -91,7 +95,7 @@ matchmaking_service = MatchmakingService()
 elo_service = EloService()
 
 @router.get("")
-async def get_matches(db: AsyncSession = Depends(get_db)):
+async def get_matches(db: AsyncSession = Depends(get_read_db)):
     """Get all matches"""
     result = await db.execute(select(Match))
     matches = result.scalars().all()
@@ -100,7 +104,7 @@ async def get_matches(db: AsyncSession = Depends(get_db)):
 @router.get("/{match_id}", response_model=dict[str, MatchResponse])
 async def get_match(match_id: UUID, db: AsyncSession = Depends(get_db)):
     """Get match by ID"""
-    match = await db.get(Match, match_id)
+    match = await db.get(Match, match_id, options=loader_profile("match_with_participants"))
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
     return {"data": match}
@@ -163,6 +167,7 @@ async def update_match_status(
     match = await db.get(Match, match_id)
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
+    bind_log_context(arena_id=match.arena_id, match_id=match.id)
     
     new_status = request.get_status()
     
@@ -201,6 +206,8 @@ async def update_match_status(
         # Update match status and winner_ids
         match.status = MatchStatus.COMPLETED
         match.winner_ids = [request.winner_id]  # Store as array
+        for participant in participants:
+            participant.is_winner = participant.student_id == request.winner_id
         
         # Calculate total ELO changes from rounds
         result = await db.execute(
@@ -222,40 +229,34 @@ async def update_match_status(
             loser.losses += 1
             loser.total_matches += 1
 
-        # Get all matches for achievement evaluation using participants
-        result = await db.execute(
-            select(Match).join(MatchParticipant).where(
-                MatchParticipant.student_id == winner.id
-            )
+        # Fold this result into each player's achievement state; awards are evaluated by a job
+        await achievement_service.record_match_results(
+            db,
+            [(winner.id, True, winner.elo_rating)] +
+            [(loser.id, False, loser.elo_rating) for loser in losers],
+            played_at=match.created_at
         )
-        winner_matches = result.scalars().all()
-        
-        # Get matches for all losers
-        for loser in losers:
-            result = await db.execute(
-                select(Match).join(MatchParticipant).where(
-                    MatchParticipant.student_id == loser.id
-                )
-            )
-            loser_matches = result.scalars().all()
-
-        print(f"[Match Debug] Evaluating achievements for winner {winner.id} (ELO: {winner.elo_rating})")
-        winner_achievements = await achievement_service.evaluate_student_achievements(winner, winner_matches, db)
-        if winner_achievements:
-            print(f"[Match Debug] Winner earned {len(winner_achievements)} new achievements")
-        
-        print(f"[Match Debug] Evaluating achievements for loser {loser.id} (ELO: {loser.elo_rating})")
-        loser_achievements = await achievement_service.evaluate_student_achievements(loser, loser_matches, db)
-        if loser_achievements:
-            print(f"[Match Debug] Loser earned {len(loser_achievements)} new achievements")
+        await achievement_service.enqueue_achievement_evaluation(
+            db, match.id, [winner.id] + [loser.id for loser in losers]
+        )
+        for participant in participants:
+            participant.elo_after = students[participant.student_id].elo_rating
+        await daily_stats_service.record_match(db, match)
     
     # Handle other status changes
     else:
         match.status = new_status
     
     await db.commit()
-    await db.refresh(match)
-    return {"data": match}
+    job_worker.notify()
+    # Participants are lazy="raise"; reload the match with them for the response
+    result = await db.execute(
+        select(Match)
+        .options(*loader_profile("match_with_participants"))
+        .where(Match.id == match_id)
+        .execution_options(populate_existing=True)
+    )
+    return {"data": result.scalar_one()}
 
 @router.get("/{match_id}/rounds", response_model=dict[str, List[RoundResponse]])
 async def get_match_rounds(match_id: UUID, db: AsyncSession = Depends(get_db)):
@@ -266,6 +267,30 @@ async def get_match_rounds(match_id: UUID, db: AsyncSession = Depends(get_db)):
     rounds = result.scalars().all()
     return {"data": rounds}
 
+@router.get("/{match_id}/next-flashcard")
+async def get_next_flashcard(
+    match_id: UUID,
+    pack_id: UUID,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Suggest the card from a pack that best fits this match: the unused card
+    whose calibrated difficulty is closest to the participants' mean rating.
+    """
+    match = await db.get(Match, match_id, options=loader_profile("match_with_participants"))
+    if not match:
+        raise HTTPException(status_code=404, detail="Match not found")
+    ratings = [p.elo_before for p in match.participants if p.elo_before is not None]
+    rating = sum(ratings) / len(ratings) if ratings else flashcard_calibration.BASE_RATING
+
+    result = await db.execute(select(Round.flashcard_id).where(Round.match_id == match_id))
+    cards = await flashcard_calibration.suggest_flashcards(
+        db, pack_id, rating, exclude_ids=list(result.scalars().all())
+    )
+    if not cards:
+        raise HTTPException(status_code=404, detail="No unused flashcards left in this pack")
+    return {"data": cards[0]}
+
 @router.post("/rounds")
 async def create_round(
     request: CreateRoundRequest,
@@ -297,6 +322,8 @@ async def create_round(
     )
     
     db.add(round)
+    # Rounds are exported with their match, by the match's updated_at
+    match.updated_at = func.now()
     await db.commit()
     await db.refresh(round)
     
@@ -332,6 +359,8 @@ async def submit_round_answer(
         round.player2_answer = request.answer
     else:
         raise HTTPException(status_code=400, detail="Player is not part of this match")
+    # Rounds are exported with their match, by the match's updated_at
+    match.updated_at = func.now()
     
     await db.commit()
     await db.refresh(round)
@@ -349,7 +378,8 @@ async def set_round_winner(
     if not round:
         raise HTTPException(status_code=404, detail="Round not found")
     
-    match = await db.get(Match, round.match_id)
+    match = await db.get(Match, round.match_id, options=loader_profile("match_with_rounds"))
+    bind_log_context(arena_id=match.arena_id, match_id=match.id, round_id=round.id)
     if match.status != MatchStatus.IN_PROGRESS:
         raise HTTPException(status_code=400, detail="Match is not in progress")
     
@@ -398,8 +428,11 @@ async def set_round_winner(
             students[p.student_id].elo_rating += p.elo_change
     
     # Update round
+    round.winner_ids = list(request.winner_ids)
     if len(request.winner_ids) == 1:
         round.winner_id = request.winner_ids[0]
+    # The card's outcomes changed; refit it with the next calibration run
+    await flashcard_calibration.enqueue_calibration(db)
     
     # Update match rounds completed
     match.rounds_completed += 1
@@ -413,6 +446,21 @@ async def set_round_winner(
         if winner_counts:
             winner_id = max(winner_counts.items(), key=lambda x: x[1])[0]
             match.winner_ids = [winner_id]  # Store as array
+            await db.execute(
+                update(MatchParticipant)
+                .where(
+                    MatchParticipant.match_id == match.id,
+                    MatchParticipant.created_at == match.created_at
+                )
+                .values(
+                    is_winner=MatchParticipant.student_id == winner_id,
+                    # Ratings already include this round; stored for the progress rollups
+                    elo_after=case(
+                        *((MatchParticipant.student_id == student.id, student.elo_rating) for student in students.values()),
+                        else_=MatchParticipant.elo_after
+                    )
+                )
+            )
             
             # Get winner and losers
             result = await db.execute(
@@ -429,35 +477,30 @@ async def set_round_winner(
                 loser.losses += 1
                 loser.total_matches += 1
             
-            # Get all matches for achievement evaluation
-            result = await db.execute(
-                select(Match).join(MatchParticipant).where(
-                    MatchParticipant.student_id == winner.id
-                )
+            # Fold this result into each player's achievement state; awards are evaluated by a job
+            await achievement_service.record_match_results(
+                db,
+                [(winner.id, True, winner.elo_rating)] +
+                [(loser.id, False, loser.elo_rating) for loser in losers],
+                played_at=match.created_at
             )
-            winner_matches = result.scalars().all()
-            
-            # Evaluate achievements for winner
-            print(f"[Match Debug] Evaluating achievements for winner {winner.id} (ELO: {winner.elo_rating})")
-            winner_achievements = await achievement_service.evaluate_student_achievements(winner, winner_matches, db)
-            if winner_achievements:
-                print(f"[Match Debug] Winner earned {len(winner_achievements)} new achievements")
-            
-            # Evaluate achievements for losers
-            for loser in losers:
-                result = await db.execute(
-                    select(Match).join(MatchParticipant).where(
-                        MatchParticipant.student_id == loser.id
-                    )
-                )
-                loser_matches = result.scalars().all()
-                
-                print(f"[Match Debug] Evaluating achievements for loser {loser.id} (ELO: {loser.elo_rating})")
-                loser_achievements = await achievement_service.evaluate_student_achievements(loser, loser_matches, db)
-                if loser_achievements:
-                    print(f"[Match Debug] Loser earned {len(loser_achievements)} new achievements")
+            await achievement_service.enqueue_achievement_evaluation(
+                db, match.id, [winner.id] + [loser.id for loser in losers]
+            )
+            await daily_stats_service.record_match(db, match)
+    
+    # Every player of the match saw the card; round_participants only holds answers
+    players = await db.scalar(
+        select(func.count()).select_from(MatchParticipant).where(
+            MatchParticipant.match_id == match.id,
+            MatchParticipant.created_at == match.created_at
+        )
+    )
     
     await db.commit()
+    job_worker.notify()
+    # Card usage counters are written behind, so the round never waits on the card's row
+    flashcard_counters.record(round.flashcard_id, used=players, correct=len(winners))
     await db.refresh(round)
     
     return {"data": round}
@@ -1,19 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
-from sqlalchemy.orm import selectinload
-from typing import List, Generic, TypeVar, Literal
+from sqlalchemy import select, delete, and_
+from typing import List, Generic, TypeVar, Literal, Optional
 from pydantic import BaseModel, constr, validator, ConfigDict
-from datetime import datetime
+from datetime import date, datetime
 from uuid import UUID
 
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..models.student import Student
-from ..models.match import Match, MatchStatus, MatchParticipant
+from ..models.match import Match, MatchStatus, MatchParticipant, RoundParticipant
+from ..models.arena_session import ArenaParticipant
 from ..models.flashcard import Flashcard
-from ..models.achievement import Achievement, StudentAchievement
-from ..services import achievement_service
+from ..models.achievement import StudentAchievementState
+from ..models.student_daily_stats import StudentDailyStats
+from ..models.loader_profiles import loader_profile
+from ..services import achievement_service, daily_stats_service
+from ..services.stats_view_service import stats_view_refresher
 from ..schemas.achievement import StudentAchievementResponse
+from ..core.logging import get_logger
+from ..core.http_cache import make_etag, is_not_modified, not_modified
 
 T = TypeVar('T')
 
@@ -32,7 +37,29 @@ class MatchHistoryItem(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class ProgressPoint(BaseModel):
+    start: date
+    matches: int
+    wins: int
+    elo_change: float
+    elo_end: Optional[float] = None
+
+class ProgressTotals(BaseModel):
+    matches: int
+    wins: int
+    win_rate: float
+    elo_change: float
+
+class StudentProgress(BaseModel):
+    view: Literal["week", "month", "term"]
+    interval: Literal["day", "week"]
+    start: date
+    end: date
+    points: List[ProgressPoint]
+    totals: ProgressTotals
+
 router = APIRouter(tags=["students"])
+logger = get_logger(__name__, category="achievements")
 
 class StudentBase(BaseModel):
     name: constr(min_length=1, max_length=100)
@@ -93,7 +120,7 @@ async def create_student(
 
 @router.get("", response_model=DataResponse[List[StudentResponse]])
 async def get_students(
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get all students"""
     result = await db.execute(select(Student))
@@ -157,54 +184,47 @@ async def delete_student(
         )
 
     # Delete student from round_participants table
-    from sqlalchemy import text
     await db.execute(
-        text("DELETE FROM round_participants WHERE student_id = :sid"),
-        {"sid": str(student_id)}
+        delete(RoundParticipant).where(RoundParticipant.student_id == student_id)
     )
     # Delete student from match_participants table
     await db.execute(
-        text("DELETE FROM match_participants WHERE student_id = :sid"),
-        {"sid": str(student_id)}
+        delete(MatchParticipant).where(MatchParticipant.student_id == student_id)
     )
     # Delete student from arena_participants table
     await db.execute(
-        text("DELETE FROM arena_participants WHERE student_id = :sid"),
-        {"sid": str(student_id)}
+        delete(ArenaParticipant).where(ArenaParticipant.student_id == student_id)
+    )
+    # Delete the student's daily progress rollups
+    await db.execute(
+        delete(StudentDailyStats).where(StudentDailyStats.student_id == student_id)
     )
 
     await db.delete(student)
     await db.commit()
+    # Deleting leaves no newer row behind for the refresher to notice
+    stats_view_refresher.request_refresh(force=True)
 
 @router.get("/{student_id}/achievements", response_model=DataResponse[List[StudentAchievementResponse]])
-async def get_student_achievements(student_id: UUID, db: AsyncSession = Depends(get_db)):
-    """Get all achievements earned by a specific student."""
-    # Verify student exists
-    student = await db.get(Student, student_id)
-    if not student:
+async def get_student_achievements(
+    student_id: UUID,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get all achievements earned by a student, in one query with ETag support."""
+    loaded = await achievement_service.get_student_achievements(db, student_id)
+    if loaded is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Student not found"
         )
-    
-    # Get student achievements with joined achievement data
-    result = await db.execute(
-        select(StudentAchievement, Achievement)
-        .join(Achievement, StudentAchievement.achievement_id == Achievement.id)
-        .where(StudentAchievement.student_id == student_id)
-        .order_by(desc(StudentAchievement.achieved_at))
-    )
-    
-    achievements_data = []
-    for sa, achievement in result:
-        achievements_data.append({
-            "id": sa.id,
-            "student_id": sa.student_id,
-            "achievement": achievement,
-            "achieved_at": sa.achieved_at
-        })
-    
-    return {"data": achievements_data}
+    awards, catalog_version = loaded
+    etag = make_etag(catalog_version, *(award["id"] for award in awards))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return {"data": awards}
 
 @router.post("/{student_id}/evaluate-achievements")
 async def evaluate_student_achievements(
@@ -220,19 +240,15 @@ async def evaluate_student_achievements(
             detail="Student not found"
         )
 
-    # Get all matches for this student using the participants relationship
-    result = await db.execute(
-        select(Match)
-        .join(MatchParticipant, Match.id == MatchParticipant.match_id)
-        .where(MatchParticipant.student_id == student_id)
-    )
+    # Full history: this endpoint is the backfill path and rebuilds the achievement state
+    result = await db.execute(achievement_service.student_matches_query(student_id))
     matches = result.scalars().all()
 
-    print(f"[Achievement Debug] Evaluating achievements for existing student {student_id}")
-    print(f"[Achievement Debug] Found {len(matches)} matches to evaluate")
-    
+    logger.debug("Evaluating achievements from history", student_id=student_id, matches=len(matches))
+
     # Evaluate achievements
     newly_earned = await achievement_service.evaluate_student_achievements(student, matches, db)
+    await db.commit()
     
     return {
         "data": {
@@ -259,6 +275,30 @@ async def get_student_stats(
         )
     return {"data": student}
 
+@router.get("/{student_id}/progress", response_model=DataResponse[StudentProgress])
+async def get_student_progress(
+    student_id: UUID,
+    view: str = "week",
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Progress chart data from the daily rollups: the last 7 or 30 days (week,
+    month) or the term's weeks (term), ending at end (default today, UTC).
+    """
+    if view not in daily_stats_service.PROGRESS_VIEWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"view must be one of {', '.join(daily_stats_service.PROGRESS_VIEWS)}"
+        )
+    student = await db.get(Student, student_id)
+    if not student:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Student not found"
+        )
+    return {"data": await daily_stats_service.get_progress(db, student_id, view, end)}
+
 @router.post("/{student_id}/reset", response_model=DataResponse[StudentResponse])
 async def reset_student_stats(
     student_id: UUID,
@@ -280,14 +320,17 @@ async def reset_student_stats(
 
     # 1) Remove match history
     #    Remove all RoundParticipants and MatchParticipants rows for this student
-    from sqlalchemy import text
     await db.execute(
-        text("DELETE FROM round_participants WHERE student_id = :sid"),
-        {"sid": str(student_id)}
+        delete(RoundParticipant).where(RoundParticipant.student_id == student_id)
+    )
+    await db.execute(
+        delete(MatchParticipant).where(MatchParticipant.student_id == student_id)
     )
     await db.execute(
-        text("DELETE FROM match_participants WHERE student_id = :sid"),
-        {"sid": str(student_id)}
+        delete(StudentAchievementState).where(StudentAchievementState.student_id == student_id)
+    )
+    await db.execute(
+        delete(StudentDailyStats).where(StudentDailyStats.student_id == student_id)
     )
 
     # 2) Reset fields to default values
@@ -304,11 +347,13 @@ async def reset_student_stats(
 @router.get("/{student_id}/history", response_model=DataResponse[List[MatchHistoryItem]])
 async def get_student_history(
     student_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Return match history for a student, including ELO changes and results,
     adapting to the new participant-based match schema.
+    Pass since to only read the monthly partitions from that date on.
     """
     # 1) Verify student exists
     student = await db.get(Student, student_id)
@@ -318,14 +363,24 @@ async def get_student_history(
     # 2) Query all matches in which this student participated
     stmt = (
         select(Match)
-        .join(MatchParticipant, Match.id == MatchParticipant.match_id)
-        .options(
-            # preload the participants -> student relationship
-            selectinload(Match.participants).selectinload(MatchParticipant.student)
+        .join(
+            MatchParticipant,
+            and_(
+                Match.id == MatchParticipant.match_id,
+                Match.created_at == MatchParticipant.created_at
+            )
         )
+        # preload the participants -> student relationship
+        .options(*loader_profile("match_with_participant_students"))
         .where(MatchParticipant.student_id == student_id)
         .order_by(Match.created_at.desc())
     )
+    if since is not None:
+        # Filter both sides so each table is pruned to the matching partitions
+        stmt = stmt.where(
+            MatchParticipant.created_at >= since,
+            Match.created_at >= since
+        )
     results = await db.execute(stmt)
     matches = results.scalars().all()
 
@@ -351,11 +406,11 @@ async def get_student_history(
         elo_change = new_elo - old_elo
 
         # Only show completed matches with winners
-        if match.status != MatchStatus.COMPLETED or not match.winner_ids or len(match.winner_ids) == 0:
+        if match.status != MatchStatus.COMPLETED or user_participant.is_winner is None:
             continue
             
         # Determine win/loss
-        result_str = "win" if user_participant.student_id in match.winner_ids else "loss"
+        result_str = "win" if user_participant.is_winner else "loss"
 
         # For "opponent_name", pick the first opponent if any
         opponent_name = "Unknown"
@@ -0,0 +1,67 @@
+"""
+In-process cache of the achievement catalog.
+
+The catalog is read on every evaluation and every profile page but edited
+rarely. Each process keeps one snapshot and checks the catalog's row in
+cache_versions at most every ACHIEVEMENT_CATALOG_CHECK_SECONDS. A trigger on
+achievements bumps the version on every edit, whoever makes it.
+"""
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.achievement import Achievement
+from .cache_versions import get_cache_version
+
+ACHIEVEMENT_CATALOG = "achievement_catalog"
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    achievements: List[Achievement]
+    by_id: Dict[UUID, Achievement] = field(init=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "by_id", {achievement.id: achievement for achievement in self.achievements})
+
+    @property
+    def with_criteria(self) -> List[Achievement]:
+        return [achievement for achievement in self.achievements if achievement.criteria is not None]
+
+class AchievementCatalogCache:
+    """
+    Snapshot of all achievements, reloaded when the catalog version moves.
+    Cached achievements are detached from any session and must not be modified.
+    """
+
+    def __init__(self, check_seconds: float):
+        self.check_seconds = check_seconds
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+
+    async def get(self, db: AsyncSession, force_check: bool = False) -> CatalogSnapshot:
+        now = time.monotonic()
+        if self._snapshot is not None and not force_check and now - self._checked_at < self.check_seconds:
+            return self._snapshot
+        # Version first: an edit landing between the two reads leaves the old
+        # version with the new catalog, which only causes one extra reload
+        version = await get_cache_version(db, ACHIEVEMENT_CATALOG)
+        if self._snapshot is None or self._snapshot.version != version:
+            result = await db.execute(select(Achievement).order_by(Achievement.created_at, Achievement.code))
+            achievements = list(result.scalars().all())
+            for achievement in achievements:
+                db.expunge(achievement)
+            self._snapshot = CatalogSnapshot(version, achievements)
+        self._checked_at = now
+        return self._snapshot
+
+    def invalidate(self) -> None:
+        """Drop this process's snapshot after a local edit; other processes follow the version bump."""
+        self._snapshot = None
+
+achievement_catalog = AchievementCatalogCache(float(os.getenv("ACHIEVEMENT_CATALOG_CHECK_SECONDS", 5)))
@@ -0,0 +1,146 @@
+"""
+Declarative achievement criteria.
+
+Achievement.criteria holds a list of rules that must all hold:
+
+    {"all": [
+        {"metric": "max_win_streak", "op": ">=", "value": 5},
+        {"metric": "pack_wins", "pack_id": "<uuid>", "op": ">=", "value": 10}
+    ]}
+
+State metrics come from student_achievement_states and can be checked in
+memory after a match; "rating" is the student's current rating; "pack_wins"
+counts won matches that used a flashcard from the given pack and always
+needs SQL. compile_criteria turns the rules into one set-based query over
+all students.
+"""
+import operator
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, func, and_, exists, distinct
+
+from ..models.achievement import StudentAchievement, StudentAchievementState
+from ..models.flashcard import Flashcard
+from ..models.match import MatchParticipant, Round
+from ..models.student import Student
+
+OPERATORS = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "==": operator.eq,
+}
+
+# Metrics read from the running achievement state
+STATE_METRICS = {
+    "match_count": StudentAchievementState.match_count,
+    "win_count": StudentAchievementState.win_count,
+    "current_win_streak": StudentAchievementState.current_win_streak,
+    "max_win_streak": StudentAchievementState.max_win_streak,
+    "peak_rating": StudentAchievementState.peak_rating,
+}
+
+# Counters default to 0 for students without a state row; peak_rating stays NULL
+COUNTER_METRICS = {"match_count", "win_count", "current_win_streak", "max_win_streak"}
+
+# Metrics that need match history
+HISTORY_METRICS = {"pack_wins"}
+
+METRICS = set(STATE_METRICS) | {"rating"} | HISTORY_METRICS
+
+def validate_criteria(criteria: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return the list of rules, or raise ValueError if criteria is malformed."""
+    if criteria is None:
+        return []
+    if not isinstance(criteria, dict) or not isinstance(criteria.get("all"), list):
+        raise ValueError('criteria must look like {"all": [rule, ...]}')
+    rules = criteria["all"]
+    for rule in rules:
+        if not isinstance(rule, dict):
+            raise ValueError("each rule must be an object")
+        if rule.get("metric") not in METRICS:
+            raise ValueError(f"unknown metric {rule.get('metric')!r}; expected one of {sorted(METRICS)}")
+        if rule.get("op") not in OPERATORS:
+            raise ValueError(f"unknown op {rule.get('op')!r}; expected one of {sorted(OPERATORS)}")
+        if not isinstance(rule.get("value"), (int, float)) or isinstance(rule.get("value"), bool):
+            raise ValueError("rule value must be a number")
+        if rule["metric"] == "pack_wins":
+            try:
+                uuid.UUID(str(rule.get("pack_id")))
+            except ValueError:
+                raise ValueError("pack_wins rules need a valid pack_id")
+    return rules
+
+def needs_history(criteria: Optional[Dict[str, Any]]) -> bool:
+    return any(rule["metric"] in HISTORY_METRICS for rule in validate_criteria(criteria))
+
+def matches_state(criteria: Optional[Dict[str, Any]], student: Student, state: StudentAchievementState) -> bool:
+    """
+    Check state-only criteria in memory. Criteria with history metrics must
+    go through compile_criteria instead. Empty criteria never match.
+    """
+    rules = validate_criteria(criteria)
+    if not rules:
+        return False
+    for rule in rules:
+        metric = rule["metric"]
+        if metric in HISTORY_METRICS:
+            raise ValueError(f"{metric} needs match history; use compile_criteria")
+        value = student.elo_rating if metric == "rating" else getattr(state, metric)
+        if value is None and metric in COUNTER_METRICS:
+            value = 0
+        if value is None or not OPERATORS[rule["op"]](value, rule["value"]):
+            return False
+    return True
+
+def _pack_wins(pack_id: uuid.UUID):
+    """Correlated count of won matches that used a flashcard from the pack"""
+    return (
+        select(func.count(distinct(MatchParticipant.match_id)))
+        .join(Round, Round.match_id == MatchParticipant.match_id)
+        .join(Flashcard, Flashcard.id == Round.flashcard_id)
+        .where(
+            MatchParticipant.student_id == Student.id,
+            MatchParticipant.is_winner.is_(True),
+            Flashcard.pack_id == pack_id
+        )
+        .correlate(Student)
+        .scalar_subquery()
+    )
+
+def _rule_condition(rule: Dict[str, Any]):
+    metric = rule["metric"]
+    if metric == "rating":
+        column = Student.elo_rating
+    elif metric == "pack_wins":
+        column = _pack_wins(uuid.UUID(str(rule["pack_id"])))
+    elif metric in COUNTER_METRICS:
+        column = func.coalesce(STATE_METRICS[metric], 0)
+    else:
+        column = STATE_METRICS[metric]
+    return OPERATORS[rule["op"]](column, rule["value"])
+
+def compile_criteria(criteria: Dict[str, Any], achievement_id: uuid.UUID, student_ids=None):
+    """
+    SELECT of the IDs of every student who meets the criteria and does not
+    hold the achievement yet, optionally limited to student_ids.
+    """
+    rules = validate_criteria(criteria)
+    if not rules:
+        raise ValueError("cannot compile empty criteria")
+    stmt = (
+        select(Student.id)
+        .outerjoin(StudentAchievementState, StudentAchievementState.student_id == Student.id)
+        .where(and_(*[_rule_condition(rule) for rule in rules]))
+        .where(
+            ~exists().where(
+                StudentAchievement.student_id == Student.id,
+                StudentAchievement.achievement_id == achievement_id
+            )
+        )
+    )
+    if student_ids is not None:
+        stmt = stmt.where(Student.id.in_(list(student_ids)))
+    return stmt
@@ -1,193 +1,313 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from app.models.achievement import Achievement, StudentAchievement
+from app.models.achievement import Achievement, StudentAchievement, StudentAchievementState
 from app.models.student import Student
-from app.models.match import Match, MatchStatus
-from datetime import datetime
-from typing import Callable, Dict, List, Any
-from sqlalchemy import desc, and_
-
-# Type alias for evaluator functions
-AchievementEvaluator = Callable[[Student, List[Match]], bool]
-
-# Example evaluator functions:
-def evaluator_elo_1000(student: Student, matches: List[Match]) -> bool:
-    print(f"[Achievement Debug] Evaluating elo-1000 for student {student.id}")
-    print(f"[Achievement Debug] Current ELO: {student.elo_rating}")
-    
-    # Only award if they earned it through matches (not default rating)
-    if not matches:
-        print("[Achievement Debug] No matches found")
-        return False
-    
-    # Sort matches by date to track ELO progression
-    sorted_matches = sorted(matches, key=lambda m: m.created_at)
-    
-    # Track if they earned 1000+ through matches
-    for match in sorted_matches:
+from app.models.match import Match, MatchStatus, MatchParticipant
+from app.models.loader_profiles import loader_profile
+from app.models.types import GUID
+from app.database import dialect_insert, IS_SQLITE
+from app.core.logging import get_logger
+from app.services import achievement_criteria
+from app.services.job_queue import enqueue, job_handler
+from app.services.achievement_catalog import achievement_catalog
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+import uuid
+from sqlalchemy import desc, and_, func, literal
+
+logger = get_logger(__name__)
+
+def student_matches_query(student_id, since: Optional[datetime] = None):
+    """
+    Select a student's matches with participants loaded. Joining on created_at
+    as well as match_id lets Postgres prune partitions on both tables when
+    since is given.
+    """
+    stmt = (
+        select(Match)
+        .join(
+            MatchParticipant,
+            and_(
+                Match.id == MatchParticipant.match_id,
+                Match.created_at == MatchParticipant.created_at
+            )
+        )
+        .options(*loader_profile("match_with_participants"))
+        .where(MatchParticipant.student_id == student_id)
+    )
+    if since is not None:
+        stmt = stmt.where(
+            MatchParticipant.created_at >= since,
+            Match.created_at >= since
+        )
+    return stmt
+
+# Achievements are defined by Achievement.criteria; see achievement_criteria
+
+def apply_match_result(
+    state: StudentAchievementState,
+    won: bool,
+    rating_after: float,
+    played_at: Optional[datetime] = None
+) -> None:
+    """Fold one completed match into the running state. O(1)."""
+    state.match_count = (state.match_count or 0) + 1
+    if won:
+        state.win_count = (state.win_count or 0) + 1
+        state.current_win_streak = (state.current_win_streak or 0) + 1
+        state.max_win_streak = max(state.max_win_streak or 0, state.current_win_streak)
+    else:
+        state.current_win_streak = 0
+    if state.peak_rating is None or rating_after > state.peak_rating:
+        state.peak_rating = rating_after
+    state.last_match_at = played_at or datetime.now(timezone.utc)
+
+async def get_achievement_states(
+    db: AsyncSession,
+    student_ids: Iterable[UUID],
+    for_update: bool = False
+) -> Dict[UUID, StudentAchievementState]:
+    """
+    Load (creating where missing) the achievement state of each student.
+    With for_update the rows stay locked until the transaction ends, so two
+    matches finishing at once for the same student cannot lose an update.
+    """
+    student_ids = list(student_ids)
+    if not student_ids:
+        return {}
+    await db.execute(
+        dialect_insert(StudentAchievementState)
+        .values([{"student_id": student_id} for student_id in student_ids])
+        .on_conflict_do_nothing(index_elements=[StudentAchievementState.student_id])
+    )
+    stmt = (
+        select(StudentAchievementState)
+        .where(StudentAchievementState.student_id.in_(student_ids))
+        .execution_options(populate_existing=True)
+    )
+    if for_update:
+        stmt = stmt.with_for_update()
+    result = await db.execute(stmt)
+    return {state.student_id: state for state in result.scalars().all()}
+
+async def record_match_results(
+    db: AsyncSession,
+    results: List[Tuple[UUID, bool, float]],
+    played_at: Optional[datetime] = None
+) -> Dict[UUID, StudentAchievementState]:
+    """
+    Update achievement state for every participant of a completed match.
+    results holds (student_id, won, rating_after) per participant.
+    """
+    states = await get_achievement_states(db, [student_id for student_id, _, _ in results], for_update=True)
+    for student_id, won, rating_after in results:
+        apply_match_result(states[student_id], won, rating_after, played_at)
+    await db.flush()
+    return states
+
+def build_state_from_history(student: Student, matches: List[Match]) -> StudentAchievementState:
+    """
+    Replay a student's full match history into a fresh (unsaved) state.
+    Only used for backfills; matches without a result are skipped.
+    """
+    state = StudentAchievementState(
+        student_id=student.id,
+        match_count=0,
+        win_count=0,
+        current_win_streak=0,
+        max_win_streak=0
+    )
+    for match in sorted(matches, key=lambda m: m.created_at):
         if match.status != MatchStatus.COMPLETED:
             continue
-            
-        # Check if this match got them to 1000+
-        if student.id in (match.winner_ids or []):
-            # Find the participant record for this student
-            participant = next((p for p in match.participants if p.student_id == student.id), None)
-            if participant and participant.elo_before is not None:
-                # If they were below 1000 before and this win got them to 1000+
-                if participant.elo_before <= 1000 and student.elo_rating >= 1000:
-                    print("[Achievement Debug] Earned 1000+ ELO through match win!")
-                    print(f"[Achievement Debug] ELO before: {participant.elo_before}, after: {student.elo_rating}")
-                    return True
-    
-    print("[Achievement Debug] Has not earned 1000+ ELO through matches")
-    return False
-
-def evaluator_elo_1100(student: Student, matches: List[Match]) -> bool:
-    print(f"[Achievement Debug] Evaluating elo-1100 for student {student.id}")
-    print(f"[Achievement Debug] Current ELO: {student.elo_rating}")
-    
-    # Only award if they earned it through matches
-    if not matches:
-        print("[Achievement Debug] No matches found")
-        return False
-    
-    # Sort matches by date to track ELO progression
-    sorted_matches = sorted(matches, key=lambda m: m.created_at)
-    
-    # Track if they earned 1100+ through matches
-    for match in sorted_matches:
-        if match.status != MatchStatus.COMPLETED:
+        participant = next((p for p in match.participants if p.student_id == student.id), None)
+        if participant is None or participant.is_winner is None:
             continue
-            
-        # Check if this match got them to 1100+
-        if student.id in (match.winner_ids or []):
-            # Find the participant record for this student
-            participant = next((p for p in match.participants if p.student_id == student.id), None)
-            if participant and participant.elo_before is not None:
-                # If they were below 1100 before and this win got them to 1100+
-                if participant.elo_before <= 1100 and student.elo_rating >= 1100:
-                    print("[Achievement Debug] Earned 1100+ ELO through match win!")
-                    print(f"[Achievement Debug] ELO before: {participant.elo_before}, after: {student.elo_rating}")
-                    return True
-    
-    print("[Achievement Debug] Has not earned 1100+ ELO through matches")
-    return False
-
-def evaluator_streak_3_win(student: Student, matches: List[Match]) -> bool:
-    print(f"[Achievement Debug] Evaluating streak-3-win for student {student.id}")
-    streak = 0
-    # Sort matches by date descending to check recent matches
-    sorted_matches = sorted(matches, key=lambda m: m.created_at, reverse=True)
-    
-    for match in sorted_matches:
-        # Check if student is in the winners array
-        if match.winner_ids and student.id in match.winner_ids:
-            streak += 1
-            print(f"[Achievement Debug] Win found, current streak: {streak}")
-            if streak >= 3:
-                print("[Achievement Debug] 3-win streak achieved!")
-                return True
-        else:
-            print(f"[Achievement Debug] Streak broken at {streak}")
-            streak = 0
-    print(f"[Achievement Debug] Final streak: {streak}, achievement not earned")
-    return False
-
-def evaluator_streak_4_win(student: Student, matches: List[Match]) -> bool:
-    print(f"[Achievement Debug] Evaluating streak-4-win for student {student.id}")
-    streak = 0
-    sorted_matches = sorted(matches, key=lambda m: m.created_at, reverse=True)
-    
-    for match in sorted_matches:
-        # Check if student is in the winners array
-        if match.winner_ids and student.id in match.winner_ids:
-            streak += 1
-            print(f"[Achievement Debug] Win found, current streak: {streak}")
-            if streak >= 4:
-                print("[Achievement Debug] 4-win streak achieved!")
-                return True
-        else:
-            print(f"[Achievement Debug] Streak broken at {streak}")
-            streak = 0
-    print(f"[Achievement Debug] Final streak: {streak}, achievement not earned")
-    return False
-
-# Map achievement codes to evaluator functions
-achievement_evaluators: Dict[str, AchievementEvaluator] = {
-    "ELO_1000": evaluator_elo_1000,
-    "ELO_1100": evaluator_elo_1100,
-    "WIN_STREAK_3": evaluator_streak_3_win,
-    "WIN_STREAK_4": evaluator_streak_4_win,
-    "WIN_STREAK_5": evaluator_streak_4_win,  # Reusing the 4-win evaluator for 5-win until we create a specific one
-}
+        rating_after = participant.elo_after if participant.elo_after is not None else student.elo_rating
+        apply_match_result(state, participant.is_winner, rating_after, match.created_at)
+    return state
 
-async def evaluate_student_achievements(student: Student, matches: List[Match], db: AsyncSession) -> List[Achievement]:
+async def evaluate_achievements_for_students(
+    db: AsyncSession,
+    students: List[Student],
+    states: Dict[UUID, StudentAchievementState]
+) -> Dict[UUID, List[Achievement]]:
     """
-    For a given student and their match history, evaluate all achievements.
-    If the student qualifies for an achievement that they have not yet earned,
-    record it in the student_achievements table.
+    Award every achievement whose criteria each student now meets.
+    Reads the cached catalog and loads the students' existing awards in one query;
+    state-only criteria are checked in memory and history criteria with one
+    query per achievement. New awards are written in one
+    INSERT ... ON CONFLICT DO NOTHING, so a concurrent evaluation cannot
+    create duplicates. Returns the newly earned achievements per student;
+    the caller commits.
     """
-    print(f"[Achievement Debug] Starting achievement evaluation for student {student.id}")
-    print(f"[Achievement Debug] Current ELO: {student.elo_rating}")
-    print(f"[Achievement Debug] Number of matches to evaluate: {len(matches)}")
-    
-    # Load all achievements from the database
-    result = await db.execute(select(Achievement))
-    achievements = result.scalars().all()
-    
-    newly_earned = []
+    newly_earned: Dict[UUID, List[Achievement]] = {student.id: [] for student in students}
+    if not students:
+        return newly_earned
+
+    achievements = (await achievement_catalog.get(db)).with_criteria
+
+    student_ids = [student.id for student in students]
+    result = await db.execute(
+        select(StudentAchievement.student_id, StudentAchievement.achievement_id)
+        .where(StudentAchievement.student_id.in_(student_ids))
+    )
+    earned = set(result.all())
 
+    awards = []
     for achievement in achievements:
-        print(f"[Achievement Debug] Checking achievement: {achievement.code}")
-        
-        # Check if the student already has this achievement
-        exists_result = await db.execute(
-            select(StudentAchievement).where(
-                and_(
-                    StudentAchievement.student_id == student.id,
-                    StudentAchievement.achievement_id == achievement.id
+        try:
+            if achievement_criteria.needs_history(achievement.criteria):
+                result = await db.execute(
+                    achievement_criteria.compile_criteria(achievement.criteria, achievement.id, student_ids)
                 )
-            )
-        )
-        already_earned = exists_result.scalars().first() is not None
-        if already_earned:
-            print(f"[Achievement Debug] Achievement {achievement.code} already earned")
+                qualified = set(result.scalars().all())
+            else:
+                qualified = {
+                    student.id for student in students
+                    if achievement_criteria.matches_state(achievement.criteria, student, states[student.id])
+                }
+        except ValueError:
+            logger.exception("Invalid achievement criteria", achievement_code=achievement.code)
             continue
+        for student_id in qualified:
+            if (student_id, achievement.id) in earned:
+                continue
+            awards.append({
+                "id": uuid.uuid4(),
+                "student_id": student_id,
+                "achievement_id": achievement.id,
+                "achieved_at": datetime.utcnow()
+            })
+    if not awards:
+        return newly_earned
 
-        # If there is an evaluator for this achievement code, run it
-        evaluator = achievement_evaluators.get(achievement.code)
-        if evaluator:
-            print(f"[Achievement Debug] Running evaluator for {achievement.code}")
-            if evaluator(student, matches):
-                print(f"[Achievement Debug] Achievement {achievement.code} earned!")
-                new_record = StudentAchievement(
-                    student_id=student.id,
-                    achievement_id=achievement.id,
-                    achieved_at=datetime.utcnow()
-                )
-                db.add(new_record)
-                newly_earned.append(achievement)
-        else:
-            print(f"[Achievement Debug] No evaluator found for {achievement.code}")
-    
-    if newly_earned:
-        print(f"[Achievement Debug] Committing {len(newly_earned)} new achievements")
-        await db.commit()
-    else:
-        print("[Achievement Debug] No new achievements earned")
-    
+    # Only rows that were actually inserted come back; a concurrent award is skipped
+    result = await db.execute(
+        dialect_insert(StudentAchievement)
+        .values(awards)
+        .on_conflict_do_nothing(
+            index_elements=[StudentAchievement.student_id, StudentAchievement.achievement_id]
+        )
+        .returning(StudentAchievement.student_id, StudentAchievement.achievement_id)
+    )
+    achievements_by_id = {achievement.id: achievement for achievement in achievements}
+    for student_id, achievement_id in result.all():
+        newly_earned[student_id].append(achievements_by_id[achievement_id])
     return newly_earned
 
-async def get_student_achievements(student_id: str, db: AsyncSession) -> List[StudentAchievement]:
-    """Get all achievements earned by a student."""
+EVALUATE_ACHIEVEMENTS_JOB = "evaluate_achievements"
+
+async def enqueue_achievement_evaluation(db: AsyncSession, match_id: UUID, student_ids: Iterable[UUID]) -> None:
+    """
+    Queue achievement evaluation for a completed match's participants in the
+    caller's transaction, keeping it off the match-completion request.
+    """
+    await enqueue(
+        db,
+        EVALUATE_ACHIEVEMENTS_JOB,
+        {"match_id": str(match_id), "student_ids": [str(student_id) for student_id in student_ids]},
+        dedup_key=f"{EVALUATE_ACHIEVEMENTS_JOB}:{match_id}"
+    )
+
+@job_handler(EVALUATE_ACHIEVEMENTS_JOB)
+async def run_achievement_evaluation(db: AsyncSession, payload: Dict) -> None:
+    """Job handler: evaluate achievements from the participants' current state."""
+    student_ids = [UUID(student_id) for student_id in payload["student_ids"]]
+    result = await db.execute(select(Student).where(Student.id.in_(student_ids)))
+    students = result.scalars().all()
+    states = await get_achievement_states(db, [student.id for student in students])
+    newly_earned = await evaluate_achievements_for_students(db, students, states)
+    for student_id, earned in newly_earned.items():
+        if earned:
+            logger.info(
+                "Achievements earned",
+                student_id=student_id,
+                achievement_codes=[achievement.code for achievement in earned],
+                category="achievements"
+            )
+
+async def award_achievement(db: AsyncSession, achievement: Achievement) -> int:
+    """
+    Grant an achievement to every student who meets its criteria with a
+    single INSERT ... SELECT. Returns the number of new awards; the caller
+    commits.
+    """
+    new_id = func.randomblob(16) if IS_SQLITE else func.gen_random_uuid()
+    candidates = achievement_criteria.compile_criteria(achievement.criteria, achievement.id).with_only_columns(
+        new_id,
+        Student.id,
+        literal(achievement.id, GUID()),
+        func.now(),
+        maintain_column_froms=True
+    )
+    result = await db.execute(
+        dialect_insert(StudentAchievement)
+        .from_select(["id", "student_id", "achievement_id", "achieved_at"], candidates)
+        .on_conflict_do_nothing(
+            index_elements=[StudentAchievement.student_id, StudentAchievement.achievement_id]
+        )
+    )
+    return result.rowcount
+
+async def backfill_achievements(db: AsyncSession) -> Dict[str, int]:
+    """Run award_achievement for the whole catalog. Returns new awards per achievement code."""
+    awarded = {}
+    for achievement in (await achievement_catalog.get(db, force_check=True)).with_criteria:
+        awarded[achievement.code] = await award_achievement(db, achievement)
+    await db.commit()
+    return awarded
+
+async def evaluate_student_achievements(student: Student, matches: List[Match], db: AsyncSession) -> List[Achievement]:
+    """
+    Backfill path: rebuild the student's achievement state from their full
+    match history, store it, and evaluate achievements against it.
+    Match completion uses record_match_results instead.
+    """
+    rebuilt = build_state_from_history(student, matches)
+    state = (await get_achievement_states(db, [student.id], for_update=True))[student.id]
+    for column in ("match_count", "win_count", "current_win_streak", "max_win_streak",
+                   "peak_rating", "last_match_at"):
+        setattr(state, column, getattr(rebuilt, column))
+    newly_earned = await evaluate_achievements_for_students(db, [student], {student.id: state})
+    return newly_earned[student.id]
+
+async def get_student_achievements(db: AsyncSession, student_id: UUID) -> Optional[Tuple[List[Dict], int]]:
+    """
+    A student's awards, newest first, with their achievements taken from the
+    cached catalog, and the catalog version they were built against.
+    One query: the student row outer joined to their awards (served by the
+    (student_id, achievement_id) unique index), so an unknown student (None)
+    and a student without awards ([]) are told apart without a second lookup.
+    """
     result = await db.execute(
-        select(StudentAchievement)
-        .where(StudentAchievement.student_id == student_id)
+        select(Student.id, StudentAchievement.id, StudentAchievement.achievement_id, StudentAchievement.achieved_at)
+        .outerjoin(StudentAchievement, StudentAchievement.student_id == Student.id)
+        .where(Student.id == student_id)
         .order_by(desc(StudentAchievement.achieved_at))
     )
-    return result.scalars().all()
+    rows = result.all()
+    if not rows:
+        return None
+    rows = [row for row in rows if row[1] is not None]
+
+    catalog = await achievement_catalog.get(db)
+    if any(achievement_id not in catalog.by_id for _, _, achievement_id, _ in rows):
+        # Awarded from an achievement newer than this process's snapshot
+        catalog = await achievement_catalog.get(db, force_check=True)
+    awards = [
+        {
+            "id": award_id,
+            "student_id": owner_id,
+            "achievement": catalog.by_id[achievement_id],
+            "achieved_at": achieved_at
+        }
+        for owner_id, award_id, achievement_id, achieved_at in rows
+        if achievement_id in catalog.by_id
+    ]
+    return awards, catalog.version
 
 async def get_all_achievements(db: AsyncSession) -> List[Achievement]:
     """Get all available achievements."""
-    result = await db.execute(select(Achievement))
-    return result.scalars().all()
+    return (await achievement_catalog.get(db)).achievements
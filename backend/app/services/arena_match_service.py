@@ -1,6 +1,5 @@
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 from typing import List, Optional, Tuple
 from uuid import UUID
 import uuid
@@ -8,9 +7,12 @@ import uuid
 from ..models.arena_session import ArenaSession, ArenaSessionStatus, ArenaParticipant
 from ..models.match import Match, MatchStatus, MatchParticipant
 from ..models.student import Student
+from ..models.loader_profiles import loader_profile
 from ..models.arena_schemas import MatchResponse
 from .elo_service import EloService
 from .matchmaking_service import MatchmakingService
+from .achievement_service import record_match_results, enqueue_achievement_evaluation
+from .daily_stats_service import record_match
 
 class ArenaMatchService:
     def __init__(self):
@@ -49,7 +51,7 @@ class ArenaMatchService:
         # Find next pending match for this arena
         query = (
             select(Match)
-            .options(selectinload(Match.participants))
+            .options(*loader_profile("match_with_participants"))
             .where(
                 Match.arena_id == str(arena_id),
                 Match.status == MatchStatus.PENDING
@@ -102,11 +104,13 @@ class ArenaMatchService:
             mp1 = MatchParticipant(
                 match_id=match.id,
                 student_id=initiator_student.id,
+                created_at=match.created_at,
                 elo_before=initiator_student.elo_rating
             )
             mp2 = MatchParticipant(
                 match_id=match.id,
                 student_id=opponent_student.id,
+                created_at=match.created_at,
                 elo_before=opponent_student.elo_rating
             )
             db.add_all([mp1, mp2])
@@ -140,6 +144,8 @@ class ArenaMatchService:
         if not winner_ids:
             match.status = MatchStatus.COMPLETED
             match.winner_ids = []
+            for participant, _ in participants_with_students:
+                participant.is_winner = None
             return
 
         # Convert winner IDs to UUID objects and store on match
@@ -167,11 +173,30 @@ class ArenaMatchService:
                         elo_change += loser_change
 
             # Update participant and student stats
-            participant.elo_after = participant.elo_before + elo_change
+            participant.is_winner = is_winner
+            # Ratings as played: the elo_before captured when the match was
+            # scheduled is stale if the student has played since
+            participant.elo_before = student.elo_rating
             student.update_stats(
                 won=is_winner,
                 new_elo=student.elo_rating + elo_change
             )
+            participant.elo_after = student.elo_rating
+
+        # Keep each participant's achievement state current; awards are evaluated by a job
+        await record_match_results(
+            db,
+            [
+                (student.id, participant.is_winner, participant.elo_after)
+                for participant, student in participants_with_students
+            ],
+            played_at=match.created_at
+        )
+        await enqueue_achievement_evaluation(
+            db, match.id, [student.id for _, student in participants_with_students]
+        )
 
         # Update match status
         match.status = MatchStatus.COMPLETED
+        # Add the results to each participant's daily progress rollup
+        await record_match(db, match)
@@ -1,57 +1,63 @@
-from sqlalchemy import select
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..models.match import Match, MatchStatus, MatchParticipant
 from ..models.arena_session import ArenaParticipant
 from ..models.student import Student
-from ..models.arena_schemas import StudentStatsResponse
+from ..models.arena_schemas import StudentStatsResponse, ParticipantDeltaResponse
 from typing import List, Tuple
 from uuid import UUID
 
 class ArenaStatsService:
     @staticmethod
-    async def calculate_participant_stats(
-        db: AsyncSession,
-        arena_id: UUID,
-        participant: ArenaParticipant,
-        student: Student
-    ) -> StudentStatsResponse:
-        """Calculate stats for a single participant in an arena session"""
-        # Get matches where student participated
-        result = await db.execute(
-            select(Match, MatchParticipant)
-            .join(MatchParticipant)
+    def _arena_totals_query(arena_id: UUID):
+        """Per-student wins, losses and ELO change over the arena's completed matches"""
+        return (
+            select(
+                MatchParticipant.student_id,
+                func.count().filter(MatchParticipant.is_winner.is_(True)).label("wins"),
+                func.count().filter(MatchParticipant.is_winner.is_(False)).label("losses"),
+                func.coalesce(
+                    func.sum(func.coalesce(MatchParticipant.elo_after, 0) - MatchParticipant.elo_before),
+                    0
+                ).label("elo_change")
+            )
+            .join(
+                Match,
+                (Match.id == MatchParticipant.match_id) &
+                (Match.created_at == MatchParticipant.created_at)
+            )
             .where(
                 (Match.arena_id == arena_id) &
-                (MatchParticipant.student_id == student.id) &
                 (Match.status == MatchStatus.COMPLETED)
             )
+            .group_by(MatchParticipant.student_id)
         )
-        matches = result.all()
-        
-        # Calculate wins, losses and elo change
-        wins = 0
-        losses = 0
-        elo_change = 0
-        for match, match_participant in matches:
-            if match.status == MatchStatus.COMPLETED:
-                elo_change += (match_participant.elo_after or 0) - match_participant.elo_before
-                # Count match-level wins/losses
-                # Only count wins/losses if there was a winner (not UNKNOWN)
-                if match.winner_ids:
-                    if match_participant.student_id in match.winner_ids:
-                        wins += 1
-                    else:
-                        losses += 1
 
+    @staticmethod
+    def _stats_response(participant: ArenaParticipant, student: Student, totals) -> StudentStatsResponse:
         return StudentStatsResponse(
             student_id=student.id,
             name=student.name,
             elo_rating=student.elo_rating,
-            wins=wins,
-            losses=losses,
+            wins=totals.wins if totals else 0,
+            losses=totals.losses if totals else 0,
             fights_played=participant.fights_played,
-            elo_change=elo_change
+            elo_change=totals.elo_change if totals else 0
+        )
+
+    @staticmethod
+    async def calculate_participant_stats(
+        db: AsyncSession,
+        arena_id: UUID,
+        participant: ArenaParticipant,
+        student: Student
+    ) -> StudentStatsResponse:
+        """Calculate stats for a single participant in an arena session"""
+        result = await db.execute(
+            ArenaStatsService._arena_totals_query(arena_id)
+            .where(MatchParticipant.student_id == student.id)
         )
+        return ArenaStatsService._stats_response(participant, student, result.first())
 
     @staticmethod
     async def calculate_arena_stats(
@@ -59,14 +65,51 @@ class ArenaStatsService:
         arena_id: UUID,
         participant_students: List[Tuple[ArenaParticipant, Student]]
     ) -> List[StudentStatsResponse]:
-        """Calculate stats for all participants in an arena session"""
-        stats = []
-        for participant, student in participant_students:
-            stat = await ArenaStatsService.calculate_participant_stats(
-                db, arena_id, participant, student
-            )
-            stats.append(stat)
-        
+        """Calculate stats for all participants in an arena session with one grouped query"""
+        result = await db.execute(ArenaStatsService._arena_totals_query(arena_id))
+        totals_by_student = {row.student_id: row for row in result.all()}
+
+        stats = [
+            ArenaStatsService._stats_response(participant, student, totals_by_student.get(student.id))
+            for participant, student in participant_students
+        ]
+
         # Sort by ELO rating descending
         stats.sort(key=lambda x: x.elo_rating, reverse=True)
         return stats
+
+    @staticmethod
+    def calculate_match_deltas(
+        winner_ids: List[UUID],
+        participants_with_students: List[Tuple[MatchParticipant, Student]]
+    ) -> List[ParticipantDeltaResponse]:
+        """
+        Calculate the per-participant changes caused by a single completed match.
+        Only uses rows already loaded for the match, so cost does not depend on arena size.
+        """
+        deltas = []
+        for match_participant, student in participants_with_students:
+            wins = 0
+            losses = 0
+            # Only count wins/losses if there was a winner (not UNKNOWN)
+            if winner_ids:
+                if match_participant.student_id in winner_ids:
+                    wins = 1
+                else:
+                    losses = 1
+
+            # elo_after stays unset when the match ended without a winner
+            elo_change = 0.0
+            if match_participant.elo_after is not None:
+                elo_change = match_participant.elo_after - match_participant.elo_before
+
+            deltas.append(
+                ParticipantDeltaResponse(
+                    student_id=student.id,
+                    elo_rating=student.elo_rating,
+                    elo_change=elo_change,
+                    wins=wins,
+                    losses=losses
+                )
+            )
+        return deltas
@@ -0,0 +1,20 @@
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import dialect_insert
+from ..models.cache_version import CacheVersion
+
+async def get_cache_version(db: AsyncSession, name: str) -> int:
+    """Current version of the named cache; 0 if it has never been bumped."""
+    version = await db.scalar(select(CacheVersion.version).where(CacheVersion.name == name))
+    return version or 0
+
+async def bump_cache_version(db: AsyncSession, name: str) -> None:
+    """Invalidate the named cache everywhere once the caller commits."""
+    stmt = dialect_insert(CacheVersion).values(name=name, version=1)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[CacheVersion.name],
+            set_={"version": CacheVersion.version + 1, "updated_at": func.now()}
+        )
+    )
@@ -0,0 +1,211 @@
+"""
+Per-student daily rollups of match results (student_daily_stats).
+
+A completed match adds its participants' results to their row for that UTC
+day, so progress charts read one row per student per active day instead of
+every match_participants row. A day's elo_end is the rating after the last
+match completed that day; results written out of order never move it
+backwards. The rollups can be rebuilt from match_participants for any range
+of days.
+"""
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import Date, and_, case, cast, delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.logging import get_logger
+from ..database import IS_SQLITE, dialect_insert
+from ..models.match import Match, MatchParticipant, MatchStatus
+from ..models.student import Student
+from ..models.student_daily_stats import StudentDailyStats
+
+logger = get_logger(__name__)
+
+PROGRESS_VIEWS = ("week", "month", "term")
+
+# Length of the term view; its points are whole weeks (Monday to Sunday)
+TERM_WEEKS = int(os.getenv("TERM_WEEKS", 14))
+
+def _utc_day(column):
+    # SQLite keeps timestamps as UTC text
+    return func.date(column) if IS_SQLITE else cast(func.timezone("UTC", column), Date)
+
+def _rollup_query(*conditions):
+    """
+    One row per (student, day) summarising the completed matches that match
+    conditions. Matches are ordered by when they completed (their last
+    update); participants without a stored elo_after fall back to the
+    student's current rating, as in the achievement backfill.
+    """
+    day = _utc_day(MatchParticipant.created_at)
+    completed_at = func.coalesce(Match.updated_at, Match.created_at)
+    rating_after = func.coalesce(MatchParticipant.elo_after, Student.elo_rating)
+    results = (
+        select(
+            MatchParticipant.student_id,
+            day.label("day"),
+            MatchParticipant.is_winner,
+            completed_at.label("completed_at"),
+            func.coalesce(MatchParticipant.elo_after - MatchParticipant.elo_before, 0.0).label("elo_change"),
+            # Rating after the day's latest match, repeated on each of its rows
+            func.first_value(rating_after).over(
+                partition_by=(MatchParticipant.student_id, day),
+                order_by=(completed_at.desc(), Match.created_at.desc())
+            ).label("elo_end"),
+        )
+        .join(
+            Match,
+            and_(Match.id == MatchParticipant.match_id, Match.created_at == MatchParticipant.created_at)
+        )
+        .join(Student, Student.id == MatchParticipant.student_id)
+        .where(Match.status == MatchStatus.COMPLETED, MatchParticipant.is_winner.isnot(None), *conditions)
+        .subquery("results")
+    )
+    return select(
+        results.c.student_id,
+        results.c.day,
+        func.count().label("matches"),
+        func.sum(case((results.c.is_winner, 1), else_=0)).label("wins"),
+        func.sum(results.c.elo_change).label("elo_change"),
+        func.max(results.c.elo_end).label("elo_end"),
+        func.max(results.c.completed_at).label("last_match_at"),
+    ).group_by(results.c.student_id, results.c.day)
+
+_ROLLUP_COLUMNS = ["student_id", "day", "matches", "wins", "elo_change", "elo_end", "last_match_at"]
+
+async def record_match(db: AsyncSession, match: Match) -> None:
+    """
+    Add a completed match's results to its participants' daily rows, in the
+    caller's transaction. Call once the match is marked completed and its
+    participants' is_winner (and elo_after) are set; pending changes are
+    flushed first.
+    """
+    rollup = _rollup_query(
+        MatchParticipant.match_id == match.id,
+        MatchParticipant.created_at == match.created_at
+    )
+    stmt = dialect_insert(StudentDailyStats).from_select(_ROLLUP_COLUMNS, rollup)
+    existing = StudentDailyStats.__table__.c
+    is_latest = or_(existing.last_match_at.is_(None), stmt.excluded.last_match_at >= existing.last_match_at)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["student_id", "day"],
+            set_={
+                "matches": existing.matches + stmt.excluded.matches,
+                "wins": existing.wins + stmt.excluded.wins,
+                "elo_change": existing.elo_change + stmt.excluded.elo_change,
+                "elo_end": case((is_latest, stmt.excluded.elo_end), else_=existing.elo_end),
+                "last_match_at": case((is_latest, stmt.excluded.last_match_at), else_=existing.last_match_at),
+                "updated_at": func.now(),
+            }
+        )
+    )
+
+async def rebuild_daily_stats(db: AsyncSession, start: date, end: date) -> int:
+    """
+    Recompute the rollups for the UTC days start..end (inclusive) from
+    match_participants. Returns the number of rows written; the caller commits.
+    """
+    since = datetime.combine(start, time.min, tzinfo=timezone.utc)
+    until = datetime.combine(end + timedelta(days=1), time.min, tzinfo=timezone.utc)
+    await db.execute(
+        delete(StudentDailyStats).where(StudentDailyStats.day >= start, StudentDailyStats.day <= end)
+    )
+    rollup = _rollup_query(
+        MatchParticipant.created_at >= since,
+        MatchParticipant.created_at < until,
+        # Bound both sides, so each table is pruned to the range's partitions
+        Match.created_at >= since,
+        Match.created_at < until
+    )
+    stmt = dialect_insert(StudentDailyStats).from_select(_ROLLUP_COLUMNS, rollup)
+    result = await db.execute(
+        # A match completing during the rebuild may already have written its day
+        stmt.on_conflict_do_update(
+            index_elements=["student_id", "day"],
+            set_={name: stmt.excluded[name] for name in _ROLLUP_COLUMNS[2:]} | {"updated_at": func.now()}
+        )
+    )
+    logger.info("Daily stats rebuilt", start=start, end=end, rows=result.rowcount)
+    return result.rowcount
+
+def _buckets(view: str, end: date) -> List[date]:
+    """Start day of each point of a view, oldest first."""
+    if view == "term":
+        last_week = end - timedelta(days=end.weekday())
+        return [last_week - timedelta(weeks=i) for i in reversed(range(TERM_WEEKS))]
+    days = 7 if view == "week" else 30
+    return [end - timedelta(days=i) for i in reversed(range(days))]
+
+async def get_progress(
+    db: AsyncSession,
+    student_id: UUID,
+    view: str,
+    end: Optional[date] = None
+) -> Dict[str, Any]:
+    """
+    Matches, wins and rating change per day (week, month) or per week (term)
+    up to end (default today, UTC), with the rating at the end of each point.
+    Points without matches carry the previous rating forward.
+    """
+    if view not in PROGRESS_VIEWS:
+        raise ValueError(f"view must be one of {', '.join(PROGRESS_VIEWS)}")
+    end = end or datetime.now(timezone.utc).date()
+    starts = _buckets(view, end)
+
+    result = await db.execute(
+        select(StudentDailyStats)
+        .where(
+            StudentDailyStats.student_id == student_id,
+            StudentDailyStats.day >= starts[0],
+            StudentDailyStats.day <= end
+        )
+        .order_by(StudentDailyStats.day)
+    )
+    rows = result.scalars().all()
+    # Rating going into the range: the end of the last active day before it
+    rating = await db.scalar(
+        select(StudentDailyStats.elo_end)
+        .where(StudentDailyStats.student_id == student_id, StudentDailyStats.day < starts[0])
+        .order_by(StudentDailyStats.day.desc())
+        .limit(1)
+    )
+
+    points = [
+        {"start": start, "matches": 0, "wins": 0, "elo_change": 0.0, "elo_end": None}
+        for start in starts
+    ]
+    index = 0
+    for row in rows:
+        while index + 1 < len(starts) and starts[index + 1] <= row.day:
+            index += 1
+        point = points[index]
+        point["matches"] += row.matches
+        point["wins"] += row.wins
+        point["elo_change"] += row.elo_change
+        if row.elo_end is not None:
+            point["elo_end"] = row.elo_end
+    for point in points:
+        point["elo_change"] = round(point["elo_change"], 1)
+        if point["elo_end"] is None:
+            point["elo_end"] = rating
+        rating = point["elo_end"]
+
+    matches = sum(point["matches"] for point in points)
+    wins = sum(point["wins"] for point in points)
+    return {
+        "view": view,
+        "interval": "week" if view == "term" else "day",
+        "start": starts[0],
+        "end": end,
+        "points": points,
+        "totals": {
+            "matches": matches,
+            "wins": wins,
+            "win_rate": round(wins / matches * 100, 1) if matches else 0.0,
+            "elo_change": round(sum(row.elo_change for row in rows), 1),
+        },
+    }
@@ -0,0 +1,223 @@
+"""
+Columnar exports of match history for analytics.
+
+Each table is read through a server-side cursor and written chunk by chunk,
+so memory stays bounded by the chunk size however many rows are exported.
+Files are Parquet or Arrow IPC when pyarrow is installed, gzip-compressed CSV
+otherwise.
+
+Incremental exports take a watermark: students and matches changed after it
+(updated_at) are exported, together with every participant and round of those
+matches. Creating, answering and deciding a round all move its match's
+updated_at, so a changed match is exported again as a whole; consumers keep
+the latest copy of each row by primary key.
+"""
+import csv
+import enum
+import gzip
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, Table, and_, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ..core.logging import get_logger
+from ..models.match import Match, MatchParticipant, Round, RoundParticipant
+from ..models.student import Student
+from ..models.types import UUIDArray
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional; exports fall back to CSV
+    pa = pq = None
+
+logger = get_logger(__name__)
+
+EXPORT_TABLES = ("students", "matches", "match_participants", "rounds", "round_participants")
+
+EXPORT_FORMATS = ("parquet", "arrow", "csv")
+
+# Rows per chunk read from the cursor and per written batch
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 50000))
+
+# Incremental exports start this far before the watermark, so rows committed
+# late with an earlier updated_at are not missed
+EXPORT_WATERMARK_OVERLAP_SECONDS = int(os.getenv("EXPORT_WATERMARK_OVERLAP_SECONDS", 300))
+
+def default_format() -> str:
+    return "parquet" if pa is not None else "csv"
+
+def _matches_changed(since: datetime, until: datetime):
+    return and_(Match.updated_at > since, Match.updated_at <= until)
+
+def export_query(name: str, since: Optional[datetime], until: datetime):
+    """SELECT for one table: all rows, or the rows changed in (since, until]."""
+    table: Table = {
+        "students": Student.__table__,
+        "matches": Match.__table__,
+        "match_participants": MatchParticipant.__table__,
+        "rounds": Round.__table__,
+        "round_participants": RoundParticipant.__table__,
+    }[name]
+    query = select(*table.columns)
+    if since is None:
+        return query
+    if name == "students":
+        return query.where(Student.updated_at > since, Student.updated_at <= until)
+    if name == "matches":
+        return query.where(_matches_changed(since, until))
+    if name == "match_participants":
+        return query.join(
+            Match,
+            and_(Match.id == MatchParticipant.match_id, Match.created_at == MatchParticipant.created_at)
+        ).where(_matches_changed(since, until))
+    if name == "rounds":
+        return query.join(Match, Match.id == Round.match_id).where(_matches_changed(since, until))
+    return query.join(
+        Round,
+        and_(Round.id == RoundParticipant.round_id, Round.created_at == RoundParticipant.created_at)
+    ).join(Match, Match.id == Round.match_id).where(_matches_changed(since, until))
+
+def _export_value(value: Any) -> Any:
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, list):
+        return [_export_value(item) for item in value]
+    if isinstance(value, datetime) and value.tzinfo is None:
+        # SQLite hands back naive timestamps; they are stored as UTC
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def _arrow_type(column_type):
+    if isinstance(column_type, UUIDArray):
+        return pa.list_(pa.string())
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us", tz="UTC")
+    # GUID, enums and strings
+    return pa.string()
+
+class ArrowExportWriter:
+    """Writes record batches to a Parquet or Arrow IPC file (zstd-compressed)."""
+
+    def __init__(self, path: str, columns, fmt: str):
+        self.schema = pa.schema([(column.name, _arrow_type(column.type)) for column in columns])
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_file(
+                path, self.schema, options=pa.ipc.IpcWriteOptions(compression="zstd")
+            )
+
+    def write(self, rows: List[tuple]) -> None:
+        values = [[_export_value(row[i]) for row in rows] for i in range(len(self.schema))]
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(values, self.schema)],
+            schema=self.schema
+        )
+        self._writer.write_batch(batch)
+
+    def close(self) -> None:
+        self._writer.close()
+
+class CsvExportWriter:
+    """Writes rows to a gzip-compressed CSV file; UUID arrays become JSON lists."""
+
+    def __init__(self, path: str, columns, fmt: str = "csv"):
+        self._file = gzip.open(path, "wt", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([column.name for column in columns])
+
+    def write(self, rows: List[tuple]) -> None:
+        for row in rows:
+            values = [_export_value(value) for value in row]
+            self._writer.writerow([
+                json.dumps(value) if isinstance(value, list)
+                else value.isoformat() if isinstance(value, datetime)
+                else value
+                for value in values
+            ])
+
+    def close(self) -> None:
+        self._file.close()
+
+EXTENSIONS = {"parquet": "parquet", "arrow": "arrow", "csv": "csv.gz"}
+
+def _writer_class(fmt: str) -> Callable:
+    if fmt == "csv":
+        return CsvExportWriter
+    if pa is None:
+        raise ValueError(f"{fmt} exports need pyarrow; install it or use csv")
+    return ArrowExportWriter
+
+async def export_table(
+    conn: AsyncConnection,
+    name: str,
+    path: str,
+    fmt: str,
+    since: Optional[datetime],
+    until: datetime,
+    chunk_size: int = EXPORT_CHUNK_SIZE
+) -> int:
+    """Stream one table into path. Returns the number of rows written."""
+    query = export_query(name, since, until)
+    writer = _writer_class(fmt)(path, query.selected_columns, fmt)
+    rows_written = 0
+    try:
+        result = await conn.stream(query.execution_options(yield_per=chunk_size))
+        async for rows in result.partitions(chunk_size):
+            writer.write(rows)
+            rows_written += len(rows)
+    except BaseException:
+        # Never leave a partial file that looks like a finished export
+        writer.close()
+        os.remove(path)
+        raise
+    writer.close()
+    return rows_written
+
+async def export_history(
+    conn: AsyncConnection,
+    out_dir: str,
+    fmt: Optional[str] = None,
+    watermark: Optional[datetime] = None,
+    tables=EXPORT_TABLES,
+    chunk_size: int = EXPORT_CHUNK_SIZE
+) -> Dict[str, Any]:
+    """
+    Export the tables into out_dir, one file per table, plus a manifest.
+    With a watermark only rows changed since then are exported. Returns the
+    manifest; its "until" is the watermark for the next incremental run.
+    """
+    fmt = fmt or default_format()
+    until = datetime.now(timezone.utc)
+    since = watermark - timedelta(seconds=EXPORT_WATERMARK_OVERLAP_SECONDS) if watermark else None
+    stamp = until.strftime("%Y%m%dT%H%M%SZ")
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = {
+        "format": fmt,
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat(),
+        "tables": {},
+    }
+    for name in tables:
+        path = os.path.join(out_dir, f"{name}-{stamp}.{EXTENSIONS[fmt]}")
+        rows = await export_table(conn, name, path, fmt, since, until, chunk_size)
+        manifest["tables"][name] = {"file": os.path.basename(path), "rows": rows}
+        logger.info("Exported table", table=name, rows=rows, file=path)
+
+    with open(os.path.join(out_dir, f"manifest-{stamp}.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
@@ -0,0 +1,261 @@
+"""
+Psychometric calibration of flashcards from round outcomes.
+
+Each decided round gives one response per participant: correct if the
+participant is among the round's winners. Cards are fitted with a 1PL (Rasch)
+model whose person abilities are anchored to the students' ratings before
+the round, so P(correct) = 1 / (1 + 10 ** ((difficulty - elo_before) / 400))
+and a card's difficulty lives on the same scale as student ratings. With the
+abilities fixed every card is an independent one-parameter fit, solved for
+all cards at once by Newton's method in NumPy. A normal prior centred on the
+starting rating keeps cards answered only right (or only wrong) finite.
+
+The discrimination index is the point-biserial correlation between being
+correct and the student's rating: how well the card separates stronger from
+weaker students.
+
+Runs are incremental: only cards used in matches that changed since the
+previous run are refitted, each from its full history. Results are written
+back with one UPDATE ... FROM (VALUES ...) per batch, to the calibration
+columns only; the level a card's author chose (difficulty) is never changed.
+"""
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import Float, Integer, case, cast, func, select, update, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import column
+
+from ..core.logging import get_logger
+from ..database import values_source
+from ..models.flashcard import Flashcard, DifficultyLevel
+from ..models.match import Match, Round, RoundParticipant
+from ..models.student import Student
+from ..models.types import GUID
+from .job_queue import enqueue, job_handler
+from .statistics_service import is_round_winner
+
+logger = get_logger(__name__)
+
+CALIBRATE_FLASHCARDS_JOB = "calibrate_flashcards"
+
+# Rating of a card with no evidence, and of an average student
+BASE_RATING = 1000.0
+# ELO points per natural-log unit of odds
+ELO_SCALE = 400 / math.log(10)
+# Standard deviation of the difficulty prior, in ELO points
+PRIOR_SD = 400.0
+
+# Cards with fewer responses get no calibrated level
+CALIBRATION_MIN_RESPONSES = int(os.getenv("CALIBRATION_MIN_RESPONSES", 20))
+
+# Cards fitted and written per batch
+CALIBRATION_BATCH_SIZE = 2000
+
+# Matches changed this long before the last run are looked at again, for late commits
+CALIBRATION_OVERLAP_SECONDS = int(os.getenv("CALIBRATION_OVERLAP_SECONDS", 300))
+
+# A queued calibration waits this long, so the rounds of a busy period share one run
+CALIBRATION_DELAY_SECONDS = int(os.getenv("CALIBRATION_DELAY_SECONDS", 300))
+
+# Ratings that stand in for an uncalibrated card's hand-set level
+LEVEL_RATINGS = {
+    DifficultyLevel.EASY: BASE_RATING - 150,
+    DifficultyLevel.MEDIUM: BASE_RATING,
+    DifficultyLevel.HARD: BASE_RATING + 150,
+}
+
+def fit_difficulty(
+    item_index: np.ndarray,
+    ability: np.ndarray,
+    correct: np.ndarray,
+    n_items: int,
+    iterations: int = 50,
+    tolerance: float = 1e-6
+) -> np.ndarray:
+    """
+    MAP estimate of each item's difficulty (logit scale) under the 1PL model
+    with known abilities (logit scale, centred on BASE_RATING).
+    item_index, ability and correct hold one entry per response.
+    """
+    prior_precision = (ELO_SCALE / PRIOR_SD) ** 2
+    correct_by_item = np.bincount(item_index, weights=correct, minlength=n_items)
+    difficulty = np.zeros(n_items)
+    for _ in range(iterations):
+        p = 1.0 / (1.0 + np.exp(difficulty[item_index] - ability))
+        # Gradient and curvature of the negative log posterior per item
+        gradient = correct_by_item - np.bincount(item_index, weights=p, minlength=n_items) + prior_precision * difficulty
+        curvature = np.bincount(item_index, weights=p * (1 - p), minlength=n_items) + prior_precision
+        step = gradient / curvature
+        difficulty -= step
+        if np.max(np.abs(step), initial=0.0) < tolerance:
+            break
+    return difficulty
+
+def discrimination_index(item_index: np.ndarray, ability: np.ndarray, correct: np.ndarray, n_items: int) -> np.ndarray:
+    """Point-biserial correlation of correctness with ability per item; NaN where undefined."""
+    def total(weights):
+        return np.bincount(item_index, weights=weights, minlength=n_items)
+
+    n = total(np.ones_like(ability))
+    sum_x, sum_y = total(ability), total(correct)
+    covariance = n * total(ability * correct) - sum_x * sum_y
+    spread = (n * total(ability ** 2) - sum_x ** 2) * (n * sum_y - sum_y ** 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(spread > 0, covariance / np.sqrt(np.maximum(spread, 0)), np.nan)
+
+def difficulty_level(rating: float) -> DifficultyLevel:
+    """Level for a calibrated card, by an average student's chance of answering it."""
+    p_correct = 1.0 / (1.0 + 10 ** ((rating - BASE_RATING) / 400))
+    if p_correct >= 0.7:
+        return DifficultyLevel.EASY
+    if p_correct <= 0.4:
+        return DifficultyLevel.HARD
+    return DifficultyLevel.MEDIUM
+
+async def find_cards_to_calibrate(db: AsyncSession, full: bool = False) -> List[UUID]:
+    """Cards used in matches that changed since the last run (every used card if full)."""
+    query = select(Round.flashcard_id).distinct()
+    if not full:
+        last_run = await db.scalar(select(func.max(Flashcard.calibrated_at)))
+        if last_run is not None:
+            query = query.join(Match, Match.id == Round.match_id).where(
+                Match.updated_at > last_run - timedelta(seconds=CALIBRATION_OVERLAP_SECONDS)
+            )
+    return list((await db.execute(query)).scalars().all())
+
+async def calibrate_batch(db: AsyncSession, flashcard_ids: List[UUID], calibrated_at: datetime) -> int:
+    """Refit the given cards from their full history and write them back. Returns cards updated."""
+    result = await db.execute(
+        select(
+            Round.flashcard_id,
+            func.coalesce(RoundParticipant.elo_before, Student.elo_rating),
+            case((is_round_winner(), 1), else_=0)
+        )
+        .join(
+            RoundParticipant,
+            and_(RoundParticipant.round_id == Round.id, RoundParticipant.created_at == Round.created_at)
+        )
+        .join(Student, Student.id == RoundParticipant.student_id)
+        .where(Round.flashcard_id.in_(flashcard_ids), Round.winner_ids.isnot(None))
+    )
+    responses = result.all()
+    if not responses:
+        return 0
+
+    cards: Dict[UUID, int] = {}
+    item_index = np.fromiter((cards.setdefault(card_id, len(cards)) for card_id, _, _ in responses), dtype=np.int64)
+    ability = (np.array([rating for _, rating, _ in responses], dtype=float) - BASE_RATING) / ELO_SCALE
+    correct = np.array([won for _, _, won in responses], dtype=float)
+
+    difficulty = BASE_RATING + fit_difficulty(item_index, ability, correct, len(cards)) * ELO_SCALE
+    discrimination = discrimination_index(item_index, ability, correct, len(cards))
+    counts = np.bincount(item_index, minlength=len(cards))
+
+    rows = []
+    for card_id, index in cards.items():
+        rating = round(float(difficulty[index]), 1)
+        level = difficulty_level(rating) if counts[index] >= CALIBRATION_MIN_RESPONSES else None
+        rows.append((
+            card_id,
+            rating,
+            None if np.isnan(discrimination[index]) else round(float(discrimination[index]), 3),
+            int(counts[index]),
+            level,
+        ))
+    source = values_source(
+        [
+            column("id", GUID()),
+            column("difficulty", Float()),
+            column("discrimination", Float()),
+            column("responses", Integer()),
+            column("level", Flashcard.calibrated_level.type),
+        ],
+        rows,
+        "calibration",
+    )
+    await db.execute(
+        update(Flashcard)
+        .where(Flashcard.id == source.c.id)
+        .values(
+            calibrated_difficulty=source.c.difficulty,
+            # None is sent as a bare NULL; a column of only NULLs would otherwise be text
+            discrimination=cast(source.c.discrimination, Float),
+            calibration_responses=source.c.responses,
+            # None is sent as a bare NULL, as above
+            calibrated_level=cast(source.c.level, Flashcard.calibrated_level.type),
+            calibrated_at=calibrated_at
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return len(rows)
+
+async def calibrate_flashcards(db: AsyncSession, full: bool = False) -> int:
+    """
+    Refit every card touched since the last run (all used cards if full).
+    Returns the number of cards updated; the caller commits.
+    """
+    calibrated_at = datetime.now(timezone.utc)
+    flashcard_ids = await find_cards_to_calibrate(db, full)
+    updated = 0
+    for start in range(0, len(flashcard_ids), CALIBRATION_BATCH_SIZE):
+        updated += await calibrate_batch(db, flashcard_ids[start:start + CALIBRATION_BATCH_SIZE], calibrated_at)
+    logger.info("Flashcards calibrated", touched=len(flashcard_ids), updated=updated)
+    return updated
+
+async def enqueue_calibration(db: AsyncSession, follow_up: bool = False) -> None:
+    """
+    Queue a calibration run in the caller's transaction; one run covers every
+    round until it starts. Follow-ups of a run use their own dedup key, since
+    the run still holds the usual one.
+    """
+    await enqueue(
+        db,
+        CALIBRATE_FLASHCARDS_JOB,
+        {"follow_up": follow_up},
+        dedup_key=f"{CALIBRATE_FLASHCARDS_JOB}:follow_up" if follow_up else CALIBRATE_FLASHCARDS_JOB,
+        delay_seconds=CALIBRATION_DELAY_SECONDS
+    )
+
+@job_handler(CALIBRATE_FLASHCARDS_JOB)
+async def run_calibration(db: AsyncSession, payload: Dict) -> None:
+    started = datetime.now(timezone.utc)
+    await calibrate_flashcards(db)
+    # Rounds decided while this run held the dedup key could not queue another
+    # run and may have come after it read its cards; follow up under the other key
+    recent = started - timedelta(seconds=CALIBRATION_OVERLAP_SECONDS)
+    if await db.scalar(select(select(Match.id).where(Match.updated_at > recent).exists())):
+        await enqueue_calibration(db, follow_up=not payload.get("follow_up", False))
+
+async def suggest_flashcards(
+    db: AsyncSession,
+    pack_id: UUID,
+    rating: float,
+    exclude_ids: Optional[List[UUID]] = None,
+    limit: int = 1
+) -> List[Flashcard]:
+    """
+    Cards from a pack whose difficulty is closest to rating, where a student
+    of that rating has an even chance and the outcome says the most.
+    Uncalibrated cards are placed by their hand-set level.
+    """
+    card_rating = func.coalesce(
+        Flashcard.calibrated_difficulty,
+        case(
+            *((Flashcard.difficulty == level, level_rating) for level, level_rating in LEVEL_RATINGS.items()),
+            else_=BASE_RATING
+        )
+    )
+    query = (
+        select(Flashcard)
+        .where(Flashcard.pack_id == pack_id)
+        .order_by(func.abs(card_rating - rating), Flashcard.id)
+        .limit(limit)
+    )
+    if exclude_ids:
+        query = query.where(Flashcard.id.notin_(exclude_ids))
+    return list((await db.execute(query)).scalars().all())
@@ -0,0 +1,153 @@
+"""
+Write-behind counters for flashcard usage (times_used / times_correct).
+
+Deciding a round only adds to an in-process tally; a background task
+flushes the tally every few seconds with one UPDATE ... FROM (VALUES ...)
+of increments. A card played in many classrooms at once is then written
+once per flush instead of once per round, so the round path never waits on
+its row lock. Increments are only recorded after the round commits, and a
+failed or cancelled flush puts its increments back for the next one. The final flush
+runs on shutdown; a process that dies hard loses at most one interval.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import Integer, update
+from sqlalchemy.sql import column
+
+from ..core.logging import get_logger
+from ..database import AsyncSessionLocal, values_source
+from ..models.flashcard import Flashcard
+from ..models.types import GUID
+
+logger = get_logger(__name__)
+
+# Cards per UPDATE; keeps bind parameters under the asyncpg limit of 32767
+FLUSH_BATCH = 5000
+
+class FlashcardCounterAggregator:
+    """
+    Per-card (used, correct) increments waiting to be written, flushed every
+    flush_seconds. flush_seconds 0 disables the background task; flush() can
+    still be called directly.
+    """
+
+    def __init__(self, flush_seconds: float):
+        self.flush_seconds = flush_seconds
+        self._pending: Dict[UUID, List[int]] = {}
+        # Monotonic time of the oldest increment not yet written
+        self._oldest_pending: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.last_flush_at: Optional[datetime] = None
+        self.last_flush_ms: Optional[float] = None
+        self.flushed_increments = 0
+        self.failed_flushes = 0
+
+    def record(self, flashcard_id: UUID, used: int, correct: int) -> None:
+        """Add to a card's counters; call after the round has committed."""
+        counts = self._pending.setdefault(flashcard_id, [0, 0])
+        counts[0] += used
+        counts[1] += correct
+        if self._oldest_pending is None:
+            self._oldest_pending = time.monotonic()
+
+    def _restore(self, pending: Dict[UUID, List[int]], oldest: Optional[float]) -> None:
+        for flashcard_id, (used, correct) in pending.items():
+            self.record(flashcard_id, used, correct)
+        if oldest is not None:
+            self._oldest_pending = min(self._oldest_pending or oldest, oldest)
+
+    async def flush(self) -> int:
+        """Write all pending increments. Returns the number of cards updated."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+            oldest, self._oldest_pending = self._oldest_pending, None
+
+            started = time.monotonic()
+            # Same row order in every process, so concurrent flushes do not deadlock
+            rows: List[Tuple[UUID, int, int]] = sorted(
+                (flashcard_id, used, correct) for flashcard_id, (used, correct) in pending.items()
+            )
+            try:
+                async with AsyncSessionLocal() as db:
+                    for start in range(0, len(rows), FLUSH_BATCH):
+                        source = values_source(
+                            [column("id", GUID()), column("used", Integer()), column("correct", Integer())],
+                            rows[start:start + FLUSH_BATCH],
+                            "usage",
+                        )
+                        await db.execute(
+                            update(Flashcard)
+                            .where(Flashcard.id == source.c.id)
+                            .values(
+                                times_used=Flashcard.times_used + source.c.used,
+                                times_correct=Flashcard.times_correct + source.c.correct
+                            )
+                            .execution_options(synchronize_session=False)
+                        )
+                    await db.commit()
+            except BaseException:
+                # Including cancellation, which is not an Exception
+                self.failed_flushes += 1
+                self._restore(pending, oldest)
+                raise
+
+            self.last_flush_at = datetime.now(timezone.utc)
+            self.last_flush_ms = round((time.monotonic() - started) * 1000, 1)
+            self.flushed_increments += sum(used for _, used, _ in rows)
+            return len(rows)
+
+    def metrics(self) -> Dict[str, Any]:
+        """How far the stored counters trail the rounds played, and how flushing is going."""
+        return {
+            "pending_cards": len(self._pending),
+            "pending_increments": sum(used for used, _ in self._pending.values()),
+            "lag_seconds": (
+                round(time.monotonic() - self._oldest_pending, 1) if self._oldest_pending is not None else 0.0
+            ),
+            "flush_seconds": self.flush_seconds,
+            "last_flush_at": self.last_flush_at,
+            "last_flush_ms": self.last_flush_ms,
+            "flushed_increments": self.flushed_increments,
+            "failed_flushes": self.failed_flushes,
+        }
+
+    def start(self) -> None:
+        if self.flush_seconds <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush task and write whatever is still pending."""
+        if self._task is not None:
+            # Let a flush in progress finish first: cancelled mid-commit, it
+            # could not tell whether its increments were written
+            async with self._lock:
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Final flashcard counter flush failed", **self.metrics())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Flushing flashcard counters failed", pending_cards=len(self._pending))
+
+# Seconds between flushes; 0 disables the background flush
+flashcard_counters = FlashcardCounterAggregator(float(os.getenv("FLASHCARD_COUNTER_FLUSH_SECONDS", 5)))
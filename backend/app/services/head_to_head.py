@@ -0,0 +1,154 @@
+"""
+Head-to-head win matrices: how often each student beat each other student.
+
+A matrix covers at most MAX_HEAD_TO_HEAD_STUDENTS students: a given list of
+them for the class, or an arena's participants (optionally narrowed to a
+list). It is computed with one grouped self-join of match_participants
+restricted to those students (every winner of a completed match beat every
+loser of it) and returned dense, with the student IDs as its index.
+Matrices are kept in process per scope and student set under a version
+taken from their roster: every path that completes a match adds to its
+participants' total_matches, and resetting, renaming or deleting a student
+changes the roster too, so nothing has to be bumped (or locked) when
+results change.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from ..models.arena_session import ArenaParticipant
+from ..models.match import Match, MatchParticipant, MatchStatus
+from ..models.student import Student
+
+# Scope for the whole class, as opposed to one arena's ID
+CLASS_SCOPE = "class"
+
+# Most students one matrix covers (it holds the square of this many counts)
+MAX_HEAD_TO_HEAD_STUDENTS = int(os.getenv("MAX_HEAD_TO_HEAD_STUDENTS", 50))
+
+async def get_roster(
+    db: AsyncSession,
+    arena_id: Optional[UUID] = None,
+    student_ids: Optional[Sequence[UUID]] = None
+) -> List[Tuple[UUID, str, int]]:
+    """
+    (id, name, total_matches) of the given students, of an arena's
+    participants, or of the given students among them, by name.
+    """
+    students = select(Student.id, Student.name, Student.total_matches).order_by(Student.name, Student.id)
+    if arena_id is not None:
+        students = students.join(ArenaParticipant, ArenaParticipant.student_id == Student.id).where(
+            ArenaParticipant.arena_id == arena_id
+        )
+    if student_ids is not None:
+        students = students.where(Student.id.in_(student_ids))
+    return [tuple(row) for row in (await db.execute(students)).all()]
+
+def roster_version(roster: Sequence[Tuple[UUID, str, int]]) -> str:
+    """Digest of a roster; moves whenever one of its students finishes a match."""
+    return hashlib.sha1(repr(list(roster)).encode()).hexdigest()[:16]
+
+async def compute_matrix(
+    db: AsyncSession,
+    roster: Sequence[Tuple[UUID, str, int]],
+    arena_id: Optional[UUID] = None
+) -> Dict[str, Any]:
+    """
+    Win matrix over a roster, counting every completed match (or an arena's):
+    wins[i][j] is how many of them student_ids[i] won with student_ids[j]
+    among the losers.
+    """
+    student_ids = [student_id for student_id, _, _ in roster]
+    winner = aliased(MatchParticipant)
+    loser = aliased(MatchParticipant)
+    query = (
+        select(winner.student_id, loser.student_id, func.count())
+        .join(
+            loser,
+            and_(loser.match_id == winner.match_id, loser.created_at == winner.created_at)
+        )
+        .join(Match, and_(Match.id == winner.match_id, Match.created_at == winner.created_at))
+        .where(
+            Match.status == MatchStatus.COMPLETED,
+            winner.is_winner.is_(True),
+            loser.is_winner.is_(False),
+            winner.student_id.in_(student_ids),
+            loser.student_id.in_(student_ids)
+        )
+        .group_by(winner.student_id, loser.student_id)
+    )
+    if arena_id is not None:
+        query = query.where(Match.arena_id == arena_id)
+
+    index = {student_id: i for i, student_id in enumerate(student_ids)}
+    wins = [[0] * len(roster) for _ in roster]
+    for winner_id, loser_id, count in (await db.execute(query)).all():
+        wins[index[winner_id]][index[loser_id]] = count
+    return {
+        "student_ids": student_ids,
+        "names": [name for _, name, _ in roster],
+        "wins": wins,
+    }
+
+class HeadToHeadCache:
+    """
+    Computed matrices per scope and student set with the roster version they
+    were computed at; an entry is recomputed when its version moves. At most
+    max_entries are kept; the least recently used goes first.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+
+    async def get(
+        self,
+        db: AsyncSession,
+        arena_id: Optional[UUID] = None,
+        student_ids: Optional[Sequence[UUID]] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        (version, matrix) for the given students (required for the class),
+        an arena's participants, or the given students among them. Raises
+        ValueError for more than MAX_HEAD_TO_HEAD_STUDENTS students or for
+        students that are not in the scope.
+        """
+        if arena_id is None and not student_ids:
+            raise ValueError("student_ids is required for the class head-to-head")
+        if student_ids is not None:
+            student_ids = sorted(set(student_ids), key=str)
+            if len(student_ids) > MAX_HEAD_TO_HEAD_STUDENTS:
+                raise ValueError(f"At most {MAX_HEAD_TO_HEAD_STUDENTS} students per head-to-head")
+
+        # Roster first: a match completing between the two reads leaves the
+        # old version with the new matrix, which only causes one extra recompute
+        roster = await get_roster(db, arena_id, student_ids)
+        if student_ids is not None and len(roster) < len(student_ids):
+            raise ValueError("Some students were not found in this scope")
+        if len(roster) > MAX_HEAD_TO_HEAD_STUDENTS:
+            raise ValueError(
+                f"More than {MAX_HEAD_TO_HEAD_STUDENTS} participants; pass student_ids to choose among them"
+            )
+        version = roster_version(roster)
+
+        key = str(arena_id) if arena_id is not None else CLASS_SCOPE
+        if student_ids is not None:
+            key += ":" + hashlib.sha1(",".join(map(str, student_ids)).encode()).hexdigest()[:16]
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(key)
+            return entry
+        matrix = await compute_matrix(db, roster, arena_id)
+        self._entries[key] = (version, matrix)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return version, matrix
+
+head_to_head_cache = HeadToHeadCache(int(os.getenv("HEAD_TO_HEAD_CACHE_SIZE", 64)))
@@ -0,0 +1,292 @@
+"""
+Lightweight job queue on the jobs table.
+
+Producers call enqueue() inside their own transaction, so a job exists if and
+only if the work that caused it was committed. Workers claim runnable jobs
+with SELECT ... FOR UPDATE SKIP LOCKED, which lets any number of workers, in
+the app (job_worker) or in separate processes (run_jobs.py), share the table
+without handing the same job out twice. A job's handler runs in the same
+transaction that marks it done; a failure rolls the work back and retries the
+job with exponential backoff until max_attempts is reached. While a handler
+runs its lock is refreshed, so only jobs of workers that died are released
+to run again, and only while they have attempts left.
+"""
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select, update, delete, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.logging import get_logger, log_context
+from ..database import AsyncSessionLocal, IS_SQLITE, dialect_insert
+from ..models.job import Job, JobStatus
+
+logger = get_logger(__name__)
+
+JobHandler = Callable[[AsyncSession, Dict[str, Any]], Awaitable[None]]
+
+# kind -> handler; filled in by job_handler()
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+# Must match the predicate of ux_jobs_dedup_key_pending
+PENDING_PREDICATE = text("status IN ('queued', 'running')")
+
+# Running jobs whose lock is older than this are assumed to belong to a dead worker
+JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", 300))
+
+# Running jobs refresh their lock this often, well within the timeout
+JOB_HEARTBEAT_SECONDS = JOB_LOCK_TIMEOUT_SECONDS / 3
+
+# Finished jobs are kept this long for inspection
+JOB_RETENTION_HOURS = int(os.getenv("JOB_RETENTION_HOURS", 24))
+
+def job_handler(kind: str):
+    """Register the decorated coroutine as the handler for jobs of this kind."""
+    def register(func: JobHandler) -> JobHandler:
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff: 2, 4, 8, ... seconds, capped at ten minutes."""
+    return timedelta(seconds=min(2 ** attempts, 600))
+
+async def enqueue(
+    db: AsyncSession,
+    kind: str,
+    payload: Dict[str, Any],
+    dedup_key: Optional[str] = None,
+    max_attempts: int = 5,
+    delay_seconds: float = 0
+) -> bool:
+    """
+    Add a job in the caller's transaction; the caller commits. If a queued or
+    running job already has the same dedup_key nothing is added.
+    Returns whether a job was added.
+    """
+    result = await db.execute(
+        dialect_insert(Job)
+        .values(
+            kind=kind,
+            payload=payload,
+            dedup_key=dedup_key,
+            max_attempts=max_attempts,
+            run_at=datetime.now(timezone.utc) + timedelta(seconds=delay_seconds)
+        )
+        .on_conflict_do_nothing(index_elements=[Job.dedup_key], index_where=PENDING_PREDICATE)
+    )
+    return result.rowcount > 0
+
+async def claim_jobs(db: AsyncSession, worker_id: str, limit: int = 1) -> List[Job]:
+    """
+    Mark up to limit runnable jobs as running for worker_id and return them.
+    Jobs held by a dead worker are released first, or failed if that was
+    their last attempt. Commits.
+    """
+    now = datetime.now(timezone.utc)
+    stale = (
+        Job.status == JobStatus.RUNNING,
+        Job.locked_at < now - timedelta(seconds=JOB_LOCK_TIMEOUT_SECONDS)
+    )
+    await db.execute(
+        update(Job)
+        .where(*stale, Job.attempts >= Job.max_attempts)
+        .values(
+            status=JobStatus.FAILED,
+            locked_by=None,
+            locked_at=None,
+            last_error="worker stopped responding on the last attempt"
+        )
+    )
+    await db.execute(
+        update(Job)
+        .where(*stale)
+        .values(status=JobStatus.QUEUED, locked_by=None, locked_at=None)
+    )
+    # SQLite has no row locks (FOR UPDATE is not rendered) but allows one writer at a time
+    runnable = (
+        select(Job.id)
+        .where(Job.status == JobStatus.QUEUED, Job.run_at <= now)
+        .order_by(Job.run_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(
+        update(Job)
+        .where(Job.id.in_(runnable.scalar_subquery()))
+        .values(
+            status=JobStatus.RUNNING,
+            attempts=Job.attempts + 1,
+            locked_by=worker_id,
+            locked_at=now
+        )
+        .returning(Job)
+        .execution_options(synchronize_session=False)
+    )
+    jobs = list(result.scalars().all())
+    await db.commit()
+    return jobs
+
+async def _heartbeat(job: Job) -> None:
+    """Refresh a running job's lock until cancelled, so it is not claimed again."""
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Job)
+                    .where(Job.id == job.id, Job.status == JobStatus.RUNNING, Job.locked_by == job.locked_by)
+                    .values(locked_at=datetime.now(timezone.utc))
+                )
+                await db.commit()
+        except Exception as exc:
+            logger.warning("Job heartbeat failed", error=repr(exc))
+
+async def run_job(job: Job) -> bool:
+    """
+    Run one claimed job in its own session. Returns whether it succeeded.
+    The handler's writes and the status change are committed together.
+    """
+    heartbeat = asyncio.create_task(_heartbeat(job))
+    try:
+        return await _run_job(job)
+    finally:
+        heartbeat.cancel()
+
+async def _run_job(job: Job) -> bool:
+    # Records logged by the handler carry the job and, where known, the match it is for
+    context = {"job_id": job.id, "job_kind": job.kind}
+    context.update({key: job.payload[key] for key in ("arena_id", "match_id") if key in job.payload})
+    with log_context(**context):
+        handler = JOB_HANDLERS.get(job.kind)
+        async with AsyncSessionLocal() as db:
+            try:
+                if handler is None:
+                    raise LookupError(f"no handler registered for job kind {job.kind!r}")
+                await handler(db, job.payload)
+                await db.execute(
+                    update(Job)
+                    .where(Job.id == job.id)
+                    .values(status=JobStatus.DONE, locked_by=None, locked_at=None, last_error=None)
+                )
+                await db.commit()
+                return True
+            except Exception as exc:
+                await db.rollback()
+                exhausted = job.attempts >= job.max_attempts
+                if exhausted:
+                    logger.exception("Job failed permanently", attempts=job.attempts)
+                else:
+                    logger.warning("Job failed, retrying", attempts=job.attempts, error=repr(exc))
+                await db.execute(
+                    update(Job)
+                    .where(Job.id == job.id)
+                    .values(
+                        status=JobStatus.FAILED if exhausted else JobStatus.QUEUED,
+                        run_at=datetime.now(timezone.utc) + retry_delay(job.attempts),
+                        locked_by=None,
+                        locked_at=None,
+                        last_error=repr(exc)
+                    )
+                )
+                await db.commit()
+                return False
+
+async def purge_finished_jobs(db: AsyncSession, older_than_hours: int = JOB_RETENTION_HOURS) -> int:
+    """Delete done jobs older than older_than_hours. Failed jobs are kept. Commits."""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=older_than_hours)
+    result = await db.execute(
+        delete(Job).where(Job.status == JobStatus.DONE, Job.updated_at < cutoff)
+    )
+    await db.commit()
+    return result.rowcount
+
+async def get_queue_depth(db: AsyncSession) -> Dict[str, int]:
+    """Number of jobs per status."""
+    result = await db.execute(select(Job.status, func.count()).group_by(Job.status))
+    return {status: count for status, count in result.all()}
+
+class JobWorker:
+    """
+    Pool of asyncio tasks that claim and run jobs. Each task polls every
+    poll_seconds, or sooner when notify() is called after a commit that
+    enqueued work. concurrency 0 disables the pool (jobs can then be run by
+    run_jobs.py in another process).
+    """
+
+    def __init__(self, concurrency: int, poll_seconds: float):
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._last_purge: Optional[datetime] = None
+
+    def start(self) -> None:
+        if self.concurrency <= 0 or self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._run(f"{self.worker_id}:{slot}"))
+            for slot in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wake idle workers without waiting for the next poll."""
+        self._wakeup.set()
+
+    async def run_until_idle(self) -> int:
+        """Run jobs until none are runnable. Returns how many were run."""
+        count = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                jobs = await claim_jobs(db, self.worker_id)
+            if not jobs:
+                return count
+            for job in jobs:
+                await run_job(job)
+                count += 1
+
+    async def _maybe_purge(self) -> None:
+        now = datetime.now(timezone.utc)
+        if self._last_purge and now - self._last_purge < timedelta(hours=1):
+            return
+        self._last_purge = now
+        async with AsyncSessionLocal() as db:
+            await purge_finished_jobs(db)
+
+    async def _run(self, worker_id: str) -> None:
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    jobs = await claim_jobs(db, worker_id)
+                for job in jobs:
+                    await run_job(job)
+                if jobs:
+                    continue
+                await self._maybe_purge()
+            except Exception:
+                logger.exception("Job worker iteration failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+# In-app workers; SQLite allows a single writer, so one task is enough there
+job_worker = JobWorker(
+    concurrency=int(os.getenv("JOB_WORKERS", 1 if IS_SQLITE else 2)),
+    poll_seconds=float(os.getenv("JOB_POLL_SECONDS", 1.0)),
+)
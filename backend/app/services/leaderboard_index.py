@@ -0,0 +1,213 @@
+"""
+In-memory leaderboard index.
+
+Every student's rating is kept in a sorted array in leaderboard order
+(elo_rating desc, id desc, the same order as ix_students_elo_rating_id), so
+rank, percentile and the students around one student are answered
+with a binary search instead of sorting the students table.
+
+The index is loaded at startup and follows rating writes through session
+events: Student inserts, rating changes and deletes are collected on flush
+and applied when the transaction commits, so a rolled back match never moves
+the board. Writes made by other processes (or by Core statements that bypass
+the ORM) are picked up by a periodic consistency check against the database.
+"""
+import asyncio
+import math
+import os
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import event, select, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..core.logging import get_logger
+from ..database import AsyncSessionLocal
+from ..models.student import Student
+
+logger = get_logger(__name__)
+
+# (-elo_rating, -id, id): ascending order is the leaderboard order
+_Entry = Tuple[float, int, UUID]
+
+def _entry(student_id: UUID, rating: float) -> _Entry:
+    return (-rating, -student_id.int, student_id)
+
+class LeaderboardIndex:
+    """
+    Ratings of all students in leaderboard order. Lookups are O(log n);
+    a rating change moves one entry. Ranks are competition ranks (ties
+    share a rank), matching StatisticsService.get_leaderboard.
+    """
+
+    def __init__(self, check_interval_seconds: int):
+        self.check_interval_seconds = check_interval_seconds
+        self._entries: List[_Entry] = []
+        self._ratings: Dict[UUID, float] = {}
+        # Bumped on every change, so a check can tell that it raced a commit
+        self._version = 0
+        self.loaded = False
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _replace(self, ratings: Dict[UUID, float]) -> None:
+        self._ratings = ratings
+        self._entries = sorted(_entry(student_id, rating) for student_id, rating in ratings.items())
+        self._version += 1
+        self.loaded = True
+
+    async def _read_ratings(self, db: AsyncSession) -> Dict[UUID, float]:
+        result = await db.execute(select(Student.id, Student.elo_rating).where(Student.elo_rating.isnot(None)))
+        return {student_id: rating for student_id, rating in result.all()}
+
+    async def load(self, db: Optional[AsyncSession] = None) -> None:
+        """(Re)build the index from the students table."""
+        if db is None:
+            async with AsyncSessionLocal() as db:
+                ratings = await self._read_ratings(db)
+        else:
+            ratings = await self._read_ratings(db)
+        self._replace(ratings)
+        logger.info("Leaderboard index loaded", students=len(ratings))
+
+    def set_rating(self, student_id: UUID, rating: float) -> None:
+        """Insert a student or move them to their new rating."""
+        current = self._ratings.get(student_id)
+        if current == rating:
+            return
+        if current is not None:
+            del self._entries[bisect_left(self._entries, _entry(student_id, current))]
+        insort(self._entries, _entry(student_id, rating))
+        self._ratings[student_id] = rating
+        self._version += 1
+
+    def remove(self, student_id: UUID) -> None:
+        current = self._ratings.pop(student_id, None)
+        if current is not None:
+            del self._entries[bisect_left(self._entries, _entry(student_id, current))]
+            self._version += 1
+
+    def _position(self, student_id: UUID) -> Optional[int]:
+        rating = self._ratings.get(student_id)
+        if rating is None:
+            return None
+        return bisect_left(self._entries, _entry(student_id, rating))
+
+    def _rank_of_rating(self, rating: float) -> int:
+        # 1 + number of students rated strictly higher
+        return bisect_left(self._entries, (-rating,)) + 1
+
+    def _row(self, position: int) -> Dict[str, Any]:
+        negative_rating, _, student_id = self._entries[position]
+        return {
+            "student_id": student_id,
+            "elo_rating": -negative_rating,
+            "rank": self._rank_of_rating(-negative_rating),
+        }
+
+    def rank(self, student_id: UUID) -> Optional[Dict[str, Any]]:
+        """
+        Rank, total and percentile (share of students rated strictly lower)
+        for a student; None if the student is not indexed.
+        """
+        rating = self._ratings.get(student_id)
+        if rating is None:
+            return None
+        total = len(self._entries)
+        at_or_above = bisect_left(self._entries, (-rating, math.inf))
+        return {
+            "student_id": student_id,
+            "elo_rating": rating,
+            "rank": self._rank_of_rating(rating),
+            "total": total,
+            "percentile": round((total - at_or_above) / total * 100, 1),
+        }
+
+    def around(self, student_id: UUID, radius: int) -> Optional[List[Dict[str, Any]]]:
+        """The student plus up to radius students on either side; None if not indexed."""
+        position = self._position(student_id)
+        if position is None:
+            return None
+        start = max(position - radius, 0)
+        end = min(position + radius + 1, len(self._entries))
+        return [self._row(index) for index in range(start, end)]
+
+    async def check_consistency(self) -> int:
+        """
+        Compare the index with the database and rebuild it if they differ.
+        Returns the number of students that were out of line (0 when the
+        check was skipped because the index changed during the read).
+        """
+        version = self._version
+        async with AsyncSessionLocal() as db:
+            ratings = await self._read_ratings(db)
+        if version != self._version:
+            # A commit landed while reading; the snapshot may already be older than the index
+            return 0
+        drifted = sum(1 for student_id, rating in ratings.items() if self._ratings.get(student_id) != rating)
+        drifted += sum(1 for student_id in self._ratings if student_id not in ratings)
+        if drifted:
+            logger.warning("Leaderboard index out of line with the database, rebuilding", students=drifted)
+            self._replace(ratings)
+        return drifted
+
+    def start(self) -> None:
+        if self.check_interval_seconds <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval_seconds)
+            try:
+                await self.check_consistency()
+            except Exception:
+                logger.exception("Leaderboard index consistency check failed")
+
+# Seconds between consistency checks; 0 disables them
+leaderboard_index = LeaderboardIndex(int(os.getenv("LEADERBOARD_CHECK_SECONDS", 300)))
+
+_PENDING_KEY = "leaderboard_changes"
+
+@event.listens_for(Session, "after_flush")
+def _collect_rating_changes(session, flush_context):
+    """Remember flushed Student inserts, rating changes and deletes until commit."""
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for instance in session.new:
+        if isinstance(instance, Student):
+            pending[instance.id] = instance.elo_rating
+    for instance in session.dirty:
+        if isinstance(instance, Student) and inspect(instance).attrs.elo_rating.history.has_changes():
+            pending[instance.id] = instance.elo_rating
+    for instance in session.deleted:
+        if isinstance(instance, Student):
+            pending[instance.id] = None
+
+@event.listens_for(Session, "after_commit")
+def _apply_rating_changes(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending or not leaderboard_index.loaded:
+        return
+    for student_id, rating in pending.items():
+        if rating is None:
+            leaderboard_index.remove(student_id)
+        else:
+            leaderboard_index.set_rating(student_id, rating)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rating_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -10,6 +10,7 @@ from datetime import datetime, timedelta, timezone
 from ..models.student import Student
 from ..models.match import Match, MatchParticipant, MatchStatus
 from ..models.arena_session import ArenaParticipant
+from ..models.loader_profiles import loader_profile
 from .elo_service import EloService
 
 
@@ -227,11 +228,13 @@ class MatchmakingService:
             mp1 = MatchParticipant(
                 match_id=new_match.id,
                 student_id=p1,
+                created_at=new_match.created_at,
                 elo_before=e1
             )
             mp2 = MatchParticipant(
                 match_id=new_match.id,
                 student_id=p2,
+                created_at=new_match.created_at,
                 elo_before=e2
             )
             db.add_all([mp1, mp2])
@@ -373,9 +376,16 @@ class MatchmakingService:
             mp = MatchParticipant(
                 match_id=match.id,
                 student_id=pid,
+                created_at=match.created_at,
                 elo_before=s.elo_rating if s else 1000
             )
             db.add(mp)
         await db.commit()
-        await db.refresh(match)
-        return match
+        # Participants are lazy="raise"; reload the match with them for the response
+        result = await db.execute(
+            select(Match)
+            .options(*loader_profile("match_with_participants"))
+            .where(Match.id == match.id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one()
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import re
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.logging import get_logger
+from ..database import AsyncSessionLocal
+
+logger = get_logger(__name__)
+
+# Tables partitioned by month on created_at, parents before children
+PARTITIONED_TABLES = ("matches", "match_participants", "rounds", "round_participants")
+
+# Detached partitions are moved here rather than dropped
+ARCHIVE_SCHEMA = "archive"
+
+PARTITION_SUFFIX = re.compile(r"_p(\d{4})(\d{2})$")
+
+# Advisory lock held by whichever process is maintaining partitions
+MAINTENANCE_LOCK = "partition_maintenance"
+
+def month_start(value: datetime) -> datetime:
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+def add_months(value: datetime, months: int) -> datetime:
+    year = value.year + (value.month - 1 + months) // 12
+    month = (value.month - 1 + months) % 12 + 1
+    return value.replace(year=year, month=month)
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+async def _try_lock(db: AsyncSession) -> bool:
+    """Take the maintenance lock for the current transaction, unless another process holds it."""
+    return await db.scalar(select(func.pg_try_advisory_xact_lock(func.hashtext(MAINTENANCE_LOCK))))
+
+async def ensure_future_partitions(db: AsyncSession, months_ahead: int = 3) -> List[str]:
+    """
+    Create monthly partitions from the current month through months_ahead
+    months from now. Existing partitions are left alone; rows of a month that
+    already landed in the default partitions are moved into the new ones.
+    Does nothing while another process is maintaining partitions.
+    Returns the names of partitions that were created.
+    """
+    if not await _try_lock(db):
+        await db.rollback()
+        return []
+
+    current = month_start(datetime.now(timezone.utc))
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        missing = [
+            table for table in PARTITIONED_TABLES
+            if not await db.scalar(
+                text("SELECT to_regclass(:name) IS NOT NULL"), {"name": partition_name(table, month)}
+            )
+        ]
+        if not missing:
+            continue
+
+        bounds = f"created_at >= '{month.isoformat()}' AND created_at < '{add_months(month, 1).isoformat()}'"
+        # A new partition may not overlap rows in the default one, so the month's
+        # rows are set aside first, children before parents for the foreign keys
+        for table in reversed(missing):
+            await db.execute(text(
+                f"CREATE TEMP TABLE {table}_moving ON COMMIT DROP AS "
+                f"SELECT * FROM {table}_default WHERE {bounds}"
+            ))
+            await db.execute(text(f"DELETE FROM {table}_default WHERE {bounds}"))
+        for table in missing:
+            name = partition_name(table, month)
+            await db.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            await db.execute(text(f"INSERT INTO {table} SELECT * FROM {table}_moving"))
+            await db.execute(text(f"DROP TABLE {table}_moving"))
+            created.append(name)
+    await db.commit()
+    return created
+
+async def list_partitions(db: AsyncSession, table: str) -> List[str]:
+    """Names of the monthly partitions currently attached to table."""
+    result = await db.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :table
+        ORDER BY child.relname
+    """), {"table": table})
+    return [name for name in result.scalars().all() if PARTITION_SUFFIX.search(name)]
+
+async def detach_old_partitions(db: AsyncSession, retention_months: int) -> List[str]:
+    """
+    Detach partitions whose whole month is older than retention_months and
+    move them to the archive schema. Children are detached before parents so
+    the composite foreign keys never point into a detached partition.
+    Does nothing while another process is maintaining partitions.
+    Returns the names of partitions that were detached.
+    """
+    if retention_months <= 0:
+        return []
+    if not await _try_lock(db):
+        await db.rollback()
+        return []
+
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), -retention_months)
+    await db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+
+    detached = []
+    for table in reversed(PARTITIONED_TABLES):
+        for name in await list_partitions(db, table):
+            year, month = PARTITION_SUFFIX.search(name).groups()
+            partition_month = datetime(int(year), int(month), 1, tzinfo=timezone.utc)
+            if add_months(partition_month, 1) > cutoff:
+                continue
+            await db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            await db.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+            detached.append(name)
+    await db.commit()
+    return detached
+
+class PartitionMaintainer:
+    """
+    Background asyncio task that keeps months_ahead months of partitions
+    ready and detaches partitions past retention_months (0 keeps everything).
+    Runs once at startup and then every interval_seconds; an advisory lock
+    keeps workers from maintaining partitions at the same time.
+    """
+
+    def __init__(self, interval_seconds: int, months_ahead: int, retention_months: int):
+        self.interval_seconds = interval_seconds
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.interval_seconds <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run_once(self) -> None:
+        async with AsyncSessionLocal() as db:
+            created = await ensure_future_partitions(db, self.months_ahead)
+            detached = await detach_old_partitions(db, self.retention_months)
+        if created or detached:
+            logger.info("Partition maintenance", created=created, detached=detached)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Partition maintenance failed")
+            await asyncio.sleep(self.interval_seconds)
+
+# Interval in seconds; 0 disables the scheduler. Without it new rows fall into
+# the default partitions once the migration's months run out. Detaching (which
+# takes an ACCESS EXCLUSIVE lock on each table) only happens when
+# PARTITION_RETENTION_MONTHS is set, or from maintain_partitions.py
+partition_maintainer = PartitionMaintainer(
+    interval_seconds=int(os.getenv("PARTITION_MAINTENANCE_SECONDS", 3600)),
+    months_ahead=int(os.getenv("PARTITION_MONTHS_AHEAD", 3)),
+    retention_months=int(os.getenv("PARTITION_RETENTION_MONTHS", 0)),
+)
@@ -1,27 +1,82 @@
-from typing import List, Dict, Any
-from sqlalchemy import select, func, desc
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from uuid import UUID
+from sqlalchemy import select, func, desc, distinct, and_, any_, text, tuple_, literal, case
+from sqlalchemy.orm import aliased
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..models.student import Student
-from ..models.match import Match, MatchStatus, Round, RoundParticipant
+from ..models.match import Match, MatchParticipant, Round, RoundParticipant
 from ..models.flashcard import Flashcard
 from ..models.arena_session import ArenaSession
+from ..models.loader_profiles import loader_profile
+from ..models.stats_views import flashcard_usage_stats
+from ..database import IS_SQLITE
+
+def is_round_winner():
+    """True for a round participant listed in the round's winner_ids"""
+    if IS_SQLITE:
+        # winner_ids is a JSON array of UUID strings there and student_id a 16-byte blob
+        return text(
+            "EXISTS (SELECT 1 FROM json_each(rounds.winner_ids) "
+            "WHERE upper(replace(json_each.value, '-', '')) = hex(round_participants.student_id))"
+        )
+    return RoundParticipant.student_id == any_(Round.winner_ids)
+
+def _flashcard_usage_columns():
+    """Per-flashcard aggregates over rounds joined to their matches and participants"""
+    return (
+        func.count(distinct(Round.id)).label("times_used"),
+        func.count(RoundParticipant.student_id).label("total_participants"),
+        func.count().filter(is_round_winner()).label("total_winners"),
+        func.count(distinct(Match.arena_id)).label("used_in_arenas"),
+    )
+
+def _join_round_participants(query):
+    # Participants carry their round's created_at, so both partitioned tables are pruned
+    return query.outerjoin(
+        RoundParticipant,
+        and_(
+            RoundParticipant.round_id == Round.id,
+            RoundParticipant.created_at == Round.created_at
+        )
+    )
+
+def _success_rate(total_winners: int, total_participants: int) -> float:
+    return round(total_winners / total_participants * 100, 1) if total_participants > 0 else 0
+
+def _win_rate(wins: int, total_matches: int) -> float:
+    return round(wins / total_matches * 100, 1) if total_matches > 0 else 0
+
+def _encode_cursor(*values: Any) -> str:
+    return "|".join(str(value) for value in values)
+
+def _decode_cursor(cursor: str, parts: int) -> List[str]:
+    """Split a keyset cursor; ValueError if it is malformed."""
+    values = cursor.split("|")
+    if len(values) != parts:
+        raise ValueError("Invalid cursor")
+    return values
+
+def _row_value(*columns):
+    """Row-value pair for keyset comparisons: the columns and a binder for cursor values.
+    Values are bound with the column types, so GUIDs compare as stored on SQLite."""
+    return tuple_(*columns), lambda *values: tuple_(*(literal(v, c.type) for c, v in zip(columns, values)))
 
 class StatisticsService:
     @staticmethod
     async def get_flashcard_stats(flashcard_id: str, db: AsyncSession) -> Dict[str, Any]:
-        """Get comprehensive statistics for a flashcard"""
-        # Get the flashcard
-        flashcard = await db.get(Flashcard, flashcard_id)
-        if not flashcard:
+        """Get comprehensive statistics for a flashcard in one grouped query"""
+        query = _join_round_participants(
+            select(Flashcard.id, *_flashcard_usage_columns())
+            .select_from(Flashcard)
+            .outerjoin(Round, Round.flashcard_id == Flashcard.id)
+            .outerjoin(Match, Match.id == Round.match_id)
+        ).where(Flashcard.id == flashcard_id).group_by(Flashcard.id)
+        row = (await db.execute(query)).first()
+        if row is None:
             raise ValueError("Flashcard not found")
 
-        # Get rounds where this flashcard was used
-        rounds_query = select(Round).where(Round.flashcard_id == flashcard_id)
-        result = await db.execute(rounds_query)
-        rounds = result.scalars().all()
-
-        total_uses = len(rounds)
-        if total_uses == 0:
+        if row.times_used == 0:
             return {
                 "total_uses": 0,
                 "success_rate": 0,
@@ -29,209 +84,289 @@ class StatisticsService:
                 "used_in_arenas": 0
             }
 
-        # Calculate statistics
-        total_winners = sum(len(round.winner_ids or []) for round in rounds)
-        total_participants = await db.scalar(
-            select(func.count(RoundParticipant.student_id))
-            .where(RoundParticipant.round_id.in_([r.id for r in rounds]))
-        )
-
-        # Get unique arena sessions this flashcard was used in
-        unique_arenas = await db.scalar(
-            select(func.count(func.distinct(Match.arena_id)))
-            .join(Round, Round.match_id == Match.id)
-            .where(Round.flashcard_id == flashcard_id)
-        )
-
         return {
-            "total_uses": total_uses,
-            "success_rate": round((total_winners / total_participants * 100), 1) if total_participants > 0 else 0,
-            "average_winners": round(total_winners / total_uses, 2),
-            "used_in_arenas": unique_arenas
+            "total_uses": row.times_used,
+            "success_rate": _success_rate(row.total_winners, row.total_participants),
+            "average_winners": round(row.total_winners / row.times_used, 2),
+            "used_in_arenas": row.used_in_arenas
         }
 
     @staticmethod
     async def get_most_used_flashcards(db: AsyncSession, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get flashcards sorted by usage frequency"""
+        """Get flashcards sorted by usage frequency (read from the flashcard_usage_stats view)"""
+        usage = flashcard_usage_stats.c
         query = (
             select(
-                Flashcard,
-                func.count(Round.id).label('usage_count')
+                Flashcard.id,
+                Flashcard.question,
+                usage.usage_count,
+                usage.total_winners,
+                usage.total_participants,
+                usage.used_in_arenas
             )
-            .join(Round, Round.flashcard_id == Flashcard.id)
-            .group_by(Flashcard.id)
-            .order_by(desc('usage_count'))
+            .join(flashcard_usage_stats, usage.flashcard_id == Flashcard.id)
+            .order_by(desc(usage.usage_count))
             .limit(limit)
         )
         
         result = await db.execute(query)
-        flashcards_with_count = result.all()
 
         stats = []
-        for flashcard, usage_count in flashcards_with_count:
-            flashcard_stats = await StatisticsService.get_flashcard_stats(flashcard.id, db)
+        for row in result:
             stats.append({
-                "id": flashcard.id,
-                "question": flashcard.question,
-                "usage_count": usage_count,
-                "success_rate": flashcard_stats["success_rate"],
-                "used_in_arenas": flashcard_stats["used_in_arenas"]
+                "id": row.id,
+                "question": row.question,
+                "usage_count": row.usage_count,
+                "success_rate": (
+                    round(row.total_winners / row.total_participants * 100, 1)
+                    if row.total_participants > 0
+                    else 0
+                ),
+                "used_in_arenas": row.used_in_arenas
             })
 
         return stats
 
     @staticmethod
     async def get_arena_flashcard_stats(arena_id: str, db: AsyncSession) -> List[Dict[str, Any]]:
-        """Get statistics for all flashcards used in a specific arena session"""
+        """Get statistics for all flashcards used in a specific arena session, in one grouped query"""
         # Verify arena exists
-        arena = await db.get(ArenaSession, arena_id)
+        arena = await db.get(ArenaSession, arena_id, options=loader_profile("arena_header"))
         if not arena:
             raise ValueError("Arena session not found")
 
-        # Get all rounds in this arena's matches
-        rounds_query = (
-            select(Round, Flashcard)
+        query = _join_round_participants(
+            select(Flashcard.id, Flashcard.question, *_flashcard_usage_columns())
+            .select_from(Round)
             .join(Match, Match.id == Round.match_id)
             .join(Flashcard, Flashcard.id == Round.flashcard_id)
-            .where(Match.arena_id == arena_id)
+        ).where(Match.arena_id == arena_id).group_by(Flashcard.id, Flashcard.question).order_by(desc("times_used"))
+        result = await db.execute(query)
+
+        return [
+            {
+                "id": row.id,
+                "question": row.question,
+                "times_used": row.times_used,
+                "success_rate": _success_rate(row.total_winners, row.total_participants)
+            }
+            for row in result
+        ]
+
+    @staticmethod
+    async def get_student_stats(student_id: str, db: AsyncSession) -> Dict[str, Any]:
+        """
+        Get comprehensive statistics for a student in one query: totals and
+        average ELO change from match_participants, rank by current rating.
+        """
+        higher = aliased(Student)
+        # rank() over all students, without ranking them all: index probe on elo_rating
+        rank = (
+            select(func.count())
+            .select_from(higher)
+            .where(higher.elo_rating > Student.elo_rating)
+            .correlate(Student)
+            .scalar_subquery()
+            + 1
         )
-        
-        result = await db.execute(rounds_query)
-        rounds_with_flashcards = result.all()
-
-        stats = {}
-        for round, flashcard in rounds_with_flashcards:
-            if flashcard.id not in stats:
-                stats[flashcard.id] = {
-                    "id": flashcard.id,
-                    "question": flashcard.question,
-                    "times_used": 0,
-                    "total_winners": 0,
-                    "total_participants": 0
-                }
-            
-            stats[flashcard.id]["times_used"] += 1
-            stats[flashcard.id]["total_winners"] += len(round.winner_ids or [])
-            
-            # Count participants
-            participant_count = await db.scalar(
-                select(func.count(RoundParticipant.student_id))
-                .where(RoundParticipant.round_id == round.id)
+        query = (
+            select(
+                Student.elo_rating,
+                rank.label("rank"),
+                func.count(MatchParticipant.student_id).label("total_matches"),
+                func.count().filter(MatchParticipant.is_winner).label("wins"),
+                func.avg(MatchParticipant.elo_after - MatchParticipant.elo_before).label("avg_elo_change")
             )
-            stats[flashcard.id]["total_participants"] += participant_count
-
-        # Calculate success rates and format response
-        formatted_stats = []
-        for flashcard_stats in stats.values():
-            success_rate = (
-                round(flashcard_stats["total_winners"] / flashcard_stats["total_participants"] * 100, 1)
-                if flashcard_stats["total_participants"] > 0
-                else 0
+            .outerjoin(
+                MatchParticipant,
+                and_(
+                    MatchParticipant.student_id == Student.id,
+                    MatchParticipant.is_winner.isnot(None)
+                )
             )
-            formatted_stats.append({
-                "id": flashcard_stats["id"],
-                "question": flashcard_stats["question"],
-                "times_used": flashcard_stats["times_used"],
-                "success_rate": success_rate
-            })
+            .where(Student.id == student_id)
+            .group_by(Student.id, Student.elo_rating)
+        )
+        row = (await db.execute(query)).first()
+        if row is None:
+            raise ValueError("Student not found")
 
-        return sorted(formatted_stats, key=lambda x: x["times_used"], reverse=True)
+        return {
+            "total_matches": row.total_matches,
+            "wins": row.wins,
+            "losses": row.total_matches - row.wins,
+            "win_rate": _win_rate(row.wins, row.total_matches),
+            "current_elo": row.elo_rating,
+            "rank": row.rank,
+            "avg_elo_change": round(row.avg_elo_change or 0, 1)
+        }
 
     @staticmethod
-    async def get_student_stats(student_id: str, db: AsyncSession) -> Dict[str, Any]:
-        """Get comprehensive statistics for a student"""
-        # Get the student
-        student = await db.get(Student, student_id)
-        if not student:
-            raise ValueError("Student not found")
+    async def get_leaderboard(
+        db: AsyncSession, limit: int = 10, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Live leaderboard page, computed from students and match_participants
+        in one query. Pages are keyset-paginated on (elo_rating, id) through
+        ix_students_elo_rating_id; pass the returned cursor to get the next
+        page. Returns the page and the next cursor (None on the last page).
+        """
+        after_rating = after_id = None
+        if cursor:
+            rating, student_id = _decode_cursor(cursor, 2)
+            after_rating, after_id = float(rating), UUID(student_id)
 
-        # Get total matches
-        matches_query = select(func.count(Match.id)).where(
-            ((Match.player1_id == student_id) | (Match.player2_id == student_id)) &
-            (Match.status == MatchStatus.COMPLETED)
+        # rank() over the students from the cursor on; the students before
+        # the cursor that rate higher are added back below
+        page = select(
+            Student.id,
+            Student.name,
+            Student.elo_rating,
+            func.rank().over(order_by=Student.elo_rating.desc()).label("page_rank")
         )
-        total_matches = await db.scalar(matches_query)
+        if after_id is not None:
+            position, cursor_position = _row_value(Student.elo_rating, Student.id)
+            page = page.where(position < cursor_position(after_rating, after_id))
+        page = page.order_by(Student.elo_rating.desc(), Student.id.desc()).limit(limit).cte("page")
 
-        # Get win rate
-        wins_query = select(func.count(Match.id)).where(
-            (Match.winner_id == student_id) &
-            (Match.status == MatchStatus.COMPLETED)
+        if after_id is None:
+            rank_offset = literal(0)
+        else:
+            earlier = aliased(Student)
+            earlier_position, cursor_position = _row_value(earlier.elo_rating, earlier.id)
+            before_cursor = (
+                select(func.count()).select_from(earlier)
+                .where(earlier_position >= cursor_position(after_rating, after_id))
+                .scalar_subquery()
+            )
+            rated_higher = (
+                select(func.count()).select_from(earlier)
+                .where(earlier.elo_rating > after_rating)
+                .scalar_subquery()
+            )
+            # Everyone before the cursor rates at least after_rating, so all of them
+            # outrank a lower-rated row but only the strictly higher ones outrank a tie
+            rank_offset = case((page.c.elo_rating < after_rating, before_cursor), else_=rated_higher)
+
+        history = (
+            select(
+                MatchParticipant.student_id,
+                func.count().label("total_matches"),
+                func.count().filter(MatchParticipant.is_winner).label("wins"),
+                func.avg(MatchParticipant.elo_after - MatchParticipant.elo_before).label("avg_elo_change")
+            )
+            .where(
+                MatchParticipant.student_id.in_(select(page.c.id)),
+                MatchParticipant.is_winner.isnot(None)
+            )
+            .group_by(MatchParticipant.student_id)
+            .cte("history")
         )
-        wins = await db.scalar(wins_query)
-        win_rate = (wins / total_matches * 100) if total_matches > 0 else 0
-
-        # Get average ELO change
-        elo_changes = []
-        matches = await db.execute(
-            select(Match).where(
-                ((Match.player1_id == student_id) | (Match.player2_id == student_id)) &
-                (Match.status == MatchStatus.COMPLETED)
+        query = (
+            select(
+                page.c.id,
+                page.c.name,
+                page.c.elo_rating,
+                (page.c.page_rank + rank_offset).label("rank"),
+                func.coalesce(history.c.total_matches, 0).label("total_matches"),
+                func.coalesce(history.c.wins, 0).label("wins"),
+                history.c.avg_elo_change
             )
+            .outerjoin(history, history.c.student_id == page.c.id)
+            .order_by(page.c.elo_rating.desc(), page.c.id.desc())
         )
-        for match in matches.scalars():
-            if match.player1_id == student_id:
-                elo_changes.append(match.player1_elo_change or 0)
-            else:
-                elo_changes.append(match.player2_elo_change or 0)
-
-        avg_elo_change = sum(elo_changes) / len(elo_changes) if elo_changes else 0
+        rows = (await db.execute(query)).all()
 
-        return {
-            "total_matches": total_matches,
-            "wins": wins,
-            "losses": total_matches - wins,
-            "win_rate": round(win_rate, 1),
-            "current_elo": student.elo_rating,
-            "avg_elo_change": round(avg_elo_change, 1)
-        }
+        leaderboard = [
+            {
+                "id": row.id,
+                "name": row.name,
+                "elo_rating": row.elo_rating,
+                "rank": row.rank,
+                "wins": row.wins,
+                "losses": row.total_matches - row.wins,
+                "total_matches": row.total_matches,
+                "win_rate": _win_rate(row.wins, row.total_matches),
+                "avg_elo_change": round(row.avg_elo_change or 0, 1)
+            }
+            for row in rows
+        ]
+        next_cursor = _encode_cursor(rows[-1].elo_rating, rows[-1].id) if len(rows) == limit else None
+        return leaderboard, next_cursor
 
     @staticmethod
-    async def get_leaderboard(db: AsyncSession, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get top students by ELO rating"""
-        query = select(Student).order_by(desc(Student.elo_rating)).limit(limit)
-        result = await db.execute(query)
-        students = result.scalars().all()
-
-        leaderboard = []
-        for student in students:
-            stats = await StatisticsService.get_student_stats(student.id, db)
-            leaderboard.append({
-                "id": student.id,
-                "name": student.name,
-                "elo_rating": student.elo_rating,
-                "win_rate": stats["win_rate"],
-                "total_matches": stats["total_matches"]
-            })
-
-        return leaderboard
+    async def with_student_names(rows: List[Dict[str, Any]], db: AsyncSession) -> List[Dict[str, Any]]:
+        """Add each student's name to leaderboard index rows, in one query."""
+        if not rows:
+            return rows
+        result = await db.execute(
+            select(Student.id, Student.name).where(Student.id.in_([row["student_id"] for row in rows]))
+        )
+        names = dict(result.all())
+        return [{**row, "name": names.get(row["student_id"])} for row in rows]
 
     @staticmethod
     async def get_match_history(
-        student_id: str, db: AsyncSession, limit: int = 10
-    ) -> List[Dict[str, Any]]:
-        """Get recent match history for a student"""
-        query = select(Match).where(
-            ((Match.player1_id == student_id) | (Match.player2_id == student_id)) &
-            (Match.status == MatchStatus.COMPLETED)
-        ).order_by(desc(Match.created_at)).limit(limit)
-
-        result = await db.execute(query)
-        matches = result.scalars().all()
+        student_id: str, db: AsyncSession, limit: int = 10, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Recent completed matches for a student, newest first, with the
+        opponent, result and ELO change, in one query. Keyset-paginated on
+        (created_at, match_id); returns the page and the next cursor.
+        """
+        me = aliased(MatchParticipant)
+        other = aliased(MatchParticipant)
+        opponent = aliased(Student)
+        # Multiplayer matches report their first opponent
+        opponent_order = func.row_number().over(partition_by=me.match_id, order_by=other.student_id)
+        matches = (
+            select(
+                me.match_id,
+                me.created_at,
+                me.is_winner,
+                me.elo_before,
+                me.elo_after,
+                opponent.id.label("opponent_id"),
+                opponent.name.label("opponent_name"),
+                opponent.elo_rating.label("opponent_rating"),
+                opponent_order.label("opponent_order")
+            )
+            .outerjoin(
+                other,
+                and_(
+                    other.match_id == me.match_id,
+                    other.created_at == me.created_at,
+                    other.student_id != me.student_id
+                )
+            )
+            .outerjoin(opponent, opponent.id == other.student_id)
+            .where(me.student_id == student_id, me.is_winner.isnot(None))
+        )
+        if cursor:
+            created_at, match_id = _decode_cursor(cursor, 2)
+            position, cursor_position = _row_value(me.created_at, me.match_id)
+            matches = matches.where(position < cursor_position(datetime.fromisoformat(created_at), UUID(match_id)))
+        matches = matches.subquery()
+        query = (
+            select(matches)
+            .where(matches.c.opponent_order == 1)
+            .order_by(matches.c.created_at.desc(), matches.c.match_id.desc())
+            .limit(limit)
+        )
+        rows = (await db.execute(query)).all()
 
         history = []
-        for match in matches:
-            opponent_id = match.player2_id if match.player1_id == student_id else match.player1_id
-            opponent = await db.get(Student, opponent_id)
-            
-            elo_change = match.player1_elo_change if match.player1_id == student_id else match.player2_elo_change
-            
+        for row in rows:
+            elo_before = row.elo_before or 0.0
+            elo_after = row.elo_after if row.elo_after is not None else elo_before
             history.append({
-                "match_id": match.id,
-                "opponent_name": opponent.name,
-                "opponent_rating": opponent.elo_rating,
-                "won": match.winner_id == student_id,
-                "elo_change": elo_change,
-                "date": match.created_at
+                "match_id": row.match_id,
+                "opponent_id": row.opponent_id,
+                "opponent_name": row.opponent_name or "Unknown",
+                "opponent_rating": row.opponent_rating,
+                "won": row.is_winner,
+                "elo_change": elo_after - elo_before,
+                "date": row.created_at
             })
-
-        return history
+        next_cursor = _encode_cursor(rows[-1].created_at.isoformat(), rows[-1].match_id) if len(rows) == limit else None
+        return history, next_cursor
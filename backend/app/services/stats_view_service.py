@@ -0,0 +1,138 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, text, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.logging import get_logger
+from ..database import AsyncSessionLocal, IS_SQLITE, dialect_insert
+from ..models.match import Match
+from ..models.stats_views import MaterializedViewRefresh
+
+logger = get_logger(__name__)
+
+# Materialized views backing the statistics endpoints, in refresh order
+STATS_VIEWS = ("flashcard_usage_stats",)
+
+# Advisory lock held by the worker refreshing the views
+REFRESH_LOCK = "stats_view_refresh"
+
+# A write that began before a refresh can commit after it with an older
+# updated_at; changes this close to the last refresh still count as new
+CHANGE_SLACK = timedelta(minutes=1)
+
+async def refresh_stats_views(db: AsyncSession, concurrently: bool = True) -> None:
+    """
+    Refresh every statistics view and record when it happened.
+    CONCURRENTLY keeps the views readable while they are rebuilt.
+    On SQLite the views are computed on read, so only the timestamp moves.
+    """
+    for view_name in STATS_VIEWS:
+        if not IS_SQLITE:
+            mode = "CONCURRENTLY " if concurrently else ""
+            await db.execute(text(f"REFRESH MATERIALIZED VIEW {mode}{view_name}"))
+        stmt = dialect_insert(MaterializedViewRefresh).values(view_name=view_name)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[MaterializedViewRefresh.view_name],
+                set_={"refreshed_at": func.now()}
+            )
+        )
+    await db.commit()
+
+async def refresh_stats_views_if_changed(db: AsyncSession, force: bool = False) -> bool:
+    """
+    Refresh the views if a match changed since they were last refreshed
+    (or if force), unless another worker is refreshing them right
+    now. Returns whether they were refreshed.
+    """
+    if not IS_SQLITE:
+        # Held until the refresh commits; other workers skip their turn
+        locked = await db.scalar(select(func.pg_try_advisory_xact_lock(func.hashtext(REFRESH_LOCK))))
+        if not locked:
+            await db.rollback()
+            return False
+    refreshed_at = await db.scalar(select(func.min(MaterializedViewRefresh.refreshed_at)))
+    if not force and refreshed_at is not None:
+        since = refreshed_at - CHANGE_SLACK
+        changed = await db.scalar(select(select(Match.id).where(Match.updated_at > since).exists()))
+        if not changed:
+            await db.rollback()
+            return False
+    await refresh_stats_views(db)
+    return True
+
+async def get_view_staleness(view_name: str, db: AsyncSession) -> Dict[str, Any]:
+    """When a view was last refreshed and how many seconds old its data is."""
+    if IS_SQLITE:
+        # Plain views on SQLite are always current
+        return {"view": view_name, "refreshed_at": datetime.now(timezone.utc), "stale_seconds": 0.0}
+    refreshed_at = await db.scalar(
+        select(MaterializedViewRefresh.refreshed_at)
+        .where(MaterializedViewRefresh.view_name == view_name)
+    )
+    if refreshed_at is None:
+        return {"view": view_name, "refreshed_at": None, "stale_seconds": None}
+    stale_seconds = (datetime.now(timezone.utc) - refreshed_at).total_seconds()
+    return {
+        "view": view_name,
+        "refreshed_at": refreshed_at,
+        "stale_seconds": round(stale_seconds, 1)
+    }
+
+class StatsViewRefresher:
+    """
+    Background asyncio task that refreshes the statistics views every
+    interval_seconds, or sooner when request_refresh() is called
+    (e.g. after an arena session completes). Intervals in which no match
+    changed are skipped, and of several workers only
+    one refreshes at a time.
+    """
+
+    def __init__(self, interval_seconds: int):
+        self.interval_seconds = interval_seconds
+        self._wakeup = asyncio.Event()
+        self._force = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.interval_seconds <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def request_refresh(self, force: bool = False) -> None:
+        """
+        Wake the refresher without waiting for the next interval. force
+        refreshes even without a newer match, e.g. after a deletion.
+        """
+        self._force = self._force or force
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            force, self._force = self._force, False
+            try:
+                async with AsyncSessionLocal() as db:
+                    await refresh_stats_views_if_changed(db, force=force)
+            except Exception:
+                logger.exception("Refreshing statistics views failed")
+
+# Interval in seconds; 0 disables the scheduler (views can still be refreshed on demand)
+stats_view_refresher = StatsViewRefresher(int(os.getenv("STATS_VIEW_REFRESH_SECONDS", 60)))
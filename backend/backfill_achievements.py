@@ -0,0 +1,248 @@
+"""
+Rebuild every student's achievement state from match history and award any
+achievements they qualify for. This replaces one
+POST /api/students/{id}/evaluate-achievements call per student.
+
+Students are streamed in chunks ordered by ID. Each chunk's history is
+fetched with one query, replayed and checked against the state criteria in
+a process pool, and written back with bulk statements. History criteria
+(e.g. pack_wins) run as one query per achievement per chunk. After every
+chunk the last student ID is written to the checkpoint file, so an
+interrupted run picks up where it stopped.
+
+Usage:
+    DATABASE_URL=postgresql://... python backfill_achievements.py
+        [--chunk-size N] [--workers N] [--codes CODE ...]
+        [--checkpoint PATH] [--restart]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, and_
+
+from app.database import AsyncSessionLocal, dialect_insert, engine
+from app.models.achievement import Achievement, StudentAchievement, StudentAchievementState
+from app.models.match import Match, MatchStatus, MatchParticipant
+from app.models.student import Student
+from app.services import achievement_criteria
+from app.services.achievement_service import apply_match_result
+
+STATE_COLUMNS = ("match_count", "win_count", "current_win_streak", "max_win_streak",
+                 "peak_rating", "last_match_at")
+
+# Rows per INSERT; keeps bind parameters under the asyncpg limit of 32767
+INSERT_BATCH = 5000
+
+def evaluate_chunk(
+    students: List[Tuple[uuid.UUID, float]],
+    history: Dict[uuid.UUID, List[Tuple[bool, Optional[float], datetime]]],
+    catalog: List[Tuple[uuid.UUID, Dict[str, Any]]]
+) -> Tuple[List[Dict[str, Any]], List[Tuple[uuid.UUID, uuid.UUID]]]:
+    """
+    Runs in a worker process. Replays each student's (won, rating_after,
+    played_at) results in order and checks the state-only criteria.
+    Returns the rebuilt state rows and the (student_id, achievement_id) pairs earned.
+    """
+    states = []
+    earned = []
+    for student_id, rating in students:
+        state = SimpleNamespace(
+            match_count=0, win_count=0, current_win_streak=0, max_win_streak=0,
+            peak_rating=None, last_match_at=None
+        )
+        for won, rating_after, played_at in history.get(student_id, ()):
+            apply_match_result(state, won, rating_after if rating_after is not None else rating, played_at)
+        states.append({"student_id": student_id, **{column: getattr(state, column) for column in STATE_COLUMNS}})
+        student = SimpleNamespace(elo_rating=rating)
+        for achievement_id, criteria in catalog:
+            if achievement_criteria.matches_state(criteria, student, state):
+                earned.append((student_id, achievement_id))
+    return states, earned
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"last_student_id": None, "students": 0, "awards": 0}
+    with open(path) as f:
+        return json.load(f)
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    # Write then rename so a crash never leaves a half-written checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+async def load_catalog(session, codes: Optional[List[str]]):
+    """Split the catalog into state-only and history criteria, skipping invalid ones."""
+    stmt = select(Achievement).where(Achievement.criteria.isnot(None))
+    if codes:
+        stmt = stmt.where(Achievement.code.in_(codes))
+    state_catalog = []
+    history_catalog = []
+    for achievement in (await session.execute(stmt)).scalars().all():
+        try:
+            if achievement_criteria.needs_history(achievement.criteria):
+                history_catalog.append((achievement.id, achievement.criteria))
+            elif achievement_criteria.validate_criteria(achievement.criteria):
+                state_catalog.append((achievement.id, achievement.criteria))
+        except ValueError as exc:
+            print(f"Skipping {achievement.code}: {exc}")
+    return state_catalog, history_catalog
+
+async def fetch_chunk(session, after: Optional[uuid.UUID], chunk_size: int):
+    """Next chunk of (id, elo_rating) by ID, and its completed match results in one query."""
+    stmt = select(Student.id, Student.elo_rating).order_by(Student.id).limit(chunk_size)
+    if after is not None:
+        stmt = stmt.where(Student.id > after)
+    students = [tuple(row) for row in (await session.execute(stmt)).all()]
+    if not students:
+        return students, {}
+
+    result = await session.execute(
+        select(
+            MatchParticipant.student_id,
+            MatchParticipant.is_winner,
+            MatchParticipant.elo_after,
+            MatchParticipant.created_at
+        )
+        .join(
+            Match,
+            and_(
+                Match.id == MatchParticipant.match_id,
+                Match.created_at == MatchParticipant.created_at
+            )
+        )
+        .where(
+            MatchParticipant.student_id.in_([student_id for student_id, _ in students]),
+            MatchParticipant.is_winner.isnot(None),
+            Match.status == MatchStatus.COMPLETED
+        )
+        .order_by(MatchParticipant.student_id, MatchParticipant.created_at)
+    )
+    history: Dict[uuid.UUID, list] = {}
+    for student_id, won, rating_after, played_at in result.all():
+        history.setdefault(student_id, []).append((won, rating_after, played_at))
+    return students, history
+
+async def write_chunk(session, states, earned, history_catalog) -> int:
+    """Store rebuilt states and awards for one chunk and commit. Returns new awards."""
+    insert = dialect_insert(StudentAchievementState)
+    # A match that completed after the history was read has already moved the live state on
+    newer_or_equal = (
+        StudentAchievementState.last_match_at.is_(None)
+        | (insert.excluded.last_match_at >= StudentAchievementState.last_match_at)
+    )
+    await session.execute(
+        insert.values(states).on_conflict_do_update(
+            index_elements=[StudentAchievementState.student_id],
+            set_={column: insert.excluded[column] for column in STATE_COLUMNS},
+            where=newer_or_equal
+        )
+    )
+
+    student_ids = [state["student_id"] for state in states]
+    earned = list(earned)
+    for achievement_id, criteria in history_catalog:
+        result = await session.execute(
+            achievement_criteria.compile_criteria(criteria, achievement_id, student_ids)
+        )
+        earned.extend((student_id, achievement_id) for student_id in result.scalars().all())
+
+    awarded = 0
+    now = datetime.now(timezone.utc)
+    for start in range(0, len(earned), INSERT_BATCH):
+        result = await session.execute(
+            dialect_insert(StudentAchievement)
+            .values([
+                {"id": uuid.uuid4(), "student_id": student_id, "achievement_id": achievement_id, "achieved_at": now}
+                for student_id, achievement_id in earned[start:start + INSERT_BATCH]
+            ])
+            .on_conflict_do_nothing(
+                index_elements=[StudentAchievement.student_id, StudentAchievement.achievement_id]
+            )
+        )
+        awarded += result.rowcount
+    await session.commit()
+    return awarded
+
+async def backfill(chunk_size: int, workers: int, codes: Optional[List[str]], checkpoint_path: str, restart: bool):
+    checkpoint = {"last_student_id": None, "students": 0, "awards": 0} if restart else load_checkpoint(checkpoint_path)
+    after = uuid.UUID(checkpoint["last_student_id"]) if checkpoint["last_student_id"] else None
+    if after:
+        print(f"Resuming after student {after} ({checkpoint['students']} students done)")
+
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    processed = 0
+    # spawn: the parent holds database connections and driver threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        async with AsyncSessionLocal() as session:
+            state_catalog, history_catalog = await load_catalog(session, codes)
+            if not state_catalog and not history_catalog:
+                print("No achievements with criteria to evaluate")
+                return
+
+            # Chunks are evaluated in parallel but written in order, so the
+            # checkpoint only ever moves past fully written students
+            in_flight = deque()
+            exhausted = False
+            while in_flight or not exhausted:
+                while not exhausted and len(in_flight) < workers * 2:
+                    students, history = await fetch_chunk(session, after, chunk_size)
+                    if not students:
+                        exhausted = True
+                        break
+                    after = students[-1][0]
+                    future = loop.run_in_executor(pool, evaluate_chunk, students, history, state_catalog)
+                    in_flight.append((after, len(students), future))
+                if not in_flight:
+                    break
+
+                last_id, count, future = in_flight.popleft()
+                states, earned = await future
+                awarded = await write_chunk(session, states, earned, history_catalog)
+
+                processed += count
+                checkpoint = {
+                    "last_student_id": str(last_id),
+                    "students": checkpoint["students"] + count,
+                    "awards": checkpoint["awards"] + awarded,
+                }
+                save_checkpoint(checkpoint_path, checkpoint)
+                elapsed = time.monotonic() - started
+                print(
+                    f"{checkpoint['students']} students, {checkpoint['awards']} awards "
+                    f"({processed / elapsed:.0f} students/s)"
+                )
+
+    elapsed = time.monotonic() - started
+    print(f"Done: {processed} students in {elapsed:.1f}s, {checkpoint['awards']} awards in total")
+    # A finished run starts from the beginning next time
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+async def main(args):
+    try:
+        await backfill(args.chunk_size, args.workers, args.codes, args.checkpoint, args.restart)
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="students per chunk")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="evaluation processes")
+    parser.add_argument("--codes", nargs="*", help="only these achievement codes")
+    parser.add_argument("--checkpoint", default=".backfill_achievements.checkpoint", help="progress file for resuming")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first student")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,29 @@
+"""
+Fit every flashcard's difficulty and discrimination from round outcomes
+(see app/services/flashcard_calibration.py). Normally this runs as a
+background job after rounds are decided; use this for the first fit or to
+refit everything after changing the model settings.
+
+Usage:
+    DATABASE_URL=postgresql://... python calibrate_flashcards.py [--full]
+"""
+import argparse
+import asyncio
+
+from app.database import AsyncSessionLocal, engine
+from app.services.flashcard_calibration import calibrate_flashcards
+
+async def calibrate(full: bool):
+    try:
+        async with AsyncSessionLocal() as session:
+            updated = await calibrate_flashcards(session, full)
+            await session.commit()
+        print(f"Calibrated {updated} flashcards")
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="refit every used card, not only those touched since the last run")
+    args = parser.parse_args()
+    asyncio.run(calibrate(args.full))
@@ -0,0 +1,338 @@
+"""
+EXPLAIN-based check that the router hot paths are served by indexes.
+
+Seeds a large synthetic dataset inside a transaction, runs the router and
+service functions on the hot paths against it, EXPLAINs every statement
+they issue and fails if any of them sequentially scans one of the history
+tables. The transaction is rolled back at the end, so the
+script can be pointed at a development database without leaving data behind.
+
+Usage:
+    DATABASE_URL=postgresql://... python check_indexes.py [num_students] [matches_per_student]
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.models.student import Student
+from app.models.match import Match
+from app.models.arena_session import ArenaParticipant
+from app.routers import flashcards, matches, students
+from app.routers.arena import arena_match_service
+from app.services import achievement_service, daily_stats_service
+from app.services.arena_stats_service import ArenaStatsService
+from app.services.head_to_head import HeadToHeadCache
+from app.services.statistics_service import StatisticsService
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+if not DATABASE_URL:
+    raise EnvironmentError("DATABASE_URL environment variable not set")
+if DATABASE_URL.startswith("postgresql://"):
+    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+# Tables that grow with usage and must never be sequentially scanned on a hot path
+HOT_TABLES = {
+    "matches",
+    "match_participants",
+    "rounds",
+    "round_participants",
+    "flashcards",
+    "student_achievements",
+    "student_daily_stats",
+}
+
+PARTITION_SUFFIX = re.compile(r"_(p\d{6}|default)$")
+
+# Statements with a plan; EXPLAIN does not run them
+PLANNED_STATEMENT = re.compile(r"\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+# Seeded rows share the transaction's now(), so participants land in the same
+# partition as their match through the created_at defaults
+SEED_SQL = [
+    """
+    CREATE TEMP TABLE seed_students ON COMMIT DROP AS
+    SELECT gen_random_uuid() AS id, n FROM generate_series(1, :num_students) AS n
+    """,
+    """
+    INSERT INTO students (id, name, elo_rating, wins, losses, total_matches)
+    SELECT id, 'seed-' || n, 1000, 0, 0, 0 FROM seed_students
+    """,
+    """
+    CREATE TEMP TABLE seed_packs ON COMMIT DROP AS
+    SELECT gen_random_uuid() AS id, n FROM generate_series(1, 200) AS n
+    """,
+    """
+    INSERT INTO flashcard_packs (id, name) SELECT id, 'seed-pack-' || n FROM seed_packs
+    """,
+    """
+    CREATE TEMP TABLE seed_flashcards ON COMMIT DROP AS
+    SELECT gen_random_uuid() AS id, p.id AS pack_id, row_number() OVER () AS n
+    FROM seed_packs p, generate_series(1, 50)
+    """,
+    """
+    INSERT INTO flashcards (id, question, answer, pack_id, times_used, times_correct)
+    SELECT id, 'q', 'a', pack_id, 0, 0 FROM seed_flashcards
+    """,
+    """
+    CREATE TEMP TABLE seed_arenas ON COMMIT DROP AS
+    SELECT gen_random_uuid() AS id, n FROM generate_series(1, :num_arenas) AS n
+    """,
+    """
+    INSERT INTO arena_sessions (id, status, num_rounds, rounds_completed)
+    SELECT id, 'completed', 10, 10 FROM seed_arenas
+    """,
+    """
+    CREATE TEMP TABLE seed_matches ON COMMIT DROP AS
+    SELECT gen_random_uuid() AS id, m AS n, a.id AS arena_id, s1.id AS p1, s2.id AS p2
+    FROM generate_series(1, :num_matches) AS m
+    JOIN seed_arenas a ON a.n = 1 + (m % :num_arenas)
+    JOIN seed_students s1 ON s1.n = 1 + (m % :num_students)
+    JOIN seed_students s2 ON s2.n = 1 + ((m * 7 + 1) % :num_students)
+    WHERE s1.id <> s2.id
+    """,
+    """
+    INSERT INTO arena_participants (arena_id, student_id, fights_played)
+    SELECT arena_id, p1, 0 FROM seed_matches
+    UNION
+    SELECT arena_id, p2, 0 FROM seed_matches
+    """,
+    # Every pending_every-th match is still pending, for the next-match lookup
+    """
+    INSERT INTO matches (id, arena_id, status, num_rounds, rounds_completed, winner_ids)
+    SELECT id, arena_id, 'completed', 1, 1, ARRAY[p1] FROM seed_matches WHERE n % :pending_every <> 0
+    UNION ALL
+    SELECT id, arena_id, 'pending', 1, 0, NULL FROM seed_matches WHERE n % :pending_every = 0
+    """,
+    """
+    INSERT INTO match_participants (match_id, student_id, elo_before, elo_after, is_winner)
+    SELECT id, p1, 1000, 1016, CASE WHEN n % :pending_every <> 0 THEN true END FROM seed_matches
+    UNION ALL
+    SELECT id, p2, 1000, 984, CASE WHEN n % :pending_every <> 0 THEN false END FROM seed_matches
+    """,
+    """
+    INSERT INTO student_daily_stats (student_id, day, matches, wins, elo_change, elo_end)
+    SELECT s.id, CURRENT_DATE - d, 2, 1, 0, 1000
+    FROM seed_students s, generate_series(1, 120) AS d
+    """,
+    """
+    CREATE TEMP TABLE seed_rounds ON COMMIT DROP AS
+    SELECT gen_random_uuid() AS id, m.id AS match_id, m.p1, m.p2, f.id AS flashcard_id
+    FROM seed_matches m
+    JOIN seed_flashcards f ON f.n = 1 + (m.n % 10000)
+    """,
+    """
+    INSERT INTO rounds (id, match_id, flashcard_id, round_number, winner_ids)
+    SELECT id, match_id, flashcard_id, 1, ARRAY[p1] FROM seed_rounds
+    """,
+    """
+    INSERT INTO round_participants (round_id, student_id, elo_before, elo_change)
+    SELECT id, p1, 1000, 16 FROM seed_rounds
+    UNION ALL
+    SELECT id, p2, 1000, -16 FROM seed_rounds
+    """,
+    """
+    CREATE TEMP TABLE seed_achievements ON COMMIT DROP AS
+    SELECT gen_random_uuid() AS id, n FROM generate_series(1, 20) AS n
+    """,
+    """
+    INSERT INTO achievements (id, code, title)
+    SELECT id, 'seed-' || id, 'seed-' || n FROM seed_achievements
+    """,
+    """
+    INSERT INTO student_achievements (id, student_id, achievement_id)
+    SELECT gen_random_uuid(), s.id, a.id
+    FROM seed_students s
+    JOIN seed_achievements a ON a.n <= 1 + (s.n % 5)
+    """,
+    "ANALYZE students",
+    "ANALYZE flashcards",
+    "ANALYZE matches",
+    "ANALYZE match_participants",
+    "ANALYZE rounds",
+    "ANALYZE round_participants",
+    "ANALYZE student_achievements",
+    "ANALYZE student_daily_stats",
+    "ANALYZE arena_participants",
+]
+
+
+def hot_paths(sample):
+    """
+    The router and service calls on hot paths, keyed by a readable name.
+    Each takes a session; every statement it issues is checked, so the
+    check follows the queries as they are written. reset_student_stats
+    deletes the sample student's history and runs last.
+    """
+    student_id, opponent_id, arena_id, match_id, flashcard_id, pack_id = sample
+
+    async def arena_participants(db):
+        result = await db.execute(
+            select(ArenaParticipant, Student)
+            .join(Student, ArenaParticipant.student_id == Student.id)
+            .where(ArenaParticipant.arena_id == arena_id)
+        )
+        return result.all()
+
+    async def leaderboard(db):
+        _, cursor = await StatisticsService.get_leaderboard(db, 20)
+        await StatisticsService.get_leaderboard(db, 20, cursor)
+
+    async def match_history(db):
+        _, cursor = await StatisticsService.get_match_history(str(student_id), db, 10)
+        await StatisticsService.get_match_history(str(student_id), db, 10, cursor)
+
+    async def arena_stats(db):
+        await ArenaStatsService.calculate_arena_stats(db, arena_id, await arena_participants(db))
+
+    async def next_match(db):
+        await arena_match_service.create_next_match(db, arena_id, await arena_participants(db))
+
+    async def daily_rollup(db):
+        await daily_stats_service.record_match(db, await db.get(Match, match_id))
+
+    return {
+        "student history (students.get_student_history)": (
+            lambda db: students.get_student_history(student_id, None, db)
+        ),
+        "match history pages (StatisticsService.get_match_history)": match_history,
+        "leaderboard pages (StatisticsService.get_leaderboard)": leaderboard,
+        "student stats (StatisticsService.get_student_stats)": (
+            lambda db: StatisticsService.get_student_stats(str(student_id), db)
+        ),
+        "arena participant stats (ArenaStatsService.calculate_arena_stats)": arena_stats,
+        "next pending match (ArenaMatchService.create_next_match)": next_match,
+        "match rounds (matches.get_match_rounds)": lambda db: matches.get_match_rounds(match_id, db),
+        "flashcard stats (StatisticsService.get_flashcard_stats)": (
+            lambda db: StatisticsService.get_flashcard_stats(str(flashcard_id), db)
+        ),
+        "arena flashcard stats (StatisticsService.get_arena_flashcard_stats)": (
+            lambda db: StatisticsService.get_arena_flashcard_stats(str(arena_id), db)
+        ),
+        "flashcards in pack (flashcards.get_flashcards_by_pack)": (
+            lambda db: flashcards.get_flashcards_by_pack(pack_id, db)
+        ),
+        "class head-to-head (HeadToHeadCache.get)": (
+            lambda db: HeadToHeadCache(1).get(db, student_ids=[student_id, opponent_id])
+        ),
+        "arena head-to-head (HeadToHeadCache.get)": lambda db: HeadToHeadCache(1).get(db, arena_id),
+        "daily rollup (daily_stats_service.record_match)": daily_rollup,
+        "progress (daily_stats_service.get_progress)": (
+            lambda db: daily_stats_service.get_progress(db, student_id, "term")
+        ),
+        "award evaluation (achievement_service.run_achievement_evaluation)": (
+            lambda db: achievement_service.run_achievement_evaluation(
+                db, {"student_ids": [str(student_id), str(opponent_id)]}
+            )
+        ),
+        "student awards (achievement_service.get_student_achievements)": (
+            lambda db: achievement_service.get_student_achievements(db, student_id)
+        ),
+        "student reset (students.reset_student_stats)": (
+            lambda db: students.reset_student_stats(student_id, db)
+        ),
+    }
+
+
+class StatementRecorder:
+    """Collects the statements issued on a connection while a hot path runs."""
+
+    def __init__(self, conn):
+        self.statements = []
+        self.recording = False
+        event.listen(conn.sync_connection, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        # Savepoints and other transaction control have no plan to check
+        if self.recording and not executemany and PLANNED_STATEMENT.match(statement):
+            self.statements.append((statement, parameters if isinstance(parameters, dict) else tuple(parameters)))
+
+    async def capture(self, conn, path):
+        """Run a hot path in a savepoint on conn; returns its statements and parameters."""
+        self.statements = []
+        self.recording = True
+        db = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+        try:
+            await path(db)
+        finally:
+            self.recording = False
+            await db.close()
+        return self.statements
+
+
+def find_seq_scans(plan_node, found=None):
+    """Walk an EXPLAIN (FORMAT JSON) plan and collect hot tables that are sequentially scanned."""
+    if found is None:
+        found = []
+    # Partitions (matches_p202503, matches_default) are reported under their parent table
+    relation = PARTITION_SUFFIX.sub("", plan_node.get("Relation Name", ""))
+    if plan_node.get("Node Type") == "Seq Scan" and relation in HOT_TABLES:
+        found.append(plan_node["Relation Name"])
+    for child in plan_node.get("Plans", []):
+        find_seq_scans(child, found)
+    return found
+
+
+async def check_indexes(num_students: int, matches_per_student: int) -> bool:
+    engine = create_async_engine(DATABASE_URL)
+    num_matches = num_students * matches_per_student // 2
+    params = {
+        "num_students": num_students,
+        "num_arenas": max(1, num_matches // 20),
+        "num_matches": num_matches,
+        "pending_every": 20,
+    }
+    failures = []
+
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            print(f"Seeding {num_students} students and {num_matches} matches...")
+            for statement in SEED_SQL:
+                await conn.execute(text(statement), params)
+
+            sample = (await conn.execute(text("""
+                SELECT m.p1, m.p2, m.arena_id, m.id, r.flashcard_id, f.pack_id
+                FROM seed_matches m
+                JOIN rounds r ON r.match_id = m.id
+                JOIN flashcards f ON f.id = r.flashcard_id
+                JOIN student_achievements sa ON sa.student_id = m.p1
+                WHERE m.n % :pending_every <> 0
+                LIMIT 1
+            """), params)).first()
+
+            recorder = StatementRecorder(conn)
+            paths = hot_paths(sample)
+            for name, path in paths.items():
+                seq_scans = []
+                for statement, parameters in await recorder.capture(conn, path):
+                    plan = (await conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters)).scalar_one()
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    seq_scans += find_seq_scans(plan[0]["Plan"])
+                if seq_scans:
+                    failures.append(name)
+                    print(f"FAIL  {name}: sequential scan on {', '.join(sorted(set(seq_scans)))}")
+                else:
+                    print(f"ok    {name}")
+        finally:
+            await trans.rollback()
+
+    await engine.dispose()
+
+    if failures:
+        print(f"\n{len(failures)} of {len(paths)} paths do not use an index")
+        return False
+    print(f"\nAll {len(paths)} paths use index scans")
+    return True
+
+
+if __name__ == "__main__":
+    num_students = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    matches_per_student = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    ok = asyncio.run(check_indexes(num_students, matches_per_student))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,34 @@
+"""
+Create the coming months' partitions of the match history tables and detach
+those past PARTITION_RETENTION_MONTHS (see app/services/partition_service.py).
+API workers create partitions themselves (PARTITION_MAINTENANCE_SECONDS); run
+this for a one-off catch-up, or from cron to detach old partitions without
+setting PARTITION_RETENTION_MONTHS on the workers.
+
+Usage:
+    DATABASE_URL=postgresql://... python maintain_partitions.py [--months-ahead N] [--retention-months N]
+"""
+import argparse
+import asyncio
+
+from app.database import AsyncSessionLocal, engine
+from app.services.partition_service import ensure_future_partitions, detach_old_partitions, partition_maintainer
+
+async def maintain(months_ahead: int, retention_months: int):
+    try:
+        async with AsyncSessionLocal() as session:
+            created = await ensure_future_partitions(session, months_ahead)
+            detached = await detach_old_partitions(session, retention_months)
+        print(f"Created {len(created)} partitions, detached {len(detached)}")
+        for name in created + detached:
+            print(f"  {name}")
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--months-ahead", type=int, default=partition_maintainer.months_ahead)
+    parser.add_argument("--retention-months", type=int, default=partition_maintainer.retention_months,
+                        help="detach partitions older than this many months (0 keeps everything)")
+    args = parser.parse_args()
+    asyncio.run(maintain(args.months_ahead, args.retention_months))
@@ -0,0 +1,34 @@
+"""
+Rebuild the per-student daily rollups behind the progress charts (see
+app/services/daily_stats_service.py) from match_participants. Matches add
+themselves to the rollups as they complete; use this after importing or
+correcting match history, or to repair a range of days.
+
+Usage:
+    DATABASE_URL=postgresql://... python rebuild_daily_stats.py --from 2025-01-06 [--to 2025-04-11]
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timezone
+
+from app.database import AsyncSessionLocal, engine
+from app.services.daily_stats_service import rebuild_daily_stats
+
+async def rebuild(start: date, end: date):
+    try:
+        async with AsyncSessionLocal() as session:
+            rows = await rebuild_daily_stats(session, start, end)
+            await session.commit()
+        print(f"Rebuilt {rows} daily rows for {start} to {end}")
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, required=True, help="first UTC day (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=None, help="last UTC day, inclusive (default today)")
+    args = parser.parse_args()
+    end = args.end or datetime.now(timezone.utc).date()
+    if end < args.start:
+        parser.error("--to is before --from")
+    asyncio.run(rebuild(args.start, end))
@@ -0,0 +1,35 @@
+"""
+Run background jobs (e.g. post-match achievement evaluation) in a separate
+process. Any number of these can run alongside the API; jobs are claimed
+with FOR UPDATE SKIP LOCKED so each is processed once. Set JOB_WORKERS=0 on
+the API to leave all job processing to these workers.
+
+Usage:
+    DATABASE_URL=postgresql://... python run_jobs.py [--concurrency N] [--until-idle]
+"""
+import argparse
+import asyncio
+
+from app.database import engine
+from app.services import achievement_service, flashcard_calibration  # noqa: F401  registers job handlers
+from app.services.job_queue import JobWorker, job_worker
+
+async def run_jobs(concurrency: int, until_idle: bool):
+    worker = JobWorker(concurrency=concurrency, poll_seconds=job_worker.poll_seconds)
+    try:
+        if until_idle:
+            count = await worker.run_until_idle()
+            print(f"Ran {count} jobs")
+        else:
+            worker.start()
+            await asyncio.Event().wait()
+    finally:
+        await worker.stop()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=max(job_worker.concurrency, 1))
+    parser.add_argument("--until-idle", action="store_true", help="run queued jobs once and exit")
+    args = parser.parse_args()
+    asyncio.run(run_jobs(args.concurrency, args.until_idle))
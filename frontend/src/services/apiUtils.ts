@@ -3,14 +3,37 @@ import { ApiResponse } from '../types';
 
 export const BASE_URL = 'http://localhost:8000/api';
 
+// After a write, reads are sent to the primary database for this long so they
+// see it; matches DB_READ_YOUR_WRITES_SECONDS on the backend. The backend's
+// cookie does not reach a cross-origin client, so the header is sent instead.
+export const READ_PRIMARY_HEADER = 'X-Read-Primary';
+const READ_YOUR_WRITES_MS = 5000;
+const WRITE_METHODS = ['post', 'put', 'patch', 'delete'];
+
 // Create base axios instance with common config
 export const createAxiosInstance = (): AxiosInstance => {
-  return axios.create({
+  const instance = axios.create({
     baseURL: BASE_URL,
     headers: {
       'Content-Type': 'application/json',
     },
   });
+
+  let readPrimaryUntil = 0;
+  instance.interceptors.request.use((config) => {
+    if (Date.now() < readPrimaryUntil) {
+      config.headers.set(READ_PRIMARY_HEADER, '1');
+    }
+    return config;
+  });
+  instance.interceptors.response.use((response) => {
+    if (WRITE_METHODS.includes((response.config.method || '').toLowerCase())) {
+      readPrimaryUntil = Date.now() + READ_YOUR_WRITES_MS;
+    }
+    return response;
+  });
+
+  return instance;
 };
 
 // Shared axios instance